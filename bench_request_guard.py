@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the Slack request guard
+Measures the per-request cost of authenticating and parsing a Slack event
+outside of Flask, so the numbers are just the guard's own overhead:
+
+- baseline: slack_sdk-style verification (HMAC keyed per request over
+  "v0:ts:" + body), then the body decoded three times as the old
+  create-notion-task handler did
+- guard:    SlackRequestVerifier.verify() + parse_body() once
+- reject:   guard + router.match() for a reaction no handler wants
+
+    python bench_request_guard.py --iterations 50000
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import time
+import timeit
+import uuid
+
+from event_router import EventRouter
+from slack_request import SlackRequestVerifier, parse_body
+
+SIGNING_SECRET = "8f742231b10e8888abcd99yyyzzz85a5"
+
+
+def _event_body(reaction):
+    return json.dumps({
+        "token": "XXYYZZ",
+        "team_id": "T0000000",
+        "api_app_id": "A0000000",
+        "type": "event_callback",
+        "event_id": f"Ev{uuid.uuid4().hex[:12].upper()}",
+        "event_time": int(time.time()),
+        "event": {
+            "type": "reaction_added",
+            "user": "U0000000",
+            "reaction": reaction,
+            "item_user": "U1111111",
+            "item": {"type": "message", "channel": "C0000000", "ts": f"{time.time():.6f}"},
+            "event_ts": f"{time.time():.6f}",
+        },
+    }).encode("utf-8")
+
+
+def _sign(body, timestamp):
+    basestring = f"v0:{timestamp}:".encode("utf-8") + body
+    return "v0=" + hmac.new(SIGNING_SECRET.encode("utf-8"), basestring, hashlib.sha256).hexdigest()
+
+
+def baseline(body, timestamp, signature):
+    if abs(time.time() - int(timestamp)) > 60 * 5:
+        return None
+    request_hash = hmac.new(str.encode(SIGNING_SECRET), str.encode(f"v0:{timestamp}:") + body, hashlib.sha256)
+    if not hmac.compare_digest(f"v0={request_hash.hexdigest()}", signature):
+        return None
+    if "challenge" in json.loads(body):
+        return None
+    payload = json.loads(body)
+    return json.loads(body)["event"]["type"], payload
+
+
+def run(iterations):
+    verifier = SlackRequestVerifier(SIGNING_SECRET)
+    router = EventRouter()
+    router.on_reaction("pmgenie", channels=["C0000000"])(lambda event: None)
+
+    wanted = _event_body("pmgenie")
+    unwanted = _event_body("thumbsup")
+    timestamp = str(int(time.time()))
+    wanted_signature = _sign(wanted, timestamp)
+    unwanted_signature = _sign(unwanted, timestamp)
+    content_type = "application/json"
+
+    def guard():
+        if verifier.verify(wanted, timestamp, wanted_signature):
+            return parse_body(wanted, content_type)
+
+    def reject():
+        if verifier.verify(unwanted, timestamp, unwanted_signature):
+            _, data = parse_body(unwanted, content_type)
+            return router.match(data["event"])
+
+    assert guard() is not None and reject() == ()
+    cases = [
+        ("baseline", lambda: baseline(wanted, timestamp, wanted_signature)),
+        ("guard", guard),
+        ("reject", reject),
+    ]
+    print(f"Body size: {len(wanted)} bytes, {iterations} iterations")
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=iterations, repeat=5))
+        print(f"{name:<9} {best / iterations * 1e6:7.2f} µs/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Slack request verification and parsing")
+    parser.add_argument("--iterations", type=int, default=20000, help="Requests per timing run")
+    args = parser.parse_args()
+
+    run(args.iterations)
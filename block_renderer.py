@@ -0,0 +1,90 @@
+"""
+Streaming Block Kit renderer
+Splits long digests into as many Slack messages as needed instead of
+truncating them:
+- text is chunked on line boundaries to fit Slack's per-section limit
+- blocks are packed into messages of at most Slack's 50-block limit,
+  keeping each group (e.g. a PIC header and its first chunk) together
+- everything is a generator, so posting can start before rendering ends
+
+Text is always assembled from lists of lines with "".join, never with
+repeated string concatenation.
+"""
+
+# Slack limits: https://api.slack.com/reference/block-kit/blocks
+MAX_BLOCKS_PER_MESSAGE = 50
+MAX_SECTION_TEXT_LENGTH = 3000
+
+
+def section(text):
+    """mrkdwn section block"""
+    return {"type": "section", "text": {"type": "mrkdwn", "text": text}}
+
+
+def context(text):
+    """mrkdwn context block"""
+    return {"type": "context", "elements": [{"type": "mrkdwn", "text": text}]}
+
+
+def divider():
+    return {"type": "divider"}
+
+
+def chunk_lines(lines, max_length=MAX_SECTION_TEXT_LENGTH):
+    """
+    Yield strings of at most max_length characters built from whole lines
+    (each line should carry its own trailing newline). A single line longer
+    than max_length is split on its own.
+    """
+    current = []
+    current_length = 0
+    for line in lines:
+        while len(line) > max_length:
+            if current:
+                yield "".join(current)
+                current, current_length = [], 0
+            yield line[:max_length]
+            line = line[max_length:]
+        if current and current_length + len(line) > max_length:
+            yield "".join(current)
+            current, current_length = [], 0
+        current.append(line)
+        current_length += len(line)
+    if current:
+        text = "".join(current)
+        if text.strip():
+            yield text
+
+
+def text_sections(lines, max_length=MAX_SECTION_TEXT_LENGTH):
+    """Section blocks covering all the lines, each within the text limit"""
+    return [section(chunk.rstrip("\n")) for chunk in chunk_lines(lines, max_length) if chunk.strip()]
+
+
+def batch_groups(groups, max_blocks=MAX_BLOCKS_PER_MESSAGE):
+    """
+    Pack groups of blocks into messages of at most max_blocks blocks.
+    A group is only split when it is larger than a whole message.
+    Yields lists of blocks, one per Slack message.
+    """
+    batch = []
+    for group in groups:
+        if len(batch) + len(group) > max_blocks and batch:
+            yield batch
+            batch = []
+        for block in group:
+            if len(batch) >= max_blocks:
+                yield batch
+                batch = []
+            batch.append(block)
+    # Don't post a message that is only a trailing divider
+    if batch and any(block["type"] != "divider" for block in batch):
+        yield batch
+
+
+def fallback_text(blocks, default):
+    """Notification text for a message: the first section's text, if any"""
+    for block in blocks:
+        if block.get("type") == "section" and block.get("text", {}).get("text"):
+            return block["text"]["text"][:MAX_SECTION_TEXT_LENGTH]
+    return default
@@ -0,0 +1,139 @@
+"""
+Bot identity resolver
+Looks up the bot's own Slack user ID once via auth.test and caches it,
+instead of paying an auth.test round trip on every event.
+
+The cache is keyed by bot token, so every module in the process shares one
+lookup, and a rotated token automatically triggers a fresh auth.test.
+A failed auth.test is remembered for RETRY_SECONDS, so an auth outage costs
+one call a minute rather than one per event; request threads use
+cached_bot_user_id(), which never calls Slack.
+"""
+import threading
+import time
+
+from slack_sdk.errors import SlackApiError
+
+# Slack errors that mean our cached identity may be stale
+AUTH_ERRORS = {"invalid_auth", "token_revoked", "token_expired", "account_inactive", "not_authed"}
+
+RETRY_SECONDS = 60
+
+_identities = {}  # token -> auth.test response fields
+_retry_at = {}    # token -> monotonic time before which a failed auth.test is not retried
+_in_flight = {}   # token -> Event set when the running auth.test for it finishes
+_resolving = set()  # tokens being resolved by a background thread
+# Guards the dicts above only; auth.test itself always runs outside it
+_lock = threading.Lock()
+
+
+def _fetch(client):
+    """Call auth.test and keep the fields we care about"""
+    response = client.auth_test()
+    return {
+        "user_id": response.get("user_id"),
+        "bot_id": response.get("bot_id"),
+        "team_id": response.get("team_id"),
+        "user": response.get("user"),
+    }
+
+
+def get_bot_identity(client, refresh=False):
+    """
+    Returns the cached identity dict for the client's token
+    (keys: user_id, bot_id, team_id, user), or None if auth.test fails.
+    Only one auth.test per token runs at a time; concurrent callers wait
+    for its result.
+    """
+    token = client.token
+    with _lock:
+        identity = _identities.get(token)
+        if not refresh:
+            if identity:
+                return identity
+            if time.monotonic() < _retry_at.get(token, 0):
+                return None
+        done = _in_flight.get(token)
+        if done is None:
+            done = _in_flight[token] = threading.Event()
+            owner = True
+        else:
+            owner = False
+
+    if not owner:
+        done.wait()
+        return _identities.get(token)
+
+    identity, rejected = None, False
+    try:
+        identity = _fetch(client)
+    except SlackApiError as e:
+        print(f"Warning: Could not get bot identity: {e.response['error']}")
+        rejected = True
+    except Exception as e:
+        print(f"Warning: Could not get bot identity: {e}")
+    finally:
+        with _lock:
+            if identity:
+                _identities[token] = identity
+                _retry_at.pop(token, None)
+            else:
+                if rejected:
+                    _identities.pop(token, None)
+                _retry_at[token] = time.monotonic() + RETRY_SECONDS
+            del _in_flight[token]
+        done.set()
+    return identity
+
+
+def get_bot_user_id(client):
+    """The bot's own Slack user ID, or None if it cannot be resolved"""
+    identity = get_bot_identity(client)
+    return identity["user_id"] if identity else None
+
+
+def _resolve(client):
+    try:
+        get_bot_identity(client)
+    finally:
+        with _lock:
+            _resolving.discard(client.token)
+
+
+def cached_bot_user_id(client):
+    """
+    The bot's user ID if it is already known, without calling Slack; for
+    request threads. Otherwise starts resolving it in the background and
+    returns None.
+    """
+    token = client.token
+    with _lock:
+        identity = _identities.get(token)
+        if identity:
+            return identity["user_id"]
+        if token in _resolving or token in _in_flight or time.monotonic() < _retry_at.get(token, 0):
+            return None
+        _resolving.add(token)
+    threading.Thread(target=_resolve, args=(client,), name="bot-identity", daemon=True).start()
+    return None
+
+
+def invalidate(client):
+    """Drop the cached identity so the next lookup calls auth.test again"""
+    with _lock:
+        _identities.pop(client.token, None)
+
+
+def handle_api_error(client, error):
+    """Invalidate the cached identity if a Slack API error was an auth failure"""
+    if isinstance(error, SlackApiError) and error.response.get("error") in AUTH_ERRORS:
+        print(f"🔑 Slack auth error ({error.response['error']}), refreshing bot identity")
+        invalidate(client)
+
+
+def warm_up(client):
+    """Resolve the identity at startup so the first event doesn't pay for it"""
+    identity = get_bot_identity(client)
+    if identity:
+        print(f"🤖 Bot identity: {identity['user']} ({identity['user_id']})")
+    return identity
@@ -1,13 +1,20 @@
 import os
-from flask import Flask, request, jsonify
+import logging
+from flask import jsonify
 from dotenv import load_dotenv
-from notion_client import Client
-from slack_sdk.signature import SignatureVerifier
 from slack_sdk.errors import SlackApiError
-from slack_sdk import WebClient
-import json
 import sys
+import threading
+import time
 from datetime import datetime
+import bot_identity
+from http_transport import get_slack_client, get_notion_client
+from user_directory import get_user_directory
+from page_writer import get_page_writer
+from event_queue import StageLatency
+from notion_users import get_notion_user_index, people
+from task_index import get_task_title_index
+from rate_limiter import PRIORITY_INTERACTIVE, request_priority
 
 # Load environment variables from .env file
 load_dotenv()
@@ -23,17 +30,30 @@ SLACK_SIGNING_SECRET = os.getenv("SLACK_SIGNING_SECRET")
 # Define the emoji that triggers task creation from a reaction
 TRIGGER_EMOJI = "white_check_mark"
 
-# Initialize Flask app
-app = Flask(__name__)
+# Picked in the update modal's parent picker to clear the task's parent
+NO_PARENT_VALUE = "none"
+NO_PARENT_OPTION = {"text": {"type": "plain_text", "text": "— No parent —"}, "value": NO_PARENT_VALUE}
+
+# Served by the shared app in slack_message_handler, which calls register()
+logger = logging.getLogger(__name__)
 
 # Initialize Notion client
-notion_client = Client(auth=NOTION_API_KEY)
+notion_client = get_notion_client(NOTION_API_KEY)
 
 # Initialize Slack WebClient for sending responses and fetching message details
-slack_web_client = WebClient(token=SLACK_BOT_TOKEN)
+slack_web_client = get_slack_client(SLACK_BOT_TOKEN)
+user_directory = get_user_directory(slack_web_client)
+notion_users = get_notion_user_index(notion_client, user_directory)
+
+# Batches page creation for bursts of reactions
+page_writer = get_page_writer(notion_client)
 
-# Initialize Slack Signature Verifier
-signature_verifier = SignatureVerifier(SLACK_SIGNING_SECRET)
+# Task pickers in the modals search this in-memory index of task titles
+task_index = get_task_title_index(notion_client, NOTION_DATABASE_ID)
+
+# Modal submissions are acked at once; the Notion writes run on the router's queue
+_router = None
+modal_latency = StageLatency()
 
 # --- Manual Slack User ID Mapping (from your previous script) ---
 SLACK_USER_MAPPING = {
@@ -44,321 +64,605 @@ SLACK_USER_MAPPING = {
 }
 # --- End Manual Slack User ID Mapping ---
 
+PRIORITY_OPTIONS = [
+    {"text": {"type": "plain_text", "text": "High"}, "value": "High"},
+    {"text": {"type": "plain_text", "text": "Medium"}, "value": "Medium"},
+    {"text": {"type": "plain_text", "text": "Low"}, "value": "Low"}
+]
+TAG_OPTIONS = [
+    {"text": {"type": "plain_text", "text": "2025 H2 Assessing"}, "value": "2025 H2 Assessing"},
+    {"text": {"type": "plain_text", "text": "2025 H2 Deprioritize"}, "value": "2025 H2 Deprioritize"},
+    {"text": {"type": "plain_text", "text": "In Assessment"}, "value": "In Assessment"}
+]
+# Used when the database schema cannot be read
+DEFAULT_STATUS_NAMES = ["Not started", "On Hold", "In Progress - Action Needed", "In progress - On Track"]
+STATUS_OPTIONS_TTL_SECONDS = int(os.getenv("STATUS_OPTIONS_TTL_SECONDS", 3600))
+STATUS_OPTIONS_RETRY_SECONDS = 60
+
+# Status option names read from the database; refreshed on the router's queue
+_status_cache = {"names": None, "loaded_at": None, "refreshing": False}
+_status_lock = threading.Lock()
+
 def get_notion_person_id_from_slack_input(slack_user_id=None, input_email_or_name=None):
     """
-    Attempts to get a Notion person object for assignment.
+    Attempts to get a Notion person object ({"id": ...}) for assignment.
+    The input (Slack mention, email or name) wins; the Slack user is only
+    used when there is no input.
     """
-    if slack_user_id:
-        try:
-            user_info = slack_web_client.users_info(user=slack_user_id)
-            if user_info["ok"] and user_info["user"] and user_info["user"].get("profile") and user_info["user"]["profile"].get("email"):
-                return {"email": user_info["user"]["profile"]["email"]}
-        except SlackApiError as e:
-            app.logger.warning(f"Slack API error fetching user info for {slack_user_id}: {e.response['error']}")
-    
     if input_email_or_name:
-        if "@" in input_email_or_name:
-            return {"email": input_email_or_name}
-        else:
-            app.logger.warning(f"Cannot directly assign Notion PIC by name: '{input_email_or_name}'. Requires Notion user ID lookup.")
+        notion_user = notion_users.resolve(input_email_or_name)
+        if not notion_user and input_email_or_name in SLACK_USER_MAPPING:
+            notion_user = notion_users.by_slack_user(SLACK_USER_MAPPING[input_email_or_name])
+        if not notion_user:
+            logger.warning(f"No Notion user found for PIC '{input_email_or_name}'.")
             return None
-    
+        return people(notion_user)
+
+    if slack_user_id:
+        notion_user = notion_users.by_slack_user(slack_user_id)
+        if notion_user:
+            return people(notion_user)
+
     return None
 
-@app.route("/slack/events", methods=["POST"])
-def slack_events():
+def open_create_task_modal(payload):
     """
-    Handles incoming Slack events (slash commands and reaction added events).
+    Handles the /create-notion-task slash command by opening the creation modal.
     """
-    if not signature_verifier.is_valid_request(request.get_data(), request.headers):
-        app.logger.warning("Invalid Slack request signature.")
-        return "Invalid request signature", 403
-
-    if request.json and 'challenge' in request.json:
-        return jsonify({'challenge': request.json['challenge']})
-
-    event_payload = request.json
-    event_type = event_payload.get("event", {}).get("type")
-    
-    app.logger.info(f"Received Slack event: {event_type}")
-
-    # Handle the slash command for creating a task
-    if request.form and request.form.get("command") == "/create-notion-task":
-        payload = request.form.to_dict()
-        trigger_id = payload.get("trigger_id")
-        user_id = payload.get("user_id")
-
-        modal = {
-            "type": "modal",
-            "callback_id": "create_notion_task_modal",
-            "title": {"type": "plain_text", "text": "Create New Task"},
-            "submit": {"type": "plain_text", "text": "Create"},
-            "close": {"type": "plain_text", "text": "Cancel"},
-            "blocks": [
-                {
-                    "type": "input",
-                    "block_id": "task_name_block",
-                    "label": {"type": "plain_text", "text": "Task Name (Required)"},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "task_name_input",
-                        "placeholder": {"type": "plain_text", "text": "e.g., Implement new feature X"}
-                    },
-                    "optional": False
+    trigger_id = payload.get("trigger_id")
+
+    modal = {
+        "type": "modal",
+        "callback_id": "create_notion_task_modal",
+        "title": {"type": "plain_text", "text": "Create New Task"},
+        "submit": {"type": "plain_text", "text": "Create"},
+        "close": {"type": "plain_text", "text": "Cancel"},
+        "blocks": [
+            {
+                "type": "input",
+                "block_id": "task_name_block",
+                "label": {"type": "plain_text", "text": "Task Name (Required)"},
+                "element": {
+                    "type": "plain_text_input",
+                    "action_id": "task_name_input",
+                    "placeholder": {"type": "plain_text", "text": "e.g., Implement new feature X"}
                 },
-                {
-                    "type": "input",
-                    "block_id": "pic_block",
-                    "label": {"type": "plain_text", "text": "Assigned PIC (Email or Full Name - Required)"},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "pic_input",
-                        "placeholder": {"type": "plain_text", "text": "e.g., annie.chen@example.com or Annie Chen"},
-                        "initial_value": payload.get("user_name", "")
-                    },
-                    "optional": False
+                "optional": False
+            },
+            {
+                "type": "input",
+                "block_id": "pic_block",
+                "label": {"type": "plain_text", "text": "Assigned PIC (Email or Full Name - Required)"},
+                "element": {
+                    "type": "plain_text_input",
+                    "action_id": "pic_input",
+                    "placeholder": {"type": "plain_text", "text": "e.g., annie.chen@example.com or Annie Chen"},
+                    "initial_value": payload.get("user_name", "")
                 },
-                {
-                    "type": "input",
-                    "block_id": "ddl_block",
-                    "label": {"type": "plain_text", "text": "Due Date (DDL - Required)"},
-                    "element": {
-                        "type": "datepicker",
-                        "action_id": "ddl_datepicker",
-                        "placeholder": {"type": "plain_text", "text": "Select a date"}
-                    },
-                    "optional": False
+                "optional": False
+            },
+            {
+                "type": "input",
+                "block_id": "ddl_block",
+                "label": {"type": "plain_text", "text": "Due Date (DDL - Required)"},
+                "element": {
+                    "type": "datepicker",
+                    "action_id": "ddl_datepicker",
+                    "placeholder": {"type": "plain_text", "text": "Select a date"}
                 },
-                {
-                    "type": "input",
-                    "block_id": "priority_block",
-                    "label": {"type": "plain_text", "text": "Priority (Required)"},
-                    "element": {
-                        "type": "static_select",
-                        "action_id": "priority_select",
-                        "placeholder": {"type": "plain_text", "text": "Select a priority"},
-                        "options": [
-                            {"text": {"type": "plain_text", "text": "High"}, "value": "High"},
-                            {"text": {"type": "plain_text", "text": "Medium"}, "value": "Medium"},
-                            {"text": {"type": "plain_text", "text": "Low"}, "value": "Low"}
-                        ]
-                    },
-                    "optional": False
+                "optional": False
+            },
+            {
+                "type": "input",
+                "block_id": "priority_block",
+                "label": {"type": "plain_text", "text": "Priority (Required)"},
+                "element": {
+                    "type": "static_select",
+                    "action_id": "priority_select",
+                    "placeholder": {"type": "plain_text", "text": "Select a priority"},
+                    "options": PRIORITY_OPTIONS
                 },
-                {
-                    "type": "input",
-                    "block_id": "tags_block",
-                    "label": {"type": "plain_text", "text": "Tags"},
-                    "element": {
-                        "type": "static_select",
-                        "action_id": "tags_select",
-                        "placeholder": {"type": "plain_text", "text": "Select a tag"},
-                        "options": [
-                            {"text": {"type": "plain_text", "text": "2025 H2 Assessing"}, "value": "2025 H2 Assessing"},
-                            {"text": {"type": "plain_text", "text": "2025 H2 Deprioritize"}, "value": "2025 H2 Deprioritize"},
-                            {"text": {"type": "plain_text", "text": "In Assessment"}, "value": "In Assessment"}
-                        ]
-                    },
-                    "optional": True
+                "optional": False
+            },
+            {
+                "type": "input",
+                "block_id": "tags_block",
+                "label": {"type": "plain_text", "text": "Tags"},
+                "element": {
+                    "type": "static_select",
+                    "action_id": "tags_select",
+                    "placeholder": {"type": "plain_text", "text": "Select a tag"},
+                    "options": TAG_OPTIONS
                 },
-                {
-                    "type": "input",
-                    "block_id": "parent_task_block",
-                    "label": {"type": "plain_text", "text": "Subtask of (Parent Task ID - Optional)"},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "parent_task_input",
-                        "placeholder": {"type": "plain_text", "text": "Enter Notion ID of parent task (optional)"}
-                    },
-                    "optional": True
-                }
-            ]
-        }
+                "optional": True
+            },
+            {
+                "type": "input",
+                "block_id": "parent_task_block",
+                "label": {"type": "plain_text", "text": "Subtask of (Parent Task - Optional)"},
+                "element": {
+                    "type": "external_select",
+                    "action_id": "parent_task_select",
+                    "placeholder": {"type": "plain_text", "text": "Search tasks by title"},
+                    "min_query_length": 0
+                },
+                "optional": True
+            }
+        ]
+    }
 
-        try:
-            slack_web_client.views_open(
-                trigger_id=trigger_id,
-                view=modal
-            )
-            return ""
-        except SlackApiError as e:
-            app.logger.error(f"Error opening Slack modal for creation: {e.response['error']}")
-            return jsonify({
-                "response_type": "ephemeral",
-                "text": f"Error opening task creation form: {e.response['error']}"
-            })
-    
-    # Handle reaction_added event for task creation in a specific database
-    elif event_type == "reaction_added":
-        reaction = event_payload["event"]["reaction"]
-        if reaction == TRIGGER_EMOJI:
-            user_id = event_payload["event"]["user"]
-            channel_id = event_payload["event"]["item"]["channel"]
-            message_ts = event_payload["event"]["item"]["ts"]
-            
-            try:
-                message_response = slack_web_client.conversations_history(
-                    channel=channel_id,
-                    latest=message_ts,
-                    limit=1,
-                    inclusive=True
-                )
-                if message_response["ok"] and message_response["messages"]:
-                    original_message = message_response["messages"][0]
-                    message_text = original_message.get("text")
-                    
-                    if not message_text:
-                        app.logger.warning("Reaction added to a message with no text. Skipping Notion task creation.")
-                        return jsonify({"ok": True})
-
-                    # Create the Notion task in the SALES_DATABASE_ID
-                    task_name = f"Slack Request: {message_text[:100]}..." if len(message_text) > 100 else f"Slack Request: {message_text}"
-                    slack_link = slack_web_client.chat_getPermalink(channel=channel_id, message_ts=message_ts)["permalink"]
-                    
-                    notion_properties = {
-                        "Name": {
-                            "title": [{"text": {"content": task_name}}]
-                        },
-                        "Slack Message Link": {
-                            "url": slack_link
-                        },
-                        "Created time": {
-                            "date": {"start": datetime.now().isoformat()}
-                        },
-                        "Tags": { # NEW: Add the "Tags" property with a default value
-                            "select": {
-                                "name": "2025 H2 Assessing"
-                            }
-                        }
-                    }
-                    
-                    try:
-                        new_page = notion_client.pages.create(
-                            parent={"database_id": SALES_DATABASE_ID},
-                            properties=notion_properties
-                        )
-                        
-                        slack_web_client.chat_postMessage(
-                            channel=channel_id,
-                            blocks=[{
-                                "type": "section",
-                                "text": {
-                                    "type": "mrkdwn",
-                                    "text": f"✅ New Notion task created from a reaction by <@{user_id}>: *<{new_page['url']}|View Task>*"
-                                }
-                            }]
-                        )
-                    except Exception as e:
-                        app.logger.error(f"Error creating Notion task from reaction: {e}")
-                        slack_web_client.chat_postMessage(
-                            channel=channel_id,
-                            text=f"Error creating Notion task: {e}"
-                        )
-            except SlackApiError as e:
-                app.logger.error(f"Error fetching message details: {e.response['error']}")
-                
-    return jsonify({"ok": True})
-
-
-@app.route("/slack/interactive", methods=["POST"])
-def slack_interactive():
+    try:
+        slack_web_client.views_open(
+            trigger_id=trigger_id,
+            view=modal
+        )
+        return ""
+    except SlackApiError as e:
+        logger.error(f"Error opening Slack modal for creation: {e.response['error']}")
+        return jsonify({
+            "response_type": "ephemeral",
+            "text": f"Error opening task creation form: {e.response['error']}"
+        })
+
+
+def _refresh_status_names():
+    """Reads the Status options from the task database (runs on the event queue)"""
+    try:
+        database = notion_client.databases.retrieve(database_id=NOTION_DATABASE_ID)
+        status = database.get("properties", {}).get("Status", {})
+        names = [option["name"] for option in status.get("status", {}).get("options", [])]
+        loaded_at = time.monotonic()
+    except Exception as e:
+        logger.warning(f"Could not read Status options from Notion: {e}")
+        names = None
+        # Try again soon instead of waiting out the whole TTL
+        loaded_at = time.monotonic() - STATUS_OPTIONS_TTL_SECONDS + STATUS_OPTIONS_RETRY_SECONDS
+    with _status_lock:
+        if names:
+            _status_cache["names"] = names
+        _status_cache["loaded_at"] = loaded_at
+        _status_cache["refreshing"] = False
+
+def _status_options():
+    """
+    Status options for the update modal. Never calls Notion on the request
+    thread: serves the cached names (the defaults until the first read) and
+    queues a refresh once they are older than the TTL.
+    """
+    with _status_lock:
+        names, loaded_at = _status_cache["names"], _status_cache["loaded_at"]
+        stale = loaded_at is None or time.monotonic() - loaded_at >= STATUS_OPTIONS_TTL_SECONDS
+        refresh = stale and not _status_cache["refreshing"] and _router is not None
+        if refresh:
+            _status_cache["refreshing"] = True
+    if refresh and not _router.defer(_refresh_status_names):
+        with _status_lock:
+            _status_cache["refreshing"] = False
+    return [{"text": {"type": "plain_text", "text": name}, "value": name} for name in names or DEFAULT_STATUS_NAMES]
+
+def open_update_task_modal(payload):
     """
-    Handles interactive Slack events, specifically modal submissions.
+    Handles the /update-notion-task slash command by opening the update modal,
+    with a typeahead picker for the task instead of a raw page ID.
     """
-    if not signature_verifier.is_valid_request(request.get_data(), request.headers):
-        app.logger.warning("Invalid Slack request signature.")
-        return "Invalid request signature", 403
-
-    payload = json.loads(request.form["payload"])
-    callback_id = payload.get("view", {}).get("callback_id")
-    user_id = payload.get("user", {}).get("id")
-    
-    if payload.get("type") == "view_submission":
-        if callback_id == "create_notion_task_modal":
-            values = payload.get("view", {}).get("state", {}).get("values", {})
+    trigger_id = payload.get("trigger_id")
+
+    modal = {
+        "type": "modal",
+        "callback_id": "update_notion_task_modal",
+        "title": {"type": "plain_text", "text": "Update Task"},
+        "submit": {"type": "plain_text", "text": "Update"},
+        "close": {"type": "plain_text", "text": "Cancel"},
+        "blocks": [
+            {
+                "type": "input",
+                "block_id": "update_task_block",
+                "label": {"type": "plain_text", "text": "Task (Required)"},
+                "element": {
+                    "type": "external_select",
+                    "action_id": "update_task_select",
+                    "placeholder": {"type": "plain_text", "text": "Search tasks by title"},
+                    "min_query_length": 0
+                },
+                "optional": False
+            },
+            {
+                "type": "input",
+                "block_id": "update_status_block",
+                "label": {"type": "plain_text", "text": "Status"},
+                "element": {
+                    "type": "static_select",
+                    "action_id": "update_status_select",
+                    "placeholder": {"type": "plain_text", "text": "Keep current status"},
+                    "options": _status_options()
+                },
+                "optional": True
+            },
+            {
+                "type": "input",
+                "block_id": "update_ddl_block",
+                "label": {"type": "plain_text", "text": "Due Date (DDL)"},
+                "element": {
+                    "type": "datepicker",
+                    "action_id": "update_ddl_datepicker",
+                    "placeholder": {"type": "plain_text", "text": "Keep current date"}
+                },
+                "optional": True
+            },
+            {
+                "type": "input",
+                "block_id": "update_pic_block",
+                "label": {"type": "plain_text", "text": "Assigned PIC (Email or Full Name)"},
+                "element": {
+                    "type": "plain_text_input",
+                    "action_id": "update_pic_input",
+                    "placeholder": {"type": "plain_text", "text": "Keep current PIC"}
+                },
+                "optional": True
+            },
+            {
+                "type": "input",
+                "block_id": "update_priority_block",
+                "label": {"type": "plain_text", "text": "Priority"},
+                "element": {
+                    "type": "static_select",
+                    "action_id": "update_priority_select",
+                    "placeholder": {"type": "plain_text", "text": "Keep current priority"},
+                    "options": PRIORITY_OPTIONS
+                },
+                "optional": True
+            },
+            {
+                "type": "input",
+                "block_id": "update_tags_block",
+                "label": {"type": "plain_text", "text": "Tags"},
+                "element": {
+                    "type": "static_select",
+                    "action_id": "update_tags_select",
+                    "placeholder": {"type": "plain_text", "text": "Keep current tag"},
+                    "options": TAG_OPTIONS
+                },
+                "optional": True
+            },
+            {
+                "type": "input",
+                "block_id": "update_parent_task_block",
+                "label": {"type": "plain_text", "text": "Subtask of (Parent Task)"},
+                "element": {
+                    "type": "external_select",
+                    "action_id": "update_parent_task_select",
+                    "placeholder": {"type": "plain_text", "text": "Search tasks by title"},
+                    "min_query_length": 0
+                },
+                "optional": True
+            }
+        ]
+    }
+
+    try:
+        slack_web_client.views_open(trigger_id=trigger_id, view=modal)
+        return ""
+    except SlackApiError as e:
+        logger.error(f"Error opening Slack modal for update: {e.response['error']}")
+        return jsonify({
+            "response_type": "ephemeral",
+            "text": f"Error opening task update form: {e.response['error']}"
+        })
+
+def task_options(payload):
+    """
+    Options for the task pickers, answered from the in-memory title index
+    (no Notion call per keystroke). The update modal's parent picker also
+    offers "— No parent —" to clear the parent.
+    """
+    results = task_index.search(payload.get("value", ""))
+    options = [
+        # Option text is limited to 75 characters
+        {"text": {"type": "plain_text", "text": title if len(title) <= 75 else title[:74] + "…"}, "value": page_id}
+        for page_id, title in results
+    ]
+    if payload.get("action_id") == "update_parent_task_select":
+        # Slack allows at most 100 options
+        options = [NO_PARENT_OPTION] + options[:99]
+    return jsonify({"options": options})
+
+def _selected_value(values, block_id, action_id):
+    return ((values.get(block_id, {}).get(action_id) or {}).get("selected_option") or {}).get("value")
+
+
+def handle_task_reaction(event):
+    """
+    Creates a task in the sales database from a reaction (runs on the event queue).
+    """
+    user_id = event["user"]
+    channel_id = event["item"]["channel"]
+    message_ts = event["item"]["ts"]
+
+    try:
+        # conversations.replies returns the reacted message whether it is a
+        # thread root, a reply or unthreaded; conversations.history misses replies
+        message_response = slack_web_client.conversations_replies(
+            channel=channel_id,
+            ts=message_ts,
+            limit=1,
+            inclusive=True
+        )
+        original_message = next(
+            (m for m in message_response.get("messages") or [] if m.get("ts") == message_ts), None
+        )
+        if message_response["ok"] and original_message:
+            message_text = original_message.get("text")
+
+            if original_message.get("user") == bot_identity.get_bot_user_id(slack_web_client):
+                logger.info("Reaction added to the bot's own message. Skipping Notion task creation.")
+                return
             
-            task_name = values.get("task_name_block", {}).get("task_name_input", {}).get("value")
-            status = values.get("status_block", {}).get("status_select", {}).get("selected_option", {}).get("value")
-            pic_input = values.get("pic_block", {}).get("pic_input", {}).get("value")
-            ddl_date = values.get("ddl_block", {}).get("ddl_datepicker", {}).get("selected_date")
-            priority = values.get("priority_block", {}).get("priority_select", {}).get("selected_option", {}).get("value")
-            tags = values.get("tags_block", {}).get("tags_select", {}).get("selected_option", {}).get("value")
-            parent_task_id = values.get("parent_task_block", {}).get("parent_task_input", {}).get("value")
-
-            errors = {}
-            if not task_name: errors["task_name_block"] = "Task Name is required."
-            if not pic_input: errors["pic_block"] = "Assigned PIC is required."
-            if not ddl_date: errors["ddl_block"] = "Due Date (DDL) is required."
-            if not priority: errors["priority_block"] = "Priority is required."
-            if errors: return jsonify({"response_action": "errors", "errors": errors})
+            if not message_text:
+                logger.warning("Reaction added to a message with no text. Skipping Notion task creation.")
+                return
 
+            # Create the Notion task in the SALES_DATABASE_ID
+            task_name = f"Slack Request: {message_text[:100]}..." if len(message_text) > 100 else f"Slack Request: {message_text}"
+            slack_link = slack_web_client.chat_getPermalink(channel=channel_id, message_ts=message_ts)["permalink"]
+            
             notion_properties = {
-                "Name": {"title": [{"text": {"content": task_name}}]},
-                "Status": {"status": {"name": status}},
-                "DDL": {"date": {"start": ddl_date}},
-                "Priority": {"select": {"name": priority}},
+                "Name": {
+                    "title": [{"text": {"content": task_name}}]
+                },
+                "Slack Message Link": {
+                    "url": slack_link
+                },
+                "Created time": {
+                    "date": {"start": datetime.now().isoformat()}
+                },
+                "Tags": { # NEW: Add the "Tags" property with a default value
+                    "select": {
+                        "name": "2025 H2 Assessing"
+                    }
+                }
             }
             
-            if pic_input:
-                notion_person_object = get_notion_person_id_from_slack_input(user_id, pic_input)
-                if notion_person_object: notion_properties["PIC"] = {"people": [notion_person_object]}
-            if parent_task_id: notion_properties["Parent task"] = {"relation": [{"id": parent_task_id}]}
-            if tags: # NEW: Add the tags property if a tag was selected
-                notion_properties["Tags"] = {"select": {"name": tags}}
-
-            try:
-                new_page = notion_client.pages.create(parent={"database_id": NOTION_DATABASE_ID}, properties=notion_properties)
-                slack_web_client.chat_postMessage(channel=OFFICIAL_CHANNEL_ID, blocks=[{"type": "section", "text": {"type": "mrkdwn", "text": f"✅ Task created by <@{user_id}>: *<{new_page['url']}|{task_name}>*"}}, {"type": "context", "elements": [{"type": "mrkdwn", "text": "You can add more details in Notion."}]}])
-                return jsonify({"response_action": "clear"})
-            except Exception as e:
-                app.logger.error(f"Error creating Notion task from modal: {e}")
-                return jsonify({"response_action": "errors", "errors": {"task_name_block": f"Error creating task: {e}. Please check logs."}})
-
-        elif callback_id == "update_notion_task_modal":
-            values = payload.get("view", {}).get("state", {}).get("values", {})
-            task_id_to_update = payload.get("view", {}).get("private_metadata")
-
-            new_status = values.get("update_status_block", {}).get("update_status_select", {}).get("selected_option", {}).get("value")
-            new_ddl_date = values.get("update_ddl_block", {}).get("update_ddl_datepicker", {}).get("selected_date")
-            new_pic_input = values.get("update_pic_block", {}).get("update_pic_input", {}).get("value")
-            new_priority = values.get("update_priority_block", {}).get("update_priority_select", {}).get("selected_option", {}).get("value")
-            new_parent_task_id = values.get("update_parent_task_block", {}).get("update_parent_task_input", {}).get("value")
-            new_tags = values.get("update_tags_block", {}).get("update_tags_select", {}).get("selected_option", {}).get("value")
-
-            update_properties = {}
-            if new_status: update_properties["Status"] = {"status": {"name": new_status}}
-            if new_ddl_date: update_properties["DDL"] = {"date": {"start": new_ddl_date}}
-            elif new_ddl_date == "": update_properties["DDL"] = {"date": None}
-            if new_priority: update_properties["Priority"] = {"select": {"name": new_priority}}
-            if new_tags: update_properties["Tags"] = {"select": {"name": new_tags}} # NEW: Add new Tags to update properties
-
-            if new_pic_input:
-                notion_person_object = get_notion_person_id_from_slack_input(user_id, new_pic_input)
-                if notion_person_object: update_properties["PIC"] = {"people": [notion_person_object]}
-            elif new_pic_input == "": update_properties["PIC"] = {"people": []}
-            if new_parent_task_id: update_properties["Parent task"] = {"relation": [{"id": new_parent_task_id}]}
-            elif new_parent_task_id == "": update_properties["Parent task"] = {"relation": []}
-
-            if not update_properties: return jsonify({"response_action": "errors", "errors": {"task_id_display_block": "No properties selected for update."}})
-
-            try:
-                updated_page = notion_client.pages.update(page_id=task_id_to_update, properties=update_properties)
-                updated_task_name = updated_page.get("properties", {}).get("Name", {}).get("title", [{}])[0].get("plain_text", "Unknown Task")
+            def task_created(new_page):
+                slack_web_client.chat_postMessage(
+                    channel=channel_id,
+                    blocks=[{
+                        "type": "section",
+                        "text": {
+                            "type": "mrkdwn",
+                            "text": f"✅ New Notion task created from a reaction by <@{user_id}>: *<{new_page['url']}|View Task>*"
+                        }
+                    }]
+                )
 
+            def task_failed(e):
+                logger.error(f"Error creating Notion task from reaction: {e}")
                 slack_web_client.chat_postMessage(
-                    channel=OFFICIAL_CHANNEL_ID,
-                    blocks=[{"type": "section", "text": {"type": "mrkdwn", "text": f"✅ Task updated by <@{user_id}>: *<{updated_page['url']}|{updated_task_name}>*"}}, {"type": "context", "elements": [{"type": "mrkdwn", "text": "Changes applied in Notion."}]}]
+                    channel=channel_id,
+                    text=f"Error creating Notion task: {e}"
                 )
-                return jsonify({"response_action": "clear"})
-            except Exception as e:
-                app.logger.error(f"Error updating Notion task from modal: {e}")
-                return jsonify({"response_action": "errors", "errors": {"task_id_display_block": f"Error updating task: {e}. Please check logs. Ensure Task ID is correct."}})
-    
-    return jsonify({"ok": True})
+
+            # Written in the background with other reactions in the same window;
+            # several reactions on one message create a single task
+            page_writer.submit(
+                ("task", channel_id, message_ts),
+                on_created=task_created,
+                on_failed=task_failed,
+                parent={"database_id": SALES_DATABASE_ID},
+                properties=notion_properties
+            )
+    except SlackApiError as e:
+        logger.error(f"Error fetching message details: {e.response['error']}")
+        bot_identity.handle_api_error(slack_web_client, e)
+
+
+def notify_submitter(user_id, text):
+    """
+    Tells the user who submitted a modal how it went: ephemeral in the
+    official channel, or a DM if they are not in it.
+    """
+    try:
+        slack_web_client.chat_postEphemeral(channel=OFFICIAL_CHANNEL_ID, user=user_id, text=text)
+    except SlackApiError as e:
+        logger.warning(f"Could not post ephemeral message to {user_id} ({e.response['error']}), sending a DM")
+        try:
+            slack_web_client.chat_postMessage(channel=user_id, text=text)
+        except SlackApiError as e:
+            logger.error(f"Error notifying {user_id}: {e.response['error']}")
+            bot_identity.handle_api_error(slack_web_client, e)
+
+
+def _submit_in_background(stage_prefix, job, *args):
+    """
+    Queue the Notion write for a validated modal and clear the modal at once.
+    Slack only waits 3 seconds for the response.
+    """
+    submitted_at = time.monotonic()
+
+    def run():
+        modal_latency.record(f"{stage_prefix}.queue_wait", time.monotonic() - submitted_at)
+        # A user is waiting on the result: serve it before batch work
+        with request_priority(PRIORITY_INTERACTIVE):
+            job(*args)
+        modal_latency.record(f"{stage_prefix}.total", time.monotonic() - submitted_at)
+
+    if not _router.defer(run):
+        return None
+    return jsonify({"response_action": "clear"})
+
+
+def create_task_from_modal(user_id, task_name, notion_properties, pic_input):
+    """
+    Background half of the creation modal: Notion write, then the channel post.
+    """
+    if pic_input:
+        with modal_latency.measure("create.pic_lookup"):
+            notion_person_object = get_notion_person_id_from_slack_input(user_id, pic_input)
+        if notion_person_object: notion_properties["PIC"] = {"people": [notion_person_object]}
+        else: notify_submitter(user_id, f"⚠️ No Notion user found for PIC '{pic_input}'; creating *{task_name}* without a PIC.")
+
+    try:
+        with modal_latency.measure("create.notion_write"):
+            new_page = notion_client.pages.create(parent={"database_id": NOTION_DATABASE_ID}, properties=notion_properties)
+    except Exception as e:
+        logger.error(f"Error creating Notion task from modal: {e}")
+        notify_submitter(user_id, f"❌ Could not create task *{task_name}* in Notion: {e}")
+        return
+
+    try:
+        with modal_latency.measure("create.slack_post"):
+            slack_web_client.chat_postMessage(channel=OFFICIAL_CHANNEL_ID, blocks=[{"type": "section", "text": {"type": "mrkdwn", "text": f"✅ Task created by <@{user_id}>: *<{new_page['url']}|{task_name}>*"}}, {"type": "context", "elements": [{"type": "mrkdwn", "text": "You can add more details in Notion."}]}])
+    except SlackApiError as e:
+        logger.error(f"Error announcing new task: {e.response['error']}")
+        notify_submitter(user_id, f"✅ Task created: <{new_page['url']}|{task_name}>")
+
+
+def update_task_from_modal(user_id, task_id_to_update, update_properties, new_pic_input):
+    """
+    Background half of the update modal: Notion write, then the channel post.
+    """
+    if new_pic_input:
+        with modal_latency.measure("update.pic_lookup"):
+            notion_person_object = get_notion_person_id_from_slack_input(user_id, new_pic_input)
+        if notion_person_object: update_properties["PIC"] = {"people": [notion_person_object]}
+        elif update_properties: notify_submitter(user_id, f"⚠️ No Notion user found for PIC '{new_pic_input}'; updating the other fields only.")
+    if not update_properties:
+        notify_submitter(user_id, f"⚠️ Task not updated: could not find a Notion user for PIC '{new_pic_input}'.")
+        return
+
+    try:
+        with modal_latency.measure("update.notion_write"):
+            updated_page = notion_client.pages.update(page_id=task_id_to_update, properties=update_properties)
+    except Exception as e:
+        logger.error(f"Error updating Notion task from modal: {e}")
+        notify_submitter(user_id, f"❌ Could not update task {task_id_to_update} in Notion: {e}. Ensure Task ID is correct.")
+        return
+    updated_task_name = updated_page.get("properties", {}).get("Name", {}).get("title", [{}])[0].get("plain_text", "Unknown Task")
+
+    try:
+        with modal_latency.measure("update.slack_post"):
+            slack_web_client.chat_postMessage(
+                channel=OFFICIAL_CHANNEL_ID,
+                blocks=[{"type": "section", "text": {"type": "mrkdwn", "text": f"✅ Task updated by <@{user_id}>: *<{updated_page['url']}|{updated_task_name}>*"}}, {"type": "context", "elements": [{"type": "mrkdwn", "text": "Changes applied in Notion."}]}]
+            )
+    except SlackApiError as e:
+        logger.error(f"Error announcing task update: {e.response['error']}")
+        notify_submitter(user_id, f"✅ Task updated: <{updated_page['url']}|{updated_task_name}>")
+
+
+def handle_create_task_submission(payload):
+    """
+    Handles submissions of the task creation modal: validates the input and
+    queues the Notion write.
+    """
+    with modal_latency.measure("create.validate"):
+        user_id = payload.get("user", {}).get("id")
+        values = payload.get("view", {}).get("state", {}).get("values", {})
+
+        task_name = values.get("task_name_block", {}).get("task_name_input", {}).get("value")
+        # The creation modal has no status input; a view carrying one still sets it
+        status = _selected_value(values, "status_block", "status_select")
+        pic_input = values.get("pic_block", {}).get("pic_input", {}).get("value")
+        ddl_date = values.get("ddl_block", {}).get("ddl_datepicker", {}).get("selected_date")
+        priority = values.get("priority_block", {}).get("priority_select", {}).get("selected_option", {}).get("value")
+        tags = values.get("tags_block", {}).get("tags_select", {}).get("selected_option", {}).get("value")
+        parent_task_id = _selected_value(values, "parent_task_block", "parent_task_select")
+
+        errors = {}
+        if not task_name: errors["task_name_block"] = "Task Name is required."
+        if not pic_input: errors["pic_block"] = "Assigned PIC is required."
+        if not ddl_date: errors["ddl_block"] = "Due Date (DDL) is required."
+        if not priority: errors["priority_block"] = "Priority is required."
+        if errors: return jsonify({"response_action": "errors", "errors": errors})
+
+        notion_properties = {
+            "Name": {"title": [{"text": {"content": task_name}}]},
+            "DDL": {"date": {"start": ddl_date}},
+            "Priority": {"select": {"name": priority}},
+        }
+        if status: notion_properties["Status"] = {"status": {"name": status}}
+        if parent_task_id: notion_properties["Parent task"] = {"relation": [{"id": parent_task_id}]}
+        if tags: # NEW: Add the tags property if a tag was selected
+            notion_properties["Tags"] = {"select": {"name": tags}}
+
+    response = _submit_in_background("create", create_task_from_modal, user_id, task_name, notion_properties, pic_input)
+    if response is None:
+        return jsonify({"response_action": "errors", "errors": {"task_name_block": "The bot is busy right now, please submit again in a moment."}})
+    return response
+
+
+def handle_update_task_submission(payload):
+    """
+    Handles submissions of the task update modal: validates the input and
+    queues the Notion write.
+    """
+    with modal_latency.measure("update.validate"):
+        user_id = payload.get("user", {}).get("id")
+        values = payload.get("view", {}).get("state", {}).get("values", {})
+        # The picked task; views opened with the page ID in private_metadata still work
+        task_id_to_update = _selected_value(values, "update_task_block", "update_task_select") or payload.get("view", {}).get("private_metadata")
+
+        new_status = values.get("update_status_block", {}).get("update_status_select", {}).get("selected_option", {}).get("value")
+        new_ddl_date = values.get("update_ddl_block", {}).get("update_ddl_datepicker", {}).get("selected_date")
+        new_pic_input = values.get("update_pic_block", {}).get("update_pic_input", {}).get("value")
+        new_priority = values.get("update_priority_block", {}).get("update_priority_select", {}).get("selected_option", {}).get("value")
+        new_parent_task_id = _selected_value(values, "update_parent_task_block", "update_parent_task_select")
+        new_tags = values.get("update_tags_block", {}).get("update_tags_select", {}).get("selected_option", {}).get("value")
+
+        update_properties = {}
+        if new_status: update_properties["Status"] = {"status": {"name": new_status}}
+        if new_ddl_date: update_properties["DDL"] = {"date": {"start": new_ddl_date}}
+        elif new_ddl_date == "": update_properties["DDL"] = {"date": None}
+        if new_priority: update_properties["Priority"] = {"select": {"name": new_priority}}
+        if new_tags: update_properties["Tags"] = {"select": {"name": new_tags}} # NEW: Add new Tags to update properties
+
+        if new_pic_input == "": update_properties["PIC"] = {"people": []}
+        if new_parent_task_id == NO_PARENT_VALUE: update_properties["Parent task"] = {"relation": []}
+        elif new_parent_task_id: update_properties["Parent task"] = {"relation": [{"id": new_parent_task_id}]}
+
+        if not task_id_to_update: return jsonify({"response_action": "errors", "errors": {"update_task_block": "Pick the task to update."}})
+        if new_parent_task_id == task_id_to_update: return jsonify({"response_action": "errors", "errors": {"update_parent_task_block": "A task cannot be its own parent."}})
+        if not update_properties and not new_pic_input: return jsonify({"response_action": "errors", "errors": {"update_task_block": "No properties selected for update."}})
+
+    response = _submit_in_background("update", update_task_from_modal, user_id, task_id_to_update, update_properties, new_pic_input)
+    if response is None:
+        return jsonify({"response_action": "errors", "errors": {"update_task_block": "The bot is busy right now, please submit again in a moment."}})
+    return response
+
+
+def stats():
+    """Per-stage latency of modal submissions (validation, queue wait, Notion, Slack)"""
+    return {"modal_latency": modal_latency.stats(), "notion_users": notion_users.stats(), "task_index": task_index.stats()}
+
+
+def warm_up():
+    """Per-worker startup: load the task picker index in the background"""
+    task_index.warm_up()
+
+
+def register(router):
+    """
+    Registers the slash command, modals and reaction on the shared event router.
+    Modal writes run on the router's background queue.
+    """
+    global _router
+    _router = router
+    router.on_command("/create-notion-task")(open_create_task_modal)
+    router.on_command("/update-notion-task")(open_update_task_modal)
+    router.on_view_submission("create_notion_task_modal")(handle_create_task_submission)
+    router.on_view_submission("update_notion_task_modal")(handle_update_task_submission)
+    for action_id in ("parent_task_select", "update_task_select", "update_parent_task_select"):
+        router.on_options(action_id)(task_options)
+    router.on_reaction(TRIGGER_EMOJI)(handle_task_reaction)
+
 
 if __name__ == "__main__":
     if not all([SLACK_BOT_TOKEN, NOTION_API_KEY, NOTION_DATABASE_ID, SALES_DATABASE_ID, SLACK_SIGNING_SECRET]):
-        app.logger.error("Error: One or more essential environment variables are missing. Please check your .env file.")
+        logger.error("Error: One or more essential environment variables are missing. Please check your .env file.")
         sys.exit(1)
 
-    app.run(host="0.0.0.0", port=5001, debug=True)
\ No newline at end of file
+    # The handlers are served by the shared app (python main.py / gunicorn);
+    # this keeps the old standalone entry point on port 5001 working
+    from slack_message_handler import app
+
+    bot_identity.warm_up(slack_web_client)
+    app.run(host="0.0.0.0", port=5001, debug=os.getenv("DEBUG_MODE", "false").lower() == "true", threaded=True)
\ No newline at end of file
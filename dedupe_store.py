@@ -0,0 +1,212 @@
+"""
+Dedupe store for Slack events
+Remembers which events/messages were already handled so retries and
+duplicate deliveries never create a second Notion page.
+
+Backends:
+- memory: in-process FIFO with TTL (single worker only)
+- sqlite: file-backed store shared by every worker process on the host
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600  # Slack stops retrying long before this
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_DB_PATH = "dedupe.sqlite3"
+
+
+def message_key(channel_id, message_ts):
+    """Dedupe key for a Slack message"""
+    return f"msg:{channel_id}:{message_ts}"
+
+
+def event_key(event_id):
+    """Dedupe key for a Slack Events API delivery"""
+    return f"evt:{event_id}"
+
+
+class DedupeStore:
+    """Base class: atomic check-and-insert with time-based eviction"""
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+
+    def add_if_absent(self, key):
+        """
+        Record the key if it has not been seen within the TTL.
+        Returns True if the key is new (caller should process it),
+        False if it is a duplicate.
+        """
+        is_new = self._add_if_absent(key, time.time())
+        with self._counter_lock:
+            if is_new:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return is_new
+
+    def discard(self, key):
+        """Forget a key so the event can be retried"""
+        raise NotImplementedError
+
+    def size(self):
+        """Number of keys currently stored"""
+        raise NotImplementedError
+
+    def _add_if_absent(self, key, now):
+        raise NotImplementedError
+
+    def after_fork(self):
+        """Drop per-process resources inherited from a parent process"""
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._counter_lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "backend": self.backend,
+            "size": self.size(),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": hits,
+            "misses": misses,
+        }
+
+
+class MemoryDedupeStore(DedupeStore):
+    """
+    In-memory store with TTL; only dedupes within a single process.
+    Eviction is FIFO: a duplicate does not extend its key's lifetime, so keys
+    stay ordered by expiry and expired ones are dropped from the front.
+    """
+
+    backend = "memory"
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        super().__init__(ttl_seconds, max_entries)
+        self._entries = OrderedDict()  # key -> expires_at, oldest first
+        self._lock = threading.Lock()
+
+    def _add_if_absent(self, key, now):
+        with self._lock:
+            # Entries are kept in insertion order, so expired ones sit at the front
+            while self._entries:
+                oldest_key, expires_at = next(iter(self._entries.items()))
+                if expires_at > now:
+                    break
+                del self._entries[oldest_key]
+
+            if key in self._entries:
+                return False
+
+            self._entries[key] = now + self.ttl_seconds
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteDedupeStore(DedupeStore):
+    """File-backed store; safe to share between gunicorn workers"""
+
+    backend = "sqlite"
+
+    # How many inserts between sweeps of expired rows
+    PURGE_EVERY = 100
+
+    def __init__(self, path=DEFAULT_DB_PATH, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        super().__init__(ttl_seconds, max_entries)
+        self.path = path
+        self._local = threading.local()
+        self._inserts = 0
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS dedupe ("
+            " key TEXT PRIMARY KEY,"
+            " expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS dedupe_expires ON dedupe (expires_at)")
+
+    def after_fork(self):
+        # SQLite connections must not be used across fork(): reconnect lazily
+        self._local = threading.local()
+
+    def _connection(self):
+        """One connection per thread (sqlite3 connections are not thread-safe)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def _add_if_absent(self, key, now):
+        conn = self._connection()
+        # BEGIN IMMEDIATE takes the write lock up front, so the
+        # expire-then-insert pair is atomic across threads and processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM dedupe WHERE key = ? AND expires_at <= ?", (key, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO dedupe (key, expires_at) VALUES (?, ?)",
+                (key, now + self.ttl_seconds)
+            )
+            is_new = cursor.rowcount == 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if is_new:
+            with self._counter_lock:
+                self._inserts += 1
+                purge = self._inserts % self.PURGE_EVERY == 0
+            if purge:
+                self._purge(now)
+        return is_new
+
+    def _purge(self, now):
+        """Drop expired rows and trim the table down to max_entries"""
+        conn = self._connection()
+        conn.execute("DELETE FROM dedupe WHERE expires_at <= ?", (now,))
+        conn.execute(
+            "DELETE FROM dedupe WHERE key IN ("
+            " SELECT key FROM dedupe ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def discard(self, key):
+        self._connection().execute("DELETE FROM dedupe WHERE key = ?", (key,))
+
+    def size(self):
+        return self._connection().execute("SELECT COUNT(*) FROM dedupe").fetchone()[0]
+
+
+def create_dedupe_store(backend=None):
+    """Build the dedupe store selected by the DEDUPE_* environment variables"""
+    backend = (backend or os.getenv("DEDUPE_BACKEND", "sqlite")).lower()
+    ttl_seconds = int(os.getenv("DEDUPE_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+    max_entries = int(os.getenv("DEDUPE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+
+    if backend == "memory":
+        return MemoryDedupeStore(ttl_seconds=ttl_seconds, max_entries=max_entries)
+    if backend == "sqlite":
+        path = os.getenv("DEDUPE_DB_PATH", DEFAULT_DB_PATH)
+        return SQLiteDedupeStore(path=path, ttl_seconds=ttl_seconds, max_entries=max_entries)
+    raise ValueError(f"Unknown DEDUPE_BACKEND: {backend}")
@@ -0,0 +1,110 @@
+"""
+Digest state for weekly_update diffing
+Stores a compact fingerprint of every task in the last posted digest
+(status, DDL, progress hash, title) so the next run can post only what
+changed: new, changed, newly overdue and closed tasks.
+"""
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import List
+
+DEFAULT_STATE_PATH = "digest_state.json"
+
+
+def _progress_hash(progress):
+    if not progress:
+        return ""
+    return hashlib.sha1(progress.encode("utf-8")).hexdigest()[:8]
+
+
+def fingerprint(task):
+    """Compact [status, ddl, progress hash, title] for a TaskRecord"""
+    return [task.status or "", task.ddl_text or "", _progress_hash(task.action_progress), task.title or ""]
+
+
+@dataclass
+class DigestDelta:
+    """What changed between the last posted digest and now"""
+    since: date
+    new: List = field(default_factory=list)          # TaskRecords
+    changed: List = field(default_factory=list)      # (TaskRecord, previous fingerprint)
+    overdue: List = field(default_factory=list)      # TaskRecords that went overdue since the last post
+    closed: List = field(default_factory=list)       # (task id, previous fingerprint)
+
+    def is_empty(self):
+        return not (self.new or self.changed or self.overdue or self.closed)
+
+
+def compute_delta(previous, tasks, today=None):
+    """
+    Compare current TaskRecords with a previous digest state
+    ({"posted_at": iso date, "tasks": {task id: fingerprint}}).
+    """
+    today = today or date.today()
+    since = date.fromisoformat(previous["posted_at"][:10])
+    previous_tasks = previous.get("tasks", {})
+    delta = DigestDelta(since=since)
+
+    current_ids = set()
+    for task in tasks:
+        current_ids.add(task.id)
+        old = previous_tasks.get(task.id)
+        if old is None:
+            delta.new.append(task)
+            continue
+        if fingerprint(task) != list(old):
+            delta.changed.append((task, old))
+        # Went past its DDL since the last digest (already-overdue tasks were reported then)
+        if task.ddl and since <= task.ddl < today:
+            delta.overdue.append(task)
+
+    for task_id, old in previous_tasks.items():
+        if task_id not in current_ids:
+            delta.closed.append((task_id, old))
+    return delta
+
+
+class DigestState:
+    """JSON file of the last posted digest, per channel"""
+
+    def __init__(self, path=DEFAULT_STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read digest state: {e}")
+            return {}
+
+    def previous(self, key):
+        """Last saved state for the key (e.g. channel ID), or None"""
+        with self._lock:
+            return self._load().get(key)
+
+    def save(self, key, tasks, posted_at=None):
+        """Record the tasks that were just posted under the key"""
+        posted_at = posted_at or datetime.now()
+        with self._lock:
+            state = self._load()
+            state[key] = {
+                "posted_at": posted_at.isoformat(),
+                "tasks": {task.id: fingerprint(task) for task in tasks},
+            }
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.path)
+
+
+def create_digest_state():
+    """Digest state configured from DIGEST_STATE_PATH"""
+    return DigestState(os.getenv("DIGEST_STATE_PATH", DEFAULT_STATE_PATH))
@@ -0,0 +1,205 @@
+"""
+Background event queue for Slack event processing
+Lets the HTTP handlers acknowledge Slack immediately while slow work
+(Slack/Notion API calls) runs on a bounded pool of worker threads
+"""
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Sentinel placed on the queue to stop a worker thread
+_STOP = object()
+
+# Number of recent samples kept for latency percentiles
+LATENCY_SAMPLE_SIZE = 500
+
+
+def _percentile(samples, pct):
+    """Return the given percentile (0-100) of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class EventQueue:
+    """Bounded queue drained by a fixed pool of worker threads"""
+
+    def __init__(self, handler, name="events", workers=4, max_size=100):
+        self.handler = handler
+        self.name = name
+        self.workers = workers
+        self.max_size = max_size
+        self._queue = queue.Queue(maxsize=max_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wait_times = deque(maxlen=LATENCY_SAMPLE_SIZE)
+        self._run_times = deque(maxlen=LATENCY_SAMPLE_SIZE)
+        self._busy = 0
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self):
+        """Start the worker threads (no-op if they are already running)"""
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    name=f"{self.name}-worker-{i}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, item):
+        """
+        Queue an item for background processing.
+        Returns False if the queue is full and the item was dropped.
+        """
+        if len(self._threads) < self.workers:
+            self.start()
+
+        try:
+            self._queue.put_nowait((time.monotonic(), item))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            print(f"⚠️  {self.name} queue full ({self.max_size}), dropping event")
+            return False
+
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def _worker(self):
+        """Worker loop: pull items off the queue and run the handler"""
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                self._queue.task_done()
+                return
+
+            enqueued_at, item = entry
+            started_at = time.monotonic()
+            with self._lock:
+                self._busy += 1
+
+            failed = False
+            try:
+                self.handler(item)
+            except Exception as e:
+                failed = True
+                print(f"❌ Error in {self.name} worker: {e}")
+            finally:
+                finished_at = time.monotonic()
+                with self._lock:
+                    self._busy -= 1
+                    self._wait_times.append(started_at - enqueued_at)
+                    self._run_times.append(finished_at - started_at)
+                    if failed:
+                        self.failed += 1
+                    else:
+                        self.processed += 1
+                self._queue.task_done()
+
+    def stats(self):
+        """Queue depth, throughput counters and worker latency (in ms)"""
+        with self._lock:
+            wait_times = list(self._wait_times)
+            run_times = list(self._run_times)
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_size": self.max_size,
+                "workers": self.workers,
+                "busy_workers": self._busy,
+                "enqueued": self.enqueued,
+                "processed": self.processed,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "wait_ms": {
+                    "avg": round(sum(wait_times) / len(wait_times) * 1000, 1) if wait_times else 0.0,
+                    "p95": round(_percentile(wait_times, 95) * 1000, 1),
+                },
+                "latency_ms": {
+                    "avg": round(sum(run_times) / len(run_times) * 1000, 1) if run_times else 0.0,
+                    "p95": round(_percentile(run_times, 95) * 1000, 1),
+                    "max": round(max(run_times) * 1000, 1) if run_times else 0.0,
+                },
+            }
+
+    def shutdown(self, drain=True, timeout=None):
+        """
+        Stop the worker threads.
+        With drain=True, queued items are processed before the workers exit.
+        """
+        if not drain:
+            try:
+                while True:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+            except queue.Empty:
+                pass
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        threads = list(self._threads)
+        for _ in threads:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                self._queue.put(_STOP, timeout=remaining)
+            except queue.Full:
+                break
+
+        for thread in threads:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            thread.join(remaining)
+
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+        return not self._threads
+
+
+class StageLatency:
+    """Recent durations per named stage of a pipeline (e.g. queue wait, Notion write)"""
+
+    def __init__(self, sample_size=LATENCY_SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self._lock = threading.Lock()
+        self._samples = {}  # stage -> deque of seconds
+        self._counts = {}
+
+    def record(self, stage, seconds):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.sample_size)
+            samples.append(seconds)
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+
+    @contextmanager
+    def measure(self, stage):
+        """Record how long the with-block took, even if it raised"""
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(stage, time.monotonic() - started_at)
+
+    def stats(self):
+        """Per-stage count and latency (in ms)"""
+        with self._lock:
+            snapshot = {stage: (self._counts[stage], list(samples)) for stage, samples in self._samples.items()}
+        return {
+            stage: {
+                "count": count,
+                "avg_ms": round(sum(samples) / len(samples) * 1000, 1),
+                "p95_ms": round(_percentile(samples, 95) * 1000, 1),
+                "max_ms": round(max(samples) * 1000, 1),
+            }
+            for stage, (count, samples) in snapshot.items()
+        }
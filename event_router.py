@@ -0,0 +1,176 @@
+"""
+Slack event router
+One registry for everything the bot reacts to, so a single Flask app can
+serve all handlers with shared clients, pools and caches:
+
+- event type -> handler       (Events API callbacks, optionally filtered)
+- emoji -> pipelines          (reaction_added, by reaction name and channel)
+- command -> handler          (slash commands)
+- callback_id -> handler      (modal view submissions)
+- action_id -> handler        (external_select option requests)
+
+Dispatch is a dict lookup per request. Event handlers and reaction
+pipelines run on the background queue given to use_queue(), so Slack gets
+its ack right away. Commands and view submissions run inline, since their
+return value is the HTTP response; so do option requests, which Slack
+expects within its options-load deadline. match() tells the endpoint whether an
+event is wanted at all, so unwanted ones are acked before any other work.
+"""
+import functools
+import threading
+
+
+class EventRouter:
+    """Registry of Slack handlers keyed by event type, emoji, command and callback_id"""
+
+    def __init__(self):
+        self._events = {}     # event type -> (handler(event), when(event) or None)
+        self._reactions = {}  # emoji -> [(pipeline(event), channel IDs or None)]
+        self._commands = {}   # "/command" -> handler(form)
+        self._views = {}      # callback_id -> handler(payload)
+        self._options = {}    # action_id -> handler(payload)
+        self._queue = None
+        self._lock = threading.Lock()
+        self.dispatched = 0
+        self.unrouted = 0
+
+    def use_queue(self, queue):
+        """Run event handlers and reaction pipelines on an EventQueue of callables"""
+        self._queue = queue
+
+    def _register(self, table, key, handler, kind):
+        with self._lock:
+            if key in table:
+                raise ValueError(f"Duplicate {kind} handler for {key!r}")
+            table[key] = handler
+
+    def on_event(self, event_type, when=None):
+        """
+        Decorator: handle Events API callbacks of this type, optionally only
+        those for which when(event) is true (checked before the ack).
+        """
+        def decorator(handler):
+            self._register(self._events, event_type, (handler, when), "event")
+            return handler
+        return decorator
+
+    def on_reaction(self, *emojis, channels=None):
+        """
+        Decorator: run the pipeline for reaction_added events with any of these
+        emojis, optionally only in the given channels.
+        """
+        channels = frozenset(channels) if channels is not None else None
+
+        def decorator(pipeline):
+            with self._lock:
+                for emoji in emojis:
+                    self._reactions.setdefault(emoji, []).append((pipeline, channels))
+            return pipeline
+        return decorator
+
+    def on_command(self, command):
+        """Decorator: handle a slash command (e.g. "/create-notion-task")"""
+        def decorator(handler):
+            self._register(self._commands, command, handler, "command")
+            return handler
+        return decorator
+
+    def on_view_submission(self, callback_id):
+        """Decorator: handle submissions of the modal with this callback_id"""
+        def decorator(handler):
+            self._register(self._views, callback_id, handler, "view")
+            return handler
+        return decorator
+
+    def on_options(self, action_id):
+        """Decorator: supply options for the external_select with this action_id"""
+        def decorator(handler):
+            self._register(self._options, action_id, handler, "options")
+            return handler
+        return decorator
+
+    def handles_reaction(self, emoji):
+        return emoji in self._reactions
+
+    def defer(self, func, *args, **kwargs):
+        """Run work on the background queue; returns False if the queue is full"""
+        job = functools.partial(func, *args, **kwargs)
+        if self._queue is None:
+            job()
+            return True
+        return self._queue.submit(job)
+
+    def _run(self, handler, argument):
+        """Queue (or run) one handler; returns False if the queue is full"""
+        if self._queue is None:
+            handler(argument)
+            return True
+        return self._queue.submit(functools.partial(handler, argument))
+
+    def match(self, event):
+        """Handlers that want an Events API event; empty if none do"""
+        event_type = event.get("type")
+        if event_type == "reaction_added":
+            pipelines = self._reactions.get(event.get("reaction"))
+            if not pipelines:
+                return ()
+            channel_id = event.get("item", {}).get("channel")
+            return tuple(pipeline for pipeline, channels in pipelines
+                         if channels is None or channel_id in channels)
+        entry = self._events.get(event_type)
+        if entry is None:
+            return ()
+        handler, when = entry
+        return (handler,) if when is None or when(event) else ()
+
+    def dispatch_event(self, event, handlers=None):
+        """
+        Route an Events API event to its handler or reaction pipelines
+        (handlers from match(), if the caller already has them).
+        Returns False if it could not be queued, so Slack should retry later.
+        """
+        if handlers is None:
+            handlers = self.match(event)
+        if not handlers:
+            self.unrouted += 1
+            return True
+        self.dispatched += 1
+        return all([self._run(handler, event) for handler in handlers])
+
+    def dispatch_command(self, form):
+        """Run the slash command handler; None if the command is not registered"""
+        handler = self._commands.get(form.get("command"))
+        if handler is None:
+            self.unrouted += 1
+            return None
+        self.dispatched += 1
+        return handler(form)
+
+    def dispatch_interactive(self, payload):
+        """Run the handler for an interactive payload; None if nothing handles it"""
+        handler = None
+        payload_type = payload.get("type")
+        if payload_type == "view_submission":
+            handler = self._views.get(payload.get("view", {}).get("callback_id"))
+        elif payload_type == "block_suggestion":
+            handler = self._options.get(payload.get("action_id"))
+        if handler is None:
+            self.unrouted += 1
+            return None
+        self.dispatched += 1
+        return handler(payload)
+
+    def stats(self):
+        return {
+            "events": sorted(self._events),
+            "reactions": sorted(self._reactions),
+            "commands": sorted(self._commands),
+            "views": sorted(self._views),
+            "options": sorted(self._options),
+            "dispatched": self.dispatched,
+            "unrouted": self.unrouted,
+        }
+
+
+# The router shared by every handler module in the process
+router = EventRouter()
@@ -0,0 +1,134 @@
+"""
+Concurrent fetch engine for Notion and Slack I/O
+- iter_query_pages(): pages through a Notion database query, requesting the
+  next cursor page while the caller is still processing the current one
+- run_concurrently(): runs independent calls (queries, schema lookups) in parallel
+- PostPipeline: posts Slack messages on a background thread, in order, so
+  rendering the next message overlaps with posting the previous one
+
+All calls still go through the shared rate limiter, so concurrency never
+exceeds the Slack/Notion limits; work submitted here keeps the caller's
+request priority.
+"""
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limiter import current_priority, request_priority
+
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "4"))
+PAGE_SIZE = 100
+
+# Page fetches get their own pool: they never wait on other futures, so
+# tasks running on the task pool can always make progress
+_task_executor = None
+_page_executor = None
+_lock = threading.Lock()
+
+
+def _executors():
+    global _task_executor, _page_executor
+    with _lock:
+        if _task_executor is None:
+            _task_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch-task")
+            _page_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch-page")
+        return _task_executor, _page_executor
+
+
+def _with_priority(fn):
+    """Wrap fn so it runs at the submitting thread's request priority"""
+    priority = current_priority()
+
+    def run(*args):
+        with request_priority(priority):
+            return fn(*args)
+    return run
+
+
+def iter_query_pages(notion_client, database_id, **query):
+    """
+    Yield every page of a Notion database query, following cursors.
+    The request for the next cursor is in flight while the current batch
+    of results is being consumed.
+    """
+    _, page_executor = _executors()
+
+    def fetch(start_cursor):
+        params = dict(query, page_size=PAGE_SIZE)
+        if start_cursor:
+            params["start_cursor"] = start_cursor
+        return notion_client.databases.query(database_id=database_id, **params)
+
+    fetch = _with_priority(fetch)
+    future = page_executor.submit(fetch, None)
+    while future is not None:
+        response = future.result()
+        future = None
+        if response.get("has_more") and response.get("next_cursor"):
+            future = page_executor.submit(fetch, response["next_cursor"])
+        yield from response["results"]
+
+
+def run_concurrently(calls, return_exceptions=False):
+    """
+    Run independent zero-argument callables in parallel.
+    calls: {name: callable}; returns {name: result}.
+    The first exception raised by any call is re-raised, unless
+    return_exceptions is set, in which case it is returned as the result.
+    """
+    task_executor, _ = _executors()
+    futures = {name: task_executor.submit(_with_priority(fn)) for name, fn in calls.items()}
+    results = {}
+    for name, future in futures.items():
+        error = future.exception()
+        if error is not None and not return_exceptions:
+            raise error
+        results[name] = error if error is not None else future.result()
+    return results
+
+
+class PostPipeline:
+    """
+    Posts Slack messages on a background thread, in submission order.
+    Each job is a callable that posts one message; its return value is
+    passed to the next job, so follow-ups can thread under the first post.
+    """
+
+    def __init__(self, name="slack-post"):
+        self._priority = current_priority()
+        self._jobs = queue.Queue()
+        self._results = []
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        with request_priority(self._priority):
+            self._drain()
+
+    def _drain(self):
+        previous = None
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            if self._error is not None:
+                continue
+            try:
+                previous = job(previous)
+                self._results.append(previous)
+            except Exception as e:
+                self._error = e
+
+    def submit(self, job):
+        """Queue a post job: job(previous_result) -> result"""
+        self._jobs.put(job)
+
+    def close(self):
+        """Wait for every queued post; returns the list of job results"""
+        self._jobs.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._results
@@ -0,0 +1,46 @@
+"""
+gunicorn configuration for the Slack handlers
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+- the app is preloaded once in the master and forked into the workers
+- workers default to the number of CPU cores (WEB_CONCURRENCY overrides);
+  each runs gthread request threads, since handlers mostly wait on Slack/Notion
+- on shutdown each worker drains its reaction queue, page writes and PM
+  notifications before exiting (within graceful_timeout)
+
+Background queues, the page writer and the PM notification window are per
+worker process; the SQLite dedupe store is shared, so an event is still only
+handled once across workers.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '3000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+preload_app = True
+
+# Slack expects an ack within 3 seconds; anything slower is queued work
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.start_worker()
+    server.log.info(f"Worker {worker.pid} started")
+
+
+def worker_exit(server, worker):
+    import wsgi
+    # Leave a little of the graceful timeout for the worker to exit cleanly
+    if wsgi.drain(timeout=max(1, graceful_timeout - 5)):
+        server.log.info(f"Worker {worker.pid} drained its queues")
+    else:
+        server.log.warning(f"Worker {worker.pid} exited with work still queued")
@@ -0,0 +1,213 @@
+"""
+Shared HTTP transport
+Keeps persistent keep-alive connection pools so Slack and Notion calls
+reuse TCP+TLS connections instead of handshaking on every request.
+
+- http_request(): raw HTTP helper backed by a pooled requests.Session
+- get_slack_client(): slack_sdk WebClient whose requests go through the same session
+- get_notion_client(): notion_client Client on a pooled httpx.Client
+
+Responses are gzip-compressed when the server supports it (both requests
+and httpx send Accept-Encoding: gzip and decompress transparently).
+
+All three are rate limited and retried by the shared rate_limiter.scheduler.
+"""
+import dataclasses
+import json
+import os
+import threading
+from urllib.error import URLError
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from notion_client import Client
+from notion_client.client import ClientOptions
+from slack_sdk import WebClient
+
+from rate_limiter import RateLimitedError, scheduler
+
+# Pool and timeout settings (see HTTP_* env vars)
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))  # hosts kept in the pool
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))          # connections per host
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+
+_session = None
+_slack_clients = {}   # token -> PooledWebClient
+_notion_clients = {}  # auth -> Client
+_lock = threading.Lock()
+
+SLACK_API_PREFIX = "https://slack.com/api/"
+
+
+def get_session():
+    """The process-wide pooled requests.Session"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=HTTP_POOL_MAXSIZE,
+                    max_retries=0
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _slack_channel(*payloads):
+    """Channel ID from a Slack API payload, if any (for per-channel limits)"""
+    for payload in payloads:
+        if isinstance(payload, dict) and payload.get("channel"):
+            return payload["channel"]
+    return None
+
+
+def http_request(url, method='GET', headers=None, data=None, timeout=None):
+    """
+    Make an HTTP request over the pooled session.
+    Slack Web API URLs are rate limited and retried on 429.
+    Returns a dict with status_code, text and a json() helper.
+    """
+    channel = _slack_channel(data)
+    if isinstance(data, dict):
+        data = json.dumps(data).encode('utf-8')
+
+    def send():
+        response = get_session().request(
+            method,
+            url,
+            headers=headers or {},
+            data=data,
+            timeout=timeout or (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+        )
+        if response.status_code == 429:
+            raise RateLimitedError(response.headers.get("Retry-After"), response)
+        return response
+
+    try:
+        if url.startswith(SLACK_API_PREFIX):
+            api_method = url[len(SLACK_API_PREFIX):].split("?", 1)[0]
+            response = scheduler.call("slack", api_method, send, channel=channel)
+        else:
+            response = send()
+    except RateLimitedError as e:
+        response = e.response
+    except requests.RequestException as e:
+        return {'status_code': 500, 'text': str(e), 'json': lambda: {}}
+
+    text = response.text
+    return {
+        'status_code': response.status_code,
+        'text': text,
+        'json': lambda: json.loads(text)
+    }
+
+
+class PooledWebClient(WebClient):
+    """
+    slack_sdk WebClient that sends its requests through the shared session.
+    slack_sdk builds the urllib Request (auth, body, retries); we only swap
+    the final urlopen for a pooled keep-alive request.
+
+    slack_sdk has no supported hook for its HTTP session, so this overrides
+    _perform_urllib_http_request_internal(url, req): slack_sdk is pinned in
+    requirements.txt to a release with that signature. The client's proxy is
+    passed to requests; a client with a custom ssl context goes through
+    slack_sdk's own urllib opener, since requests can't take one per request.
+    requests' connection errors are raised as the urllib errors slack_sdk's
+    retry handlers know (URLError, and TimeoutError for read timeouts), so
+    its ConnectionErrorRetryHandler still retries a dropped connection.
+    """
+
+    def api_call(self, api_method, **kwargs):
+        channel = _slack_channel(kwargs.get("json"), kwargs.get("data"), kwargs.get("params"))
+        return scheduler.call(
+            "slack",
+            api_method,
+            lambda: super(PooledWebClient, self).api_call(api_method, **kwargs),
+            channel=channel
+        )
+
+    def _perform_urllib_http_request_internal(self, url, req):
+        if self.ssl is not None or (self.proxy is not None and not isinstance(self.proxy, str)) \
+                or not url.lower().startswith("http"):
+            # slack_sdk validates the proxy and URL and applies the ssl context itself
+            return super()._perform_urllib_http_request_internal(url, req)
+
+        try:
+            response = get_session().request(
+                req.get_method(),
+                url,
+                data=req.data,
+                headers=dict(req.header_items()),
+                timeout=(HTTP_CONNECT_TIMEOUT, self.timeout),
+                proxies={"http": self.proxy, "https": self.proxy} if self.proxy else None
+            )
+        except requests.ConnectionError as e:
+            # Includes connect timeouts and dropped keep-alive connections;
+            # urllib raises these as URLError
+            raise URLError(e) from e
+        except requests.Timeout as e:
+            # A read timeout: urllib's socket.timeout
+            raise TimeoutError(str(e)) from e
+        # Like slack_sdk: gzip downloads (admin.analytics.getFile) stay bytes
+        gzipped = response.headers.get("Content-Type", "").startswith("application/gzip")
+        return {
+            "status": response.status_code,
+            "headers": dict(response.headers),
+            "body": response.content if gzipped else response.text,
+        }
+
+
+class ScheduledNotionClient(Client):
+    """
+    notion_client Client whose requests go through the rate limiter.
+    The scheduler is the only layer that retries: notion_client is pinned to
+    a release without built-in retries (and the last on Notion-Version
+    2022-06-28, which databases.query needs), and get_notion_client() turns
+    the client's own retries off on releases that have them.
+    """
+
+    def request(self, path, method, *args, **kwargs):
+        return scheduler.call(
+            "notion",
+            f"{method} {path}",
+            lambda: super(ScheduledNotionClient, self).request(path, method, *args, **kwargs)
+        )
+
+
+def get_slack_client(token):
+    """Shared pooled Slack WebClient for the token"""
+    with _lock:
+        client = _slack_clients.get(token)
+        if client is None:
+            client = PooledWebClient(token=token, timeout=int(HTTP_READ_TIMEOUT))
+            _slack_clients[token] = client
+        return client
+
+
+def get_notion_client(auth):
+    """Shared Notion client for the integration token, on a pooled httpx.Client"""
+    with _lock:
+        client = _notion_clients.get(auth)
+        if client is None:
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_MAXSIZE,
+                    max_keepalive_connections=HTTP_POOL_MAXSIZE,
+                    keepalive_expiry=30
+                )
+            )
+            options = {"auth": auth, "timeout_ms": int(HTTP_READ_TIMEOUT * 1000)}
+            if "retry" in {field.name for field in dataclasses.fields(ClientOptions)}:
+                # Retrying here as well would multiply the scheduler's attempts and backoff
+                options["retry"] = False
+            # notion_client sets base_url, headers and timeout on the httpx client
+            client = ScheduledNotionClient(client=http_client, **options)
+            _notion_clients[auth] = client
+        return client
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Load test for the Slack events endpoint
+Fires reaction_added events at /slack/events from concurrent clients and
+reports throughput and ack latency, to compare serving setups:
+
+    # dev server
+    python main.py
+    python loadtest.py --url http://localhost:3000/slack/events
+
+    # gunicorn
+    gunicorn -c gunicorn.conf.py wsgi:app
+    python loadtest.py --url http://localhost:3000/slack/events
+
+Events use a reaction the bot ignores (--reaction), each with a unique
+event_id, so nothing is written to Slack or Notion. Requests are signed
+with SLACK_SIGNING_SECRET when it is set.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _event_body(reaction, channel_id):
+    return json.dumps({
+        "type": "event_callback",
+        "event_id": f"Ev{uuid.uuid4().hex[:12].upper()}",
+        "event_time": int(time.time()),
+        "event": {
+            "type": "reaction_added",
+            "user": "ULOADTEST",
+            "reaction": reaction,
+            "item": {"type": "message", "channel": channel_id, "ts": f"{time.time():.6f}"},
+        },
+    }).encode("utf-8")
+
+
+def _headers(body, signing_secret):
+    headers = {"Content-Type": "application/json"}
+    if signing_secret:
+        timestamp = str(int(time.time()))
+        basestring = f"v0:{timestamp}:".encode("utf-8") + body
+        signature = hmac.new(signing_secret.encode("utf-8"), basestring, hashlib.sha256).hexdigest()
+        headers["X-Slack-Request-Timestamp"] = timestamp
+        headers["X-Slack-Signature"] = f"v0={signature}"
+    return headers
+
+
+def send_event(url, reaction, channel_id, signing_secret, timeout):
+    """POST one event; returns (status code, seconds)"""
+    body = _event_body(reaction, channel_id)
+    req = urllib.request.Request(url, data=body, headers=_headers(body, signing_secret), method="POST")
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 0
+    return status, time.perf_counter() - started
+
+
+def run(url, requests, concurrency, reaction, channel_id, signing_secret, timeout):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(
+            lambda _: send_event(url, reaction, channel_id, signing_secret, timeout),
+            range(requests)
+        ))
+    elapsed = time.perf_counter() - started
+
+    latencies = [seconds for _, seconds in results]
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    slow = sum(1 for seconds in latencies if seconds > 3)  # past Slack's ack window
+
+    print(f"Requests:     {requests} ({concurrency} concurrent)")
+    print(f"Elapsed:      {elapsed:.2f}s")
+    print(f"Throughput:   {requests / elapsed:.1f} req/s")
+    print(f"Latency (ms): avg {sum(latencies) / len(latencies) * 1000:.1f}"
+          f"  p50 {_percentile(latencies, 50) * 1000:.1f}"
+          f"  p95 {_percentile(latencies, 95) * 1000:.1f}"
+          f"  p99 {_percentile(latencies, 99) * 1000:.1f}"
+          f"  max {max(latencies) * 1000:.1f}")
+    print(f"Over 3s:      {slow}")
+    print(f"Status codes: {dict(sorted(statuses.items()))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the Slack events endpoint")
+    parser.add_argument("--url", default="http://localhost:3000/slack/events", help="Events endpoint URL")
+    parser.add_argument("--requests", type=int, default=1000, help="Total number of events to send")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent clients")
+    parser.add_argument("--reaction", default="loadtest", help="Reaction name (use one the bot ignores)")
+    parser.add_argument("--channel", default=os.getenv("SLACK_CHANNEL_ID", "CLOADTEST"), help="Channel ID in the events")
+    parser.add_argument("--timeout", type=float, default=10, help="Per-request timeout in seconds")
+    args = parser.parse_args()
+
+    run(args.url, args.requests, args.concurrency, args.reaction, args.channel,
+        os.getenv("SLACK_SIGNING_SECRET"), args.timeout)
@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 """
-Main entry point for the Slack Message Handler on Replit
+Main entry point for the Slack handlers on Replit (one app, see event_router.py)
 """
 import os
-from slack_message_handler import app
+import bot_identity
+from slack_message_handler import app, handler_modules, slack_client, user_directory
 
 if __name__ == '__main__':
     # Get port from environment (Replit sets this automatically)
@@ -22,9 +23,15 @@ if __name__ == '__main__':
         exit(1)
     
     print("🚀 Slack message handler starting on Replit...")
+    bot_identity.warm_up(slack_client)
+    user_directory.warm_up()
+    for module in handler_modules:
+        if hasattr(module, 'warm_up'):
+            module.warm_up()
     print(f"🌐 Running on port: {port}")
     print(f"📺 Monitoring channel: {os.getenv('SLACK_CHANNEL_ID')}")
     print(f"📢 PM notification channel: {os.getenv('PM_NOTIFICATION_CHANNEL_ID')}")
     
-    # Run the Flask app (debug mode for external access on Replit)
-    app.run(host='0.0.0.0', port=port, debug=True, threaded=True)
+    # Development server only; production runs under gunicorn (see Procfile / gunicorn.conf.py)
+    debug = os.getenv('DEBUG_MODE', 'false').lower() == 'true'
+    app.run(host='0.0.0.0', port=port, debug=debug, use_reloader=False, threaded=True)
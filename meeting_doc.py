@@ -0,0 +1,134 @@
+"""
+Meeting doc resolver
+Finds the current meeting document in a Notion meeting-notes database with
+a single narrow query (latest Meeting Date on or before today, page_size=1,
+only the date/link/title properties), and remembers the answer per ISO week
+in a small JSON file so later runs that week make no Notion calls at all.
+
+A doc whose meeting date is in an earlier week (this week's doc has not
+been created yet) is only reused for the rest of that day, not written to
+the weekly cache, so this week's doc is picked up once it exists.
+"""
+import json
+import os
+import threading
+from datetime import date
+
+from notion_query import fetch_database_schema, filter_property_ids
+
+DEFAULT_CACHE_PATH = "meeting_docs.json"
+DEFAULT_DATE_PROPERTY = "Meeting Date"
+DEFAULT_LINK_PROPERTY = "Meeting Link"  # If the link is in a property, else use page URL
+
+_resolvers = {}  # database_id -> MeetingDocResolver
+_resolvers_lock = threading.Lock()
+
+
+def _iso_week(day):
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+class MeetingDocResolver:
+    """Cached lookup of the current meeting doc (link, title) in one database"""
+
+    def __init__(self, notion_client, database_id, date_property=DEFAULT_DATE_PROPERTY,
+                 link_property=DEFAULT_LINK_PROPERTY, cache_path=DEFAULT_CACHE_PATH):
+        self.notion_client = notion_client
+        self.database_id = database_id
+        self.date_property = date_property
+        self.link_property = link_property
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._uncached = {}  # day -> doc from an earlier week, reused within the same day
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read meeting doc cache: {e}")
+            return {}
+
+    def _save_cache(self, key, value):
+        if not self.cache_path:
+            return
+        cache = self._load_cache()
+        cache[key] = value
+        # Keep a few weeks per database; older entries are never looked up again
+        prefix = f"{self.database_id}:"
+        own_keys = sorted(k for k in cache if k.startswith(prefix))
+        for old_key in own_keys[:-8]:
+            del cache[old_key]
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _query(self, day):
+        schema = fetch_database_schema(self.notion_client, self.database_id)
+        title_property = next((name for name, prop in schema.items() if prop["type"] == "title"), None)
+        response = self.notion_client.databases.query(
+            database_id=self.database_id,
+            filter={"property": self.date_property, "date": {"on_or_before": day.isoformat()}},
+            sorts=[{"property": self.date_property, "direction": "descending"}],
+            page_size=1,
+            filter_properties=filter_property_ids(schema, {self.date_property, self.link_property}),
+        )
+        results = response.get("results", [])
+        if not results:
+            return None
+
+        page = results[0]
+        props = page.get("properties", {})
+        link = None
+        link_prop = props.get(self.link_property)
+        if link_prop and link_prop.get("type") == "url":
+            link = link_prop.get("url")
+        title = None
+        if title_property and props.get(title_property, {}).get("title"):
+            title = "".join(t["plain_text"] for t in props[title_property]["title"])
+        meeting_date = (props.get(self.date_property, {}).get("date") or {}).get("start")
+        return {
+            "url": link or page.get("url"),
+            "title": title or "Untitled Meeting",
+            "meeting_date": meeting_date[:10] if meeting_date else None,
+        }
+
+    def resolve(self, day=None):
+        """(link, title) of the latest meeting doc on or before the day; (None, None) if none"""
+        day = day or date.today()
+        key = f"{self.database_id}:{_iso_week(day)}"
+        with self._lock:
+            cached = self._load_cache().get(key) or self._uncached.get(day)
+            if cached:
+                return cached["url"], cached["title"]
+
+            try:
+                doc = self._query(day)
+            except Exception as e:
+                print(f"Error fetching meeting doc: {e}")
+                return None, None
+            if not doc:
+                print("No meeting doc found for this week.")
+                return None, None
+
+            meeting_date = doc["meeting_date"]
+            if meeting_date and _iso_week(date.fromisoformat(meeting_date)) == _iso_week(day):
+                self._save_cache(key, doc)
+            else:
+                self._uncached = {day: doc}
+            return doc["url"], doc["title"]
+
+
+def get_meeting_doc_resolver(notion_client, database_id, **options):
+    """Shared resolver per database, cached at MEETING_DOC_CACHE_PATH"""
+    with _resolvers_lock:
+        resolver = _resolvers.get(database_id)
+        if resolver is None:
+            options.setdefault("cache_path", os.getenv("MEETING_DOC_CACHE_PATH", DEFAULT_CACHE_PATH))
+            resolver = MeetingDocResolver(notion_client, database_id, **options)
+            _resolvers[database_id] = resolver
+        return resolver
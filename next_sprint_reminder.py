@@ -1,9 +1,10 @@
 import os
-from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from notion_client import Client
-from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
+from http_transport import get_slack_client, get_notion_client
+from rate_limiter import PRIORITY_BATCH, request_priority
+from rotation import load_rotation
+from meeting_doc import get_meeting_doc_resolver
 
 # Load environment variables
 load_dotenv()
@@ -11,85 +12,51 @@ NEXT_SPRINT_NOTION_DATABASE_ID = os.getenv("NEXT_SPRINT_NOTION_DATABASE_ID")
 SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
 OFFICIAL_CHANNEL_ID = os.getenv("OFFICIAL_CHANNEL_ID")
 
-# Slack user rotation (edit as needed)
-SLACK_USER_ROTATION = [
-    {"name": "Annie Chen", "id": "U03J5M6SXJS"},
-    {"name": "Sharon Wu", "id": "U052ED4GV8R"},
-    {"name": "Casper Chen", "id": "UH13Z1L06"},
-]
+# Pre-planning rotation: who is tagged each week (see rotation.py to edit or preview it)
+NEXT_SPRINT_ROTATION = load_rotation("next_sprint")
 
 # Notion/Slack clients
-notion = Client(auth=os.getenv("NOTION_API_KEY"))
-slack = WebClient(token=SLACK_BOT_TOKEN)
+notion = get_notion_client(os.getenv("NOTION_API_KEY"))
+slack = get_slack_client(SLACK_BOT_TOKEN)
 
 # Notion property names (edit if your DB uses different names)
 MEETING_DATE_PROPERTY = "Meeting Date"
 MEETING_LINK_PROPERTY = "Meeting Link"  # If the link is in a property, else use page URL
 
 # Helper: Get this week's meeting doc from Notion
-def get_this_week_meeting_doc():
-    today = datetime.now().date()
-    # Query: Only use Meeting Date <= today, sorted by Meeting Date desc
-    try:
-        response = notion.databases.query(
-            database_id=NEXT_SPRINT_NOTION_DATABASE_ID,
-            filter={
-                "property": MEETING_DATE_PROPERTY,
-                "date": {"on_or_before": today.isoformat()}
-            },
-            sorts=[{"property": MEETING_DATE_PROPERTY, "direction": "descending"}]
-        )
-        results = response.get("results", [])
-        if not results:
-            print("No meeting doc found for this week.")
-            return None, None
-        page = results[0]
-        # Try to get meeting link from property, else use page URL
-        props = page["properties"]
-        meeting_link = None
-        if MEETING_LINK_PROPERTY in props and props[MEETING_LINK_PROPERTY]["type"] == "url":
-            meeting_link = props[MEETING_LINK_PROPERTY]["url"]
-        if not meeting_link:
-            meeting_link = page.get("url")
-        title = "Untitled Meeting"
-        for prop in props.values():
-            if prop["type"] == "title" and prop["title"]:
-                title = ''.join([t["plain_text"] for t in prop["title"]])
-                break
-        return meeting_link, title
-    except Exception as e:
-        print(f"Error fetching meeting doc: {e}")
-        return None, None
+def get_this_week_meeting_doc(day=None):
+    # One page_size=1 query per ISO week; later runs that week read the on-disk cache
+    resolver = get_meeting_doc_resolver(
+        notion, NEXT_SPRINT_NOTION_DATABASE_ID,
+        date_property=MEETING_DATE_PROPERTY, link_property=MEETING_LINK_PROPERTY
+    )
+    return resolver.resolve(day)
 
 # Helper: Get this week's responsible Slack user(s)
-def get_this_week_slack_users():
-    # Week number since a fixed start (e.g., 2024-01-01)
-    start_date = datetime(2024, 1, 1)
-    week_idx = ((datetime.now() - start_date).days // 7)
-    if week_idx % 2 == 0:
-        return [SLACK_USER_ROTATION[0]["id"]]  # Annie (even week)
-    else:
-        return [SLACK_USER_ROTATION[1]["id"], SLACK_USER_ROTATION[2]["id"]]  # Sharon & Casper (odd week)
+def get_this_week_slack_users(day=None):
+    slot = NEXT_SPRINT_ROTATION.slot_for(day)
+    return slot.user_ids if slot else []
 
 # Helper: Get this week's meeting type and users
-def get_this_week_meeting_type_and_users():
-    # Set the rotation start date to 2024/08/05 (Monday of the first Table & Annie week)
-    start_date = datetime(2024, 8, 5)
-    week_idx = ((datetime.now() - start_date).days // 7)
-    if week_idx % 2 == 0:
-        # Table week, tag Annie
-        return "Scrum Team pre-planning: Table", [SLACK_USER_ROTATION[0]["id"]]
-    else:
-        # PV & GAP week, tag Sharon & Casper
-        return "Scrum Team pre-planning: PV & GAP", [SLACK_USER_ROTATION[1]["id"], SLACK_USER_ROTATION[2]["id"]]
+def get_this_week_meeting_type_and_users(day=None):
+    # Precomputed calendar lookup by ISO week; None on skip weeks and holidays
+    slot = NEXT_SPRINT_ROTATION.slot_for(day)
+    if slot is None:
+        return None, []
+    return slot.label, slot.user_ids
 
 # Compose and send Slack message
-def send_reminder():
-    meeting_link, meeting_title = get_this_week_meeting_doc()
+# day: the date the reminder is for (the scheduler passes its fire date in
+# its own timezone); defaults to today in the local timezone
+def send_reminder(day=None):
+    meeting_type, user_ids = get_this_week_meeting_type_and_users(day)
+    if not meeting_type:
+        print("No pre-planning meeting this week (skip week or holiday).")
+        return
+    meeting_link, meeting_title = get_this_week_meeting_doc(day)
     if not meeting_link:
         print("No meeting link to send.")
         return
-    meeting_type, user_ids = get_this_week_meeting_type_and_users()
     user_mentions = ' '.join([f"<@{uid}>" for uid in user_ids])
     text = (
         f"{user_mentions} :wave: Just a warm reminder that today we will have *{meeting_type}*.\n"
@@ -108,4 +75,5 @@ def send_reminder():
         print(f"Unexpected error sending Slack message: {e}")
 
 if __name__ == "__main__":
-    send_reminder()
\ No newline at end of file
+    with request_priority(PRIORITY_BATCH):
+        send_reminder()
\ No newline at end of file
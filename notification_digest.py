@@ -0,0 +1,190 @@
+"""
+Batched PM-channel notifications
+Collapses new-request notifications into one Block Kit summary message per
+window instead of one chat.postMessage per request:
+
+- requests are buffered and flushed at most once per flush interval
+- the first flush of a window posts the summary; later flushes in the same
+  window rewrite it in place with chat.update
+- a summary holds at most max_batch requests; overflow starts a new one
+
+The mention (e.g. "<@U08UUNJ86P7>") is only in the posted message, so
+updates do not ping anyone again.
+"""
+import os
+import threading
+import time
+
+from slack_sdk.errors import SlackApiError
+
+import bot_identity
+from block_renderer import context, section
+
+DEFAULT_FLUSH_INTERVAL_SECONDS = 15
+DEFAULT_WINDOW_SECONDS = 15 * 60
+DEFAULT_MAX_BATCH = 20  # keeps a summary well under Slack's 50-block limit
+
+
+class _Summary:
+    """A posted summary message that can still take more requests"""
+
+    def __init__(self, ts, entries):
+        self.ts = ts
+        self.entries = entries
+        self.posted_at = time.monotonic()
+
+
+class NotificationAggregator:
+    """Buffers notifications and posts/updates one summary per window"""
+
+    def __init__(self, client, channel_id, flush_interval=DEFAULT_FLUSH_INTERVAL_SECONDS,
+                 window_seconds=DEFAULT_WINDOW_SECONDS, max_batch=DEFAULT_MAX_BATCH,
+                 mention=None, name="pm-notifications"):
+        self.client = client
+        self.channel_id = channel_id
+        self.flush_interval = flush_interval
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self.mention = mention
+        self.name = name
+        self._pending = []
+        self._summary = None
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self._stopping = False
+        self.requests = 0
+        self.posts = 0
+        self.updates = 0
+
+    def add(self, entry):
+        """
+        Queue one request for the next summary.
+        entry: {"display_name", "page_url", "thread_link"}
+        """
+        with self._lock:
+            self._pending.append(entry)
+            self.requests += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._wakeup.notify()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._stopping:
+                    self._wakeup.wait()
+                if not self._pending:
+                    return
+                # Requests arriving during the interval join this flush
+                while not self._stopping:
+                    remaining = self._last_flush + self.flush_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                entries, self._pending = self._pending, []
+                self._last_flush = time.monotonic()
+            try:
+                self._flush(entries)
+            except Exception as e:
+                print(f"Error notifying PM team: {e}")
+
+    def _flush(self, entries):
+        summary = self._summary
+        if summary and time.monotonic() - summary.posted_at < self.window_seconds:
+            room = self.max_batch - len(summary.entries)
+            if room > 0:
+                if self._update(summary, summary.entries + entries[:room]):
+                    entries = entries[room:]
+        while entries:
+            batch, entries = entries[:self.max_batch], entries[self.max_batch:]
+            self._post(batch)
+
+    def _blocks(self, entries, mention):
+        count = len(entries)
+        title = "🔔 *New Business Request Added*" if count == 1 else f"🔔 *{count} New Business Requests Added*"
+        blocks = [section(title)]
+        for entry in entries:
+            blocks.append(section(
+                f"*Requested by:* {entry['display_name']}\n"
+                f"📋 *Assessment Page:* {entry['page_url']}\n"
+                f"🔗 *Original Message:* <{entry['thread_link']}|View in Slack>"
+            ))
+        footer = "FYI - new business request added for assessment" if count == 1 else "FYI - new business requests added for assessment"
+        blocks.append(context(f"{mention} {footer}" if mention else footer))
+        return blocks
+
+    def _text(self, entries):
+        names = ", ".join(entry["display_name"] for entry in entries)
+        return f"🔔 New Business Request(s) Added: {names}"
+
+    def _post(self, entries):
+        try:
+            response = self.client.chat_postMessage(
+                channel=self.channel_id,
+                text=self._text(entries),
+                blocks=self._blocks(entries, self.mention),
+                unfurl_links=False
+            )
+            self._summary = _Summary(response["ts"], entries)
+            self.posts += 1
+            print(f"✅ Notified PM team in channel {self.channel_id} ({len(entries)} request(s))")
+        except SlackApiError as e:
+            print(f"❌ Error notifying PM team: {e.response['error']}")
+            bot_identity.handle_api_error(self.client, e)
+
+    def _update(self, summary, entries):
+        """Rewrite the open summary; returns False if it could not be updated"""
+        try:
+            self.client.chat_update(
+                channel=self.channel_id,
+                ts=summary.ts,
+                text=self._text(entries),
+                blocks=self._blocks(entries, None)  # the post already pinged
+            )
+        except SlackApiError as e:
+            # e.g. the summary was deleted: the requests go into a new message
+            print(f"⚠️  Could not update PM summary {summary.ts}: {e.response['error']}")
+            self._summary = None
+            return False
+        summary.entries = entries
+        self.updates += 1
+        print(f"✅ Updated PM summary {summary.ts} ({len(entries)} request(s))")
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "requests": self.requests,
+                "posts": self.posts,
+                "updates": self.updates,
+                "flush_interval_seconds": self.flush_interval,
+                "max_batch": self.max_batch,
+            }
+
+    def shutdown(self, timeout=None):
+        """Flush anything still buffered and stop the flusher thread"""
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        with self._lock:
+            self._stopping = False
+        return not self._pending
+
+
+def create_notification_aggregator(client, channel_id):
+    """Aggregator configured from the PM_NOTIFY_* environment variables"""
+    return NotificationAggregator(
+        client,
+        channel_id,
+        flush_interval=float(os.getenv("PM_NOTIFY_FLUSH_SECONDS", DEFAULT_FLUSH_INTERVAL_SECONDS)),
+        window_seconds=float(os.getenv("PM_NOTIFY_WINDOW_SECONDS", DEFAULT_WINDOW_SECONDS)),
+        max_batch=int(os.getenv("PM_NOTIFY_MAX_BATCH", DEFAULT_MAX_BATCH)),
+        mention=os.getenv("PM_NOTIFY_MENTION", "<@U08UUNJ86P7>") or None,
+    )
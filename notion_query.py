@@ -0,0 +1,190 @@
+"""
+Notion query builder
+Selection rules are written once and compiled two ways:
+- to_notion(): a Notion `filter` object, so only matching rows are downloaded
+- matches(page): the same rule evaluated locally on a page object (used when
+  re-checking incrementally synced pages)
+
+Notion only allows compound filters to be nested two levels deep, so
+to_notion() refuses deeper rules rather than sending a request that fails.
+
+Example:
+    rule = all_of(relation_empty("Parent task"), select_equals("Topic Type", "New Topic"))
+    notion.databases.query(database_id=..., filter=rule.to_notion())
+"""
+import hashlib
+import json
+import threading
+
+MAX_COMPOUND_DEPTH = 2
+
+_schemas = {}  # database_id -> property schema
+_schemas_lock = threading.Lock()
+
+
+class Filter:
+    """A selection rule over one Notion database"""
+
+    def to_notion(self):
+        """Compile to a Notion filter object"""
+        compiled = self._compile()
+        if self.depth() > MAX_COMPOUND_DEPTH:
+            raise ValueError(f"Notion filters can only nest {MAX_COMPOUND_DEPTH} compound levels: {compiled}")
+        return compiled
+
+    def matches(self, page):
+        """Evaluate the rule against a Notion page object"""
+        raise NotImplementedError
+
+    def properties(self):
+        """Names of the properties the rule reads"""
+        raise NotImplementedError
+
+    def depth(self):
+        return 0
+
+    def signature(self):
+        """Stable hash of the compiled rule (changes when the rule changes)"""
+        payload = json.dumps(self._compile(), sort_keys=True)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+    def _compile(self):
+        raise NotImplementedError
+
+
+class _PropertyCondition(Filter):
+    """A single condition on one property"""
+
+    def __init__(self, property_name, property_type, condition, predicate):
+        self.property_name = property_name
+        self.property_type = property_type
+        self.condition = condition
+        self.predicate = predicate
+
+    def _compile(self):
+        return {"property": self.property_name, self.property_type: self.condition}
+
+    def matches(self, page):
+        prop = page.get("properties", {}).get(self.property_name)
+        if not prop:
+            return False
+        return self.predicate(prop.get(prop.get("type")))
+
+    def properties(self):
+        return {self.property_name}
+
+
+class _Compound(Filter):
+    """and/or over several rules"""
+
+    def __init__(self, operator, filters):
+        self.operator = operator
+        self.filters = list(filters)
+
+    def _compile(self):
+        if len(self.filters) == 1:
+            return self.filters[0]._compile()
+        return {self.operator: [f._compile() for f in self.filters]}
+
+    def depth(self):
+        if len(self.filters) == 1:
+            return self.filters[0].depth()
+        return 1 + max(f.depth() for f in self.filters)
+
+    def matches(self, page):
+        check = all if self.operator == "and" else any
+        return check(f.matches(page) for f in self.filters)
+
+    def properties(self):
+        names = set()
+        for f in self.filters:
+            names |= f.properties()
+        return names
+
+
+def _flatten(operator, filters):
+    """Inline nested rules with the same operator: any_of(any_of(a, b), c) is any_of(a, b, c)"""
+    flat = []
+    for f in filters:
+        if isinstance(f, _Compound) and f.operator == operator:
+            flat.extend(f.filters)
+        else:
+            flat.append(f)
+    return flat
+
+
+def all_of(*filters):
+    """Every rule must match"""
+    return _Compound("and", _flatten("and", filters))
+
+
+def any_of(*filters):
+    """At least one rule must match"""
+    return _Compound("or", _flatten("or", filters))
+
+
+def status_in(property_name, values):
+    """Status property is one of the given option names"""
+    return any_of(*[
+        _PropertyCondition(
+            property_name, "status", {"equals": value},
+            lambda status, value=value: bool(status) and status.get("name") == value
+        )
+        for value in values
+    ])
+
+
+def select_equals(property_name, value):
+    """Select property is the given option name"""
+    return _PropertyCondition(
+        property_name, "select", {"equals": value},
+        lambda select: bool(select) and select.get("name") == value
+    )
+
+
+def checkbox_is(property_name, checked=True):
+    """Checkbox property is checked (or unchecked)"""
+    return _PropertyCondition(
+        property_name, "checkbox", {"equals": checked},
+        lambda value: bool(value) == checked
+    )
+
+
+def relation_empty(property_name):
+    """Relation property has no linked pages"""
+    return _PropertyCondition(
+        property_name, "relation", {"is_empty": True},
+        lambda relation: not relation
+    )
+
+
+def fetch_database_schema(notion_client, database_id, refresh=False):
+    """
+    Property schema of a database: {property name: {"id": ..., "type": ...}}.
+    One databases.retrieve call per process (cached); property IDs are what
+    filter_properties expects.
+    """
+    with _schemas_lock:
+        if database_id in _schemas and not refresh:
+            return _schemas[database_id]
+    database = notion_client.databases.retrieve(database_id=database_id)
+    schema = {
+        name: {"id": prop["id"], "type": prop["type"]}
+        for name, prop in database.get("properties", {}).items()
+    }
+    with _schemas_lock:
+        _schemas[database_id] = schema
+    return schema
+
+
+def filter_property_ids(schema, property_names, include_title=True):
+    """
+    Property IDs for filter_properties projection.
+    The title property is added automatically (its name varies by database);
+    names missing from the schema are skipped.
+    """
+    ids = []
+    for name, prop in schema.items():
+        if name in property_names or (include_title and prop["type"] == "title"):
+            ids.append(prop["id"])
+    return ids
@@ -1,11 +1,22 @@
 import os
-from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
-from notion_client import Client
 import sys # Import sys to read command-line arguments
 import argparse
+from itertools import chain
+import bot_identity
+from http_transport import get_slack_client, get_notion_client
+from rate_limiter import PRIORITY_BATCH, request_priority
+from task_snapshot import create_task_snapshot
+from notion_query import all_of, any_of, checkbox_is, relation_empty, select_equals, status_in
+from task_records import TaskDecoder
+from fetch_engine import PostPipeline, run_concurrently
+from block_renderer import batch_groups, context, divider, fallback_text, section, text_sections
+from digest_state import compute_delta, create_digest_state, fingerprint
+from user_directory import get_user_directory
+from notion_users import get_notion_user_index
+from team_config import Team, TeamRouter, load_teams
+from meeting_doc import get_meeting_doc_resolver
 
 # 從 .env 文件加載環境變數
 load_dotenv()
@@ -15,24 +26,27 @@ SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
 NOTION_API_KEY = os.getenv("NOTION_API_KEY")
 NOTION_DATABASE_ID = os.getenv("NOTION_DATABASE_ID")
 OFFICIAL_CHANNEL_ID = os.getenv("OFFICIAL_CHANNEL_ID")
-# This constant is no longer needed since the last call reminder logic is dynamic.
+# Meeting notes database for the last call reminder; the current week's doc is
+# looked up there, with PM_WEEKLY_MEETING_URL as the fallback link.
+MEETING_DOCS_DATABASE_ID = os.getenv("MEETING_DOCS_DATABASE_ID")
 PM_WEEKLY_MEETING_URL = "https://www.notion.so/inline/PM-Weekly-Meeting_2025-June-218c90dfe385807d94d8d129f33d9aba?source=copy_link"
 PM_WEEKLY_MEETING_TEXT = "PM Weekly Meeting"
-# Removed MEETING_DOCS_DATABASE_ID and other sprint-related constants.
 
 
 # 初始化 Slack 和 Notion 客戶端
-slack_client = WebClient(token=SLACK_BOT_TOKEN)
-notion_client = Client(auth=NOTION_API_KEY)
+slack_client = get_slack_client(SLACK_BOT_TOKEN)
+notion_client = get_notion_client(NOTION_API_KEY)
 
-# Store a cache for Slack user IDs to avoid repeated API calls
-slack_user_id_cache = {}
+# Shared Slack user cache (TTL/LRU) to avoid repeated API calls
+user_directory = get_user_directory(slack_client)
+# Notion people by email/name, for PICs missing from the team's mapping
+notion_users = get_notion_user_index(notion_client, user_directory)
 
 # 定義您的 Notion 屬性名稱 (已根據您提供的截圖進行調整)
 TASK_STATUS_PROPERTY = "Status"
 TASK_PIC_PROPERTY = "PIC"
 TASK_DDL_PROPERTY = "DDL"
-TASK_PARENT_RELATION_PROPERTY = "Parent task"  # no longer used
+TASK_PARENT_RELATION_PROPERTY = "Parent task"
 TASK_CREATED_TIME_PROPERTY = "Created Time"
 TASK_COUNTDOWN_PROPERTY = "Countdown"
 TASK_ACTION_PROGRESS_PROPERTY = "Action Progress"
@@ -68,11 +82,70 @@ SLACK_USER_MAPPING = {
     "Casper Chen": "UH13Z1L06",
 }
 
+# The team served when no team config is given
+DEFAULT_TEAM = Team(
+    name="default",
+    channel_id=OFFICIAL_CHANNEL_ID,
+    user_mapping=SLACK_USER_MAPPING,
+    exclude_pics=frozenset(EXCLUDE_PICS),
+    unassigned_owner="Wendy Wang",
+    catch_all=True,
+)
+
 # --- Reminder Types ---
 REMINDER_TYPE_WEEKLY_UPDATE = "weekly_update"
 REMINDER_TYPE_LAST_CALL = "last_call"
 # --- End Reminder Types ---
 
+# --- Digest selection rules (their union is the snapshot's server-side filter; each is applied on read) ---
+# PIC exclusion stays client-side: a task shared with an excluded PIC must
+# still be listed under its other PICs, so it is not a row filter.
+WEEKLY_UPDATE_FILTER = status_in(TASK_STATUS_PROPERTY, ALLOWED_STATUSES)
+WEEKLY_UPDATE_PROPERTIES = [
+    TASK_STATUS_PROPERTY, TASK_PIC_PROPERTY, TASK_DDL_PROPERTY,
+    TASK_COUNTDOWN_PROPERTY, TASK_ACTION_PROGRESS_PROPERTY,
+]
+# Top-level topics that are new, or follow-ups flagged for this week's meeting
+LAST_CALL_FILTER = any_of(
+    all_of(
+        relation_empty(TASK_PARENT_RELATION_PROPERTY),
+        select_equals(TASK_TOPIC_TYPE_PROPERTY, "New Topic"),
+    ),
+    all_of(
+        relation_empty(TASK_PARENT_RELATION_PROPERTY),
+        select_equals(TASK_TOPIC_TYPE_PROPERTY, "Follow-up Topic"),
+        checkbox_is(TASK_DISCUSS_CHECKBOX_PROPERTY, True),
+    ),
+)
+LAST_CALL_PROPERTIES = [
+    TASK_PIC_PROPERTY, TASK_TOPIC_TYPE_PROPERTY,
+    TASK_DISCUSS_CHECKBOX_PROPERTY, TASK_PARENT_RELATION_PROPERTY,
+]
+
+# TaskRecord field -> Notion property it is decoded from
+TASK_RECORD_PROPERTIES = {
+    "status": TASK_STATUS_PROPERTY,
+    "pics": TASK_PIC_PROPERTY,
+    "ddl": TASK_DDL_PROPERTY,
+    "countdown": TASK_COUNTDOWN_PROPERTY,
+    "action_progress": TASK_ACTION_PROGRESS_PROPERTY,
+    "topic_type": TASK_TOPIC_TYPE_PROPERTY,
+    "discuss": TASK_DISCUSS_CHECKBOX_PROPERTY,
+    "parent_ids": TASK_PARENT_RELATION_PROPERTY,
+}
+
+# One local copy of the rows either digest needs, refreshed incrementally on
+# each run; each digest applies its own rule when reading it, so the two
+# commands never scan Notion separately
+digest_snapshot = create_task_snapshot(
+    NOTION_DATABASE_ID, "digests",
+    any_of(WEEKLY_UPDATE_FILTER, LAST_CALL_FILTER),
+    WEEKLY_UPDATE_PROPERTIES + LAST_CALL_PROPERTIES,
+)
+
+# Fingerprints of the last posted weekly update, per channel
+digest_state = create_digest_state()
+
 
 def get_slack_user_id_by_email(email):
     """
@@ -81,65 +154,73 @@ def get_slack_user_id_by_email(email):
     if email in SLACK_USER_MAPPING:
         return SLACK_USER_MAPPING[email]
 
-    if email in slack_user_id_cache:
-        return slack_user_id_cache[email]
-    
-    try:
-        response = slack_client.users_lookupByEmail(email=email)
-        if response["ok"] and response["user"]:
-            user_id = response["user"]["id"]
-            slack_user_id_cache[email] = user_id
-            return user_id
-        else:
-            print(f"Warning: Could not find Slack user for email '{email}': {response.get('error', 'Unknown error')}")
-            return None
-    except SlackApiError as e:
-        print(f"Slack API error looking up user by email '{email}': {e.response['error']}")
-        return None
-    except Exception as e:
-        print(f"An unexpected error occurred looking up Slack user by email '{email}': {e}")
-        return None
+    slack_user = user_directory.lookup_by_email(email)
+    if slack_user:
+        return slack_user["id"]
+
+    print(f"Warning: Could not find Slack user for email '{email}'")
+    return None
 
-def get_notion_tasks():
+def slack_user_id_for_pic(pic_name, team=DEFAULT_TEAM):
     """
-    Fetches all tasks from the specified Notion database.
+    Slack user ID for a PIC: the team's mapping first, then the Notion user
+    with that name matched to Slack by email. None if neither knows them.
     """
-    tasks = []
-    try:
-        response = notion_client.databases.query(
-            database_id=NOTION_DATABASE_ID
-        )
-        tasks.extend(response["results"])
+    slack_user_id = team.user_mapping.get(pic_name)
+    if slack_user_id or pic_name == "Unassigned":
+        return slack_user_id
+    return notion_users.slack_user_id(notion_users.by_name(pic_name))
 
-        while response["has_more"]:
-            response = notion_client.databases.query(
-                database_id=NOTION_DATABASE_ID,
-                start_cursor=response["next_cursor"]
-            )
-            tasks.extend(response["results"])
+_task_decoder = None
 
-        print(f"Successfully fetched {len(tasks)} tasks from Notion.")
-        return tasks
-    except Exception as e:
-        print(f"Error fetching Notion tasks: {e}")
+def get_task_decoder():
+    """
+    Decoder for NOTION_DATABASE_ID pages, built once from the database schema.
+    """
+    global _task_decoder
+    if _task_decoder is None:
+        _task_decoder = TaskDecoder.from_database(notion_client, NOTION_DATABASE_ID, TASK_RECORD_PROPERTIES)
+    return _task_decoder
+
+def get_notion_tasks(rule, full_sync=False):
+    """
+    Fetches the tasks selected by a digest rule from the Notion database
+    and decodes them into TaskRecords.
+    Reads from the shared local snapshot after syncing only the pages edited
+    since the last run; full_sync forces a complete re-scan of the digests' rows.
+    """
+    # The schema lookup for the decoder and the task sync are independent
+    results = run_concurrently({
+        "sync": lambda: digest_snapshot.sync(notion_client, full=full_sync),
+        "decoder": get_task_decoder,
+    }, return_exceptions=True)
+
+    pages = digest_snapshot.tasks(rule)
+    if isinstance(results["sync"], Exception):
+        print(f"Error syncing Notion tasks: {results['sync']}")
+        if pages:
+            print(f"Using {len(pages)} tasks from the last successful sync.")
+    else:
+        print(f"Successfully fetched {len(pages)} tasks from Notion.")
+
+    if not pages:
+        return []
+    if isinstance(results["decoder"], Exception):
+        print(f"Error decoding Notion tasks: {results['decoder']}")
         return []
+    return results["decoder"].decode_all(pages)
 
-def analyze_tasks(tasks):
+def analyze_tasks(tasks, team=DEFAULT_TEAM):
     """
-    Analyzes tasks, groups them by PIC, and filters out sub-tasks and excluded PICs.
+    Analyzes tasks, groups them by PIC, and keeps only the PICs the team covers
+    (excluded PICs are dropped).
+    Tasks are expected to be pre-filtered by WEEKLY_UPDATE_FILTER (allowed statuses).
     """
     grouped_by_pic = {}
 
     for task in tasks:
-        task_status = get_property_value(task, TASK_STATUS_PROPERTY, "status", "Unknown Status")
-        # Only keep tasks whose Status is in the allowed list
-        if task_status not in ALLOWED_STATUSES:
-            continue
-
-        pic_values_list = get_property_value(task, TASK_PIC_PROPERTY, "people", ["Unassigned"])
-
-        for pic_value in pic_values_list:
-            if pic_value in EXCLUDE_PICS:
+        for pic_value in task.pics:
+            if not team.covers(pic_value):
                 continue
             
             if pic_value not in grouped_by_pic:
@@ -150,7 +231,7 @@ def analyze_tasks(tasks):
     def pic_sort_key(pic_name):
         if pic_name == "Unassigned":
             return (2, pic_name)
-        elif pic_name not in SLACK_USER_MAPPING:
+        elif not slack_user_id_for_pic(pic_name, team):
             return (1, pic_name)
         else:
             return (0, pic_name)
@@ -160,117 +241,24 @@ def analyze_tasks(tasks):
 
     return sorted_final_data
 
-def get_property_value(task_page, property_name, property_type, default_value=None):
+def format_pic_display(pic_name, team=DEFAULT_TEAM):
     """
-    Helper function: Safely retrieves property values from a Notion page.
+    Slack mention for a PIC; unassigned tasks go to the team's unassigned owner.
     """
-    if property_type == "title":
-        for prop_key, prop_value in task_page["properties"].items():
-            if prop_value["type"] == "title":
-                if not prop_value["title"]:
-                    return default_value
-                extracted_title = "".join([text_obj["plain_text"] for text_obj in prop_value["title"]])
-                return extracted_title if extracted_title else default_value
-        return default_value
-
-    if property_name not in task_page["properties"]:
-        return default_value
-
-    prop = task_page["properties"][property_name]
-    prop_type = prop["type"]
-
-    if prop_type == "status":
-        return prop["status"]["name"] if prop["status"] else default_value
-    elif prop_type == "people":
-        people_list = []
-        for p in prop["people"]:
-            people_list.append(p["name"])
-        return people_list if people_list else ["Unassigned"]
-    elif prop_type == "date":
-        if prop["date"]:
-            start_date = datetime.fromisoformat(prop["date"]["start"]).strftime("%Y-%m-%d")
-            return start_date
-        return default_value
-    elif prop_type == "created_time":
-        if prop["created_time"]:
-            try:
-                dt_object = datetime.fromisoformat(prop["created_time"].replace('Z', '+00:00'))
-                return dt_object.strftime("%Y-%m-%d")
-            except ValueError:
-                return prop["created_time"]
-        return default_value
-    elif prop_type == "relation":
-        return prop["relation"] if prop["relation"] else []
-    elif prop_type == "formula":
-        if "string" in prop["formula"] and prop["formula"]["string"] is not None:
-            return prop["formula"]["string"]
-        elif "number" in prop["formula"] and prop["formula"]["number"] is not None:
-            return str(prop["formula"]["number"])
-        elif "boolean" in prop["formula"] and prop["formula"]["boolean"] is not None:
-            return str(prop["formula"]["boolean"])
-        return default_value
-    elif prop_type == "rollup":
-        if "number" in prop["rollup"] and prop["rollup"]["number"] is not None:
-            return str(prop["rollup"]["number"])
-        elif "array" in prop["rollup"] and prop["rollup"]["array"]:
-            extracted_text = []
-            for item in prop["rollup"]["array"]:
-                if "rich_text" in item and item["rich_text"]:
-                    extracted_text.append("".join([rt["plain_text"] for rt in item["rich_text"]]))
-                elif "number" in item and item["number"] is not None:
-                    extracted_text.append(str(item["number"]))
-            return ", ".join(extracted_text) if extracted_text else default_value
-        elif "date" in prop["rollup"] and prop["rollup"]["date"]:
-            start_date = datetime.fromisoformat(prop["rollup"]["date"]["start"]).strftime("%Y-%m-%d")
-            return start_date
-        elif "string" in prop["rollup"] and prop["rollup"]["string"] is not None:
-            return prop["rollup"]["string"]
-        return default_value
-    elif prop_type == "rich_text":
-        return "".join([text_obj["plain_text"] for text_obj in prop["rich_text"]]) if prop["rich_text"] else default_value
-    elif prop_type == "checkbox":
-        return prop["checkbox"] if "checkbox" in prop else False
-    elif prop_type == "select":
-        return prop["select"]["name"] if prop["select"] else default_value
-    
-    return default_value
-
-def get_action_progress_value(task_page):
-    """
-    Try to fetch Action Progress regardless of whether it's a rollup, formula, or select.
-    Returns None if not present.
-    """
-    # Try rollup
-    val = get_property_value(task_page, TASK_ACTION_PROGRESS_PROPERTY, "rollup", None)
-    if val is not None:
-        return val
-    # Try formula
-    val = get_property_value(task_page, TASK_ACTION_PROGRESS_PROPERTY, "formula", None)
-    if val is not None:
-        return val
-    # Try select
-    val = get_property_value(task_page, TASK_ACTION_PROGRESS_PROPERTY, "select", None)
-    if val is not None:
-        return val
-    # Try rich_text as last resort
-    val = get_property_value(task_page, TASK_ACTION_PROGRESS_PROPERTY, "rich_text", None)
-    return val
-
-def format_slack_message(organized_tasks_by_pic):
+    slack_user_id = slack_user_id_for_pic(pic_name, team)
+    if slack_user_id:
+        return f"<@{slack_user_id}>"
+    if pic_name == "Unassigned":
+        if team.unassigned_owner in team.user_mapping:
+            return f"<@{team.user_mapping[team.unassigned_owner]}>"
+        return "Unassigned"
+    return pic_name
+
+def render_weekly_update_groups(organized_tasks_by_pic, team=DEFAULT_TEAM):
     """
-    Formats the task analysis into a Slack message, grouped by PIC.
+    Yields the weekly update as groups of blocks: the header, then one group
+    per PIC (header, task chunks and divider).
     """
-    message_blocks = []
-    MAX_BLOCK_TEXT_LENGTH = 2900  # Slack section text max is 3000
-    MAX_BLOCKS = 45  # keep buffer under Slack's 50 block limit
-    
-    message_blocks.append({
-        "type": "section",
-        "text": {
-            "type": "mrkdwn",
-            "text": "*Weekly Task Status Update: 📈*"
-        }
-    })
     emoji_explanation_text = (
         "Here's a quick guide to task statuses (only these are listed):\n"
         f"• Not started: {STATUS_EMOJI_MAP.get('Not started', '')}\n"
@@ -279,175 +267,244 @@ def format_slack_message(organized_tasks_by_pic):
         f"• In progress - On Track: {STATUS_EMOJI_MAP.get('In progress - On Track', '')}\n\n"
         "It's Monday morning! Time to update your meeting items and tackle the week ahead. 💪"
     )
-    message_blocks.append({
-        "type": "context",
-        "elements": [
-            {
-                "type": "mrkdwn",
-                "text": emoji_explanation_text
-            }
-        ]
-    })
-    message_blocks.append({"type": "divider"})
+    yield [
+        section("*Weekly Task Status Update: 📈*"),
+        context(emoji_explanation_text),
+        divider(),
+    ]
 
     if not organized_tasks_by_pic:
-        message_blocks.append({
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": "No tasks to report in the Notion database."
-            }
-        })
-    else:
-        for pic_name, tasks_list in organized_tasks_by_pic.items():
-            slack_user_id = None
-            if pic_name in SLACK_USER_MAPPING:
-                slack_user_id = SLACK_USER_MAPPING[pic_name]
-            
-            pic_display = ""
-            if slack_user_id:
-                pic_display = f"<@{slack_user_id}>"
-            elif pic_name == "Unassigned":
-                pic_display = "Unassigned"
-                if "Wendy Wang" in SLACK_USER_MAPPING:
-                    pic_display = f"<@{SLACK_USER_MAPPING['Wendy Wang']}>"
-            else:
-                pic_display = pic_name
-
-            message_blocks.append({
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"*{pic_display}*"
-                }
-            })
-            
-            if not tasks_list:
-                message_blocks.append({
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": "  - No tasks assigned to this person."
-                    }
-                })
-            else:
-                if pic_name == "Unassigned":
-                    message_blocks.append({
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": "These tasks are unassigned, please look into them."
-                        }
-                    })
-
-                pic_tasks_markdown = ""
-                for task in tasks_list:
-                    task_name = get_property_value(task, "dynamic_title", "title", "Untitled Task")
-                    task_status = get_property_value(task, TASK_STATUS_PROPERTY, "status", "Unknown Status")
-                    task_ddl = get_property_value(task, TASK_DDL_PROPERTY, "date", "No Due Date")
-                    task_countdown = get_property_value(task, TASK_COUNTDOWN_PROPERTY, "formula", None)
-                    action_progress = get_action_progress_value(task)
-                    task_url = task["url"]
-                    
-                    status_emoji = STATUS_EMOJI_MAP.get(task_status, "")
-
-                    if task_name != "Untitled Task":
-                        pic_tasks_markdown += f"• *{task_name}* (<{task_url}|_Link_>)\n" 
-                        pic_tasks_markdown += f"    ◦ Status: {status_emoji}\n"
-                        
-                        if task_ddl != "No Due Date":
-                            ddl_text = f"DDL: *{task_ddl}*"
-                            if task_countdown:
-                                ddl_text += f" `{task_countdown}`"
-                            pic_tasks_markdown += f"    ◦ {ddl_text}\n"
-                        else:
-                            ddl_text = "Due Date is Required"
-                            pic_tasks_markdown += f"    ◦ DDL: `{ddl_text}`\n"
-
-                        if action_progress:
-                            pic_tasks_markdown += f"    ◦ Action Progress: `{action_progress}`\n"
-                        
-                        pic_tasks_markdown += "\n" 
-
-                if pic_tasks_markdown.strip():
-                    # Chunk the content to avoid exceeding Slack's per-block text limit
-                    def _chunk_text(s: str, max_len: int):
-                        chunks = []
-                        current = ""
-                        for line in s.splitlines(True):  # keep newlines
-                            if len(current) + len(line) > max_len and current:
-                                chunks.append(current)
-                                current = line
-                            else:
-                                current += line
-                        if current.strip():
-                            chunks.append(current)
-                        return chunks
-
-                    for chunk in _chunk_text(pic_tasks_markdown.strip(), MAX_BLOCK_TEXT_LENGTH):
-                        if len(message_blocks) >= MAX_BLOCKS:
-                            message_blocks.append({
-                                "type": "section",
-                                "text": {"type": "mrkdwn", "text": "_Output truncated to fit Slack limits..._"}
-                            })
-                            break
-                        message_blocks.append({
-                            "type": "section",
-                            "text": {
-                                "type": "mrkdwn",
-                                "text": chunk
-                            }
-                        })
-            message_blocks.append({"type": "divider"})
-
-    return message_blocks
-
-def post_slack_message(blocks, channel_id=None):
+        yield [section("No tasks to report in the Notion database.")]
+        return
+
+    for pic_name, tasks_list in organized_tasks_by_pic.items():
+        group = [section(f"*{format_pic_display(pic_name, team)}*")]
+
+        if not tasks_list:
+            group.append(section("  - No tasks assigned to this person."))
+        else:
+            if pic_name == "Unassigned":
+                group.append(section("These tasks are unassigned, please look into them."))
+
+            lines = []
+            for task in tasks_list:
+                if not task.title:
+                    continue
+                status_emoji = STATUS_EMOJI_MAP.get(task.status or "Unknown Status", "")
+                lines.append(f"• *{task.title}* (<{task.url}|_Link_>)\n")
+                lines.append(f"    ◦ Status: {status_emoji}\n")
+
+                if task.ddl_text:
+                    countdown = f" `{task.countdown}`" if task.countdown else ""
+                    lines.append(f"    ◦ DDL: *{task.ddl_text}*{countdown}\n")
+                else:
+                    lines.append("    ◦ DDL: `Due Date is Required`\n")
+
+                if task.action_progress:
+                    lines.append(f"    ◦ Action Progress: `{task.action_progress}`\n")
+
+                lines.append("\n")
+
+            # Chunked on line boundaries to stay under Slack's per-block text limit
+            group.extend(text_sections(lines))
+
+        group.append(divider())
+        yield group
+
+def format_slack_message(organized_tasks_by_pic, team=DEFAULT_TEAM):
+    """
+    Formats the task analysis into Slack messages, grouped by PIC.
+    Yields one list of blocks per message; large teams span several messages
+    rather than being truncated.
+    """
+    return batch_groups(render_weekly_update_groups(organized_tasks_by_pic, team))
+
+def post_slack_message(blocks, channel_id=None, thread_ts=None):
     """
     Posts the formatted message blocks to the specified Slack channel.
+    Returns the message ts, or None if posting failed.
     """
-    fallback_text = "Notion Task Status Update"
-    if blocks and len(blocks) > 0 and "text" in blocks[0] and "text" in blocks[0]["text"]:
-        fallback_text = blocks[0]["text"]["text"]
+    text = fallback_text(blocks, "Notion Task Status Update")
 
     try:
         target_channel = channel_id or OFFICIAL_CHANNEL_ID
         response = slack_client.chat_postMessage(
             channel=target_channel,
-            text=fallback_text,
-            blocks=blocks
+            text=text,
+            blocks=blocks,
+            thread_ts=thread_ts
         )
         if response["ok"]:
             print(f"Message successfully posted to Slack channel: {target_channel}")
+            return response["ts"]
         else:
             print(f"Error posting message to Slack: {response['error']}")
     except SlackApiError as e:
         print(f"Slack API error: {e.response['error']}")
+        bot_identity.handle_api_error(slack_client, e)
     except Exception as e:
         print(f"An unexpected error occurred while posting to Slack: {e}")
+    return None
+
+def post_threaded_messages(message_batches, channel_id=None):
+    """
+    Posts a series of messages: the first as the parent, the rest as replies
+    in its thread. Posting runs in the background while later batches are
+    still being rendered. Returns the parent message ts.
+    A failed reply is logged and the remaining replies are still posted.
+    """
+    pipeline = PostPipeline()
+    failed_replies = []
+
+    def post_reply(parent_ts, blocks):
+        # Every reply threads under the parent, whose ts is passed along
+        if parent_ts and not post_slack_message(blocks, channel_id=channel_id, thread_ts=parent_ts):
+            failed_replies.append(blocks)
+        return parent_ts
+
+    count = 0
+    for blocks in message_batches:
+        if count == 0:
+            pipeline.submit(lambda _, blocks=blocks: post_slack_message(blocks, channel_id=channel_id))
+        else:
+            pipeline.submit(lambda parent_ts, blocks=blocks: post_reply(parent_ts, blocks))
+        count += 1
+    results = pipeline.close()
+    parent_ts = results[0] if results else None
+    if count > 1:
+        if not parent_ts:
+            print(f"❌ Parent message failed, {count - 1} thread replies not posted")
+        elif failed_replies:
+            print(f"⚠️ Posted digest as {count} messages, but {len(failed_replies)} of "
+                  f"{count - 1} thread replies failed")
+        else:
+            print(f"Posted digest as {count} messages (1 parent + {count - 1} thread replies)")
+    return parent_ts
+
+def _reported_tasks(tasks, team):
+    """The tasks the full weekly list shows: titled, with at least one PIC the team covers"""
+    return [task for task in tasks if task.title and any(team.covers(pic) for pic in task.pics)]
+
+def _task_owners(task, team):
+    owners = [format_pic_display(pic, team) for pic in task.pics if team.covers(pic)]
+    return ", ".join(owners)
 
-def send_weekly_task_update(channel_id=None):
+def _notion_page_url(task_id):
+    return f"https://www.notion.so/{task_id.replace('-', '')}"
+
+def render_weekly_delta_groups(delta, team=DEFAULT_TEAM):
+    """
+    Yields what changed since the last weekly update as groups of blocks:
+    new, changed, newly overdue and closed tasks.
+    """
+    yield [
+        section(f"*Weekly Task Status Update: 📈*\nChanges since {delta.since.isoformat()}"),
+        context("The full per-PIC list is in the thread. 🧵"),
+        divider(),
+    ]
+
+    if delta.is_empty():
+        yield [section("No task changes since the last update.")]
+        return
+
+    if delta.new:
+        lines = []
+        for task in delta.new:
+            status_emoji = STATUS_EMOJI_MAP.get(task.status or "Unknown Status", "")
+            lines.append(f"• {status_emoji} *{task.title or 'Untitled'}* (<{task.url}|_Link_>) {_task_owners(task, team)}\n")
+        yield [section(f"*🆕 New ({len(delta.new)})*")] + text_sections(lines)
+
+    if delta.changed:
+        lines = []
+        for task, previous in delta.changed:
+            previous_status, previous_ddl, previous_progress, previous_title = previous[:4]
+            changes = []
+            if (task.title or "") != previous_title:
+                changes.append(f"Renamed from: {previous_title or '-'}")
+            if (task.status or "") != previous_status:
+                changes.append(f"Status: {previous_status or '-'} → {task.status or '-'}")
+            if (task.ddl_text or "") != previous_ddl:
+                changes.append(f"DDL: {previous_ddl or '-'} → {task.ddl_text or '-'}")
+            if fingerprint(task)[2] != previous_progress:
+                # Only a hash of the old progress is kept, so show the current value
+                changes.append(f"Action Progress: `{task.action_progress}`" if task.action_progress else "Action Progress cleared")
+            lines.append(f"• *{task.title or 'Untitled'}* (<{task.url}|_Link_>) {_task_owners(task, team)}\n")
+            if changes:
+                lines.append(f"    ◦ {'; '.join(changes)}\n")
+        yield [section(f"*✏️ Changed ({len(delta.changed)})*")] + text_sections(lines)
+
+    if delta.overdue:
+        lines = [
+            f"• *{task.title or 'Untitled'}* (<{task.url}|_Link_>) DDL *{task.ddl_text}* {_task_owners(task, team)}\n"
+            for task in delta.overdue
+        ]
+        yield [section(f"*⏰ Now overdue ({len(delta.overdue)})*")] + text_sections(lines)
+
+    if delta.closed:
+        lines = [
+            f"• ~{previous[3] or 'Untitled'}~ (<{_notion_page_url(task_id)}|_Link_>)\n"
+            for task_id, previous in delta.closed
+        ]
+        yield [section(f"*✅ Closed ({len(delta.closed)})*")] + text_sections(lines)
+
+def send_weekly_task_update(channel_id=None, full_sync=False, full=False, team=DEFAULT_TEAM, tasks=None):
     """
     Fetches Notion tasks, analyzes them, and posts the weekly update to Slack.
+    When a previous update was posted to the channel, the parent message only
+    lists what changed and the full per-PIC list goes in its thread;
+    full forces the full list as the message itself.
+    Pass tasks to post an already fetched (e.g. fanned-out) task list.
     """
-    print("Generating Weekly Task Update...")
-    tasks = get_notion_tasks()
+    print(f"Generating Weekly Task Update for team '{team.name}'...")
+    target_channel = channel_id or team.channel_id or OFFICIAL_CHANNEL_ID
+    # The default team keeps the plain channel key used before teams existed
+    state_key = target_channel if team is DEFAULT_TEAM else f"{team.name}:{target_channel}"
+    if tasks is None:
+        tasks = get_notion_tasks(WEEKLY_UPDATE_FILTER, full_sync=full_sync)
     if tasks:
-        organized_tasks_data = analyze_tasks(tasks)
-        slack_message_blocks = format_slack_message(organized_tasks_data)
-        post_slack_message(slack_message_blocks, channel_id=channel_id)
+        organized_tasks_data = analyze_tasks(tasks, team)
+        message_batches = format_slack_message(organized_tasks_data, team)
+
+        # The delta and the saved state cover only what the full list shows
+        reported = _reported_tasks(tasks, team)
+        previous = None if full else digest_state.previous(state_key)
+        if previous:
+            delta = compute_delta(previous, reported)
+            print(f"Changes since {delta.since}: {len(delta.new)} new, {len(delta.changed)} changed, "
+                  f"{len(delta.overdue)} overdue, {len(delta.closed)} closed")
+            message_batches = chain(batch_groups(render_weekly_delta_groups(delta, team)), message_batches)
+
+        if post_threaded_messages(message_batches, channel_id=target_channel):
+            digest_state.save(state_key, reported)
     else:
         print("No tasks fetched or an error occurred. Skipping Slack message post.")
     print("Weekly Task Update process finished.")
 
-def send_last_call_reminder(channel_id=None):
+def get_meeting_doc_link(day=None):
+    """
+    (url, title) of the meeting doc for the day's week (this week by default),
+    or the fixed PM weekly meeting link.
+    """
+    if MEETING_DOCS_DATABASE_ID:
+        meeting_url, meeting_title = get_meeting_doc_resolver(notion_client, MEETING_DOCS_DATABASE_ID).resolve(day)
+        if meeting_url:
+            return meeting_url, meeting_title
+    return PM_WEEKLY_MEETING_URL, PM_WEEKLY_MEETING_TEXT
+
+def send_last_call_reminder(channel_id=None, full_sync=False, team=DEFAULT_TEAM, tasks=None, day=None):
     """
     Sends a 'last call for update' reminder message to Slack.
     This also lists discussion topics for the meeting.
+    Pass tasks to post an already fetched (e.g. fanned-out) topic list, and
+    day to link the meeting doc of that date's week instead of today's.
     """
-    print("Sending Last Call Reminder with Discussion Topics...")
-    
-    tasks = get_notion_tasks() # Fetch all tasks to filter for discussion topics
+    print(f"Sending Last Call Reminder with Discussion Topics for team '{team.name}'...")
+    target_channel = channel_id or team.channel_id or OFFICIAL_CHANNEL_ID
+
+    # Only discussion topics are fetched (see LAST_CALL_FILTER)
+    if tasks is None:
+        tasks = get_notion_tasks(LAST_CALL_FILTER, full_sync=full_sync)
+    meeting_url, meeting_title = get_meeting_doc_link(day)
     
     discussion_topics_by_type_and_pic = {
         "New Topic": {},
@@ -455,31 +512,24 @@ def send_last_call_reminder(channel_id=None):
     }
     
     for task in tasks:
-        discuss_checkbox = get_property_value(task, TASK_DISCUSS_CHECKBOX_PROPERTY, "checkbox", False)
-        topic_type = get_property_value(task, TASK_TOPIC_TYPE_PROPERTY, "select", "Other Topic")
-        is_sub_task = False
-        if TASK_PARENT_RELATION_PROPERTY in task["properties"] and \
-           task["properties"][TASK_PARENT_RELATION_PROPERTY]["relation"]:
-            if task["properties"][TASK_PARENT_RELATION_PROPERTY]["relation"]:
-                is_sub_task = True
-
-        if not is_sub_task:
-            if topic_type == "New Topic" or (topic_type == "Follow-up Topic" and discuss_checkbox):
-                task_name = get_property_value(task, "dynamic_title", "title", "Untitled Topic")
-                task_url = task["url"]
-                pic_values_list = get_property_value(task, TASK_PIC_PROPERTY, "people", ["Unassigned"])
-                
-                for pic_name in pic_values_list:
-                    if pic_name in EXCLUDE_PICS:
-                        continue
-
-                    if pic_name not in discussion_topics_by_type_and_pic[topic_type]:
-                        discussion_topics_by_type_and_pic[topic_type][pic_name] = []
-                    
-                    discussion_topics_by_type_and_pic[topic_type][pic_name].append({
-                        "name": task_name,
-                        "url": task_url
-                    })
+        topic_type = task.topic_type or "Other Topic"
+        if topic_type not in discussion_topics_by_type_and_pic:
+            continue
+
+        task_name = task.title or "Untitled Topic"
+        task_url = task.url
+        
+        for pic_name in task.pics:
+            if not team.covers(pic_name):
+                continue
+
+            if pic_name not in discussion_topics_by_type_and_pic[topic_type]:
+                discussion_topics_by_type_and_pic[topic_type][pic_name] = []
+            
+            discussion_topics_by_type_and_pic[topic_type][pic_name].append({
+                "name": task_name,
+                "url": task_url
+            })
     
     reminder_blocks = [
         {
@@ -515,7 +565,7 @@ def send_last_call_reminder(channel_id=None):
             sorted_pics = sorted(discussion_topics_by_type_and_pic[topic_type].keys())
             
             for pic_name in sorted_pics:
-                slack_user_id = SLACK_USER_MAPPING.get(pic_name)
+                slack_user_id = slack_user_id_for_pic(pic_name, team)
                 pic_display_name = f"<@{slack_user_id}>" if slack_user_id else f"@{pic_name}"
 
                 reminder_blocks.append({
@@ -528,16 +578,10 @@ def send_last_call_reminder(channel_id=None):
 
                 task_markdown_list = []
                 for task_info in discussion_topics_by_type_and_pic[topic_type][pic_name]:
-                    task_markdown_list.append(f"- {task_info['name']} (<{task_info['url']}|_Link_>)")
+                    task_markdown_list.append(f"- {task_info['name']} (<{task_info['url']}|_Link_>)\n")
                 
-                if task_markdown_list:
-                     reminder_blocks.append({
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": "\n".join(task_markdown_list)
-                        }
-                    })
+                # Long topic lists are split across sections instead of overflowing one
+                reminder_blocks.extend(text_sections(task_markdown_list))
             reminder_blocks.append({"type": "divider"})
     
     if not any(discussion_topics_by_type_and_pic.values()):
@@ -555,13 +599,40 @@ def send_last_call_reminder(channel_id=None):
         "elements": [
             {
                 "type": "mrkdwn",
-                "text": f"You can find the meeting notes here: <{PM_WEEKLY_MEETING_URL}|{PM_WEEKLY_MEETING_TEXT}>"
+                "text": f"You can find the meeting notes here: <{meeting_url}|{meeting_title}>"
             }
         ]
     })
-    post_slack_message(reminder_blocks, channel_id=channel_id)
+    post_threaded_messages(batch_groups([reminder_blocks]), channel_id=target_channel)
     print("Last Call Reminder process finished.")
 
+def fan_out(command, teams, full_sync=False, full=False, day=None):
+    """
+    Runs a digest for several teams from one shared fetch: tasks are fetched
+    and decoded once, partitioned by team, and each team's digest is posted
+    to its own channel concurrently.
+    """
+    if command == REMINDER_TYPE_WEEKLY_UPDATE:
+        rule, send = WEEKLY_UPDATE_FILTER, send_weekly_task_update
+        options = {"full": full}
+    else:
+        rule, send = LAST_CALL_FILTER, send_last_call_reminder
+        options = {"day": day}
+
+    tasks = get_notion_tasks(rule, full_sync=full_sync)
+    if not tasks and command == REMINDER_TYPE_WEEKLY_UPDATE:
+        print("No tasks fetched or an error occurred. Skipping Slack message post.")
+        return
+
+    partitions = TeamRouter(teams).partition(tasks)
+    results = run_concurrently({
+        team.name: lambda team=team: send(team=team, tasks=partitions[team.name], **options)
+        for team in teams
+    }, return_exceptions=True)
+    for team_name, result in results.items():
+        if isinstance(result, Exception):
+            print(f"Error posting digest for team '{team_name}': {result}")
+
 
 # Main execution block
 if __name__ == "__main__":
@@ -572,12 +643,26 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Notion-Slack Bot Commands")
     parser.add_argument("command", choices=[REMINDER_TYPE_WEEKLY_UPDATE, REMINDER_TYPE_LAST_CALL], help="Which reminder to run")
     parser.add_argument("--channel", dest="channel", default=None, help="Override Slack channel ID for this run")
+    parser.add_argument("--full-sync", dest="full_sync", action="store_true", help="Re-scan the whole Notion database instead of syncing only recent edits")
+    parser.add_argument("--full", dest="full", action="store_true", help="Post the full task list instead of only the changes since the last weekly update")
+    parser.add_argument("--teams", dest="teams", nargs="?", const="", default=None, help="Post one digest per team to each team's channel, using this team config file (default: TEAMS_CONFIG_PATH)")
     args = parser.parse_args()
 
-    if args.command == REMINDER_TYPE_WEEKLY_UPDATE:
-        send_weekly_task_update(channel_id=args.channel)
-    elif args.command == REMINDER_TYPE_LAST_CALL:
-        send_last_call_reminder(channel_id=args.channel)
+    # Resolve the bot identity up front: a bad token fails fast, before the Notion scan
+    if not bot_identity.warm_up(slack_client):
+        print("Error: Could not authenticate with Slack. Please check SLACK_BOT_TOKEN.")
+        sys.exit(1)
+
+    # Digests are batch work: interactive calls sharing the limiter go first
+    with request_priority(PRIORITY_BATCH):
+        if args.teams is not None:
+            if args.channel:
+                print("Warning: --channel is ignored with --teams; each team posts to its own channel.")
+            fan_out(args.command, load_teams(args.teams or None), full_sync=args.full_sync, full=args.full)
+        elif args.command == REMINDER_TYPE_WEEKLY_UPDATE:
+            send_weekly_task_update(channel_id=args.channel, full_sync=args.full_sync, full=args.full)
+        elif args.command == REMINDER_TYPE_LAST_CALL:
+            send_last_call_reminder(channel_id=args.channel, full_sync=args.full_sync)
 
 
 
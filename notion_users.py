@@ -0,0 +1,222 @@
+"""
+Shared Notion user index
+Resolves people for Notion "people" properties and Slack mentions without a
+round trip per lookup:
+
+- built from a paginated users.list, refreshed when older than the TTL
+  (a stale index keeps serving while one thread refreshes it)
+- keyed by email, normalised name (NFKC, case-folded, single spaces) and
+  Slack user ID (matched through the Slack user directory by email)
+- people() gives the {"id": ...} object Notion expects in a people property;
+  Notion rejects {"email": ...}
+"""
+import os
+import re
+import threading
+import time
+import unicodedata
+
+DEFAULT_TTL_SECONDS = 6 * 3600
+USERS_LIST_PAGE_SIZE = 100  # Notion's maximum
+RETRY_SECONDS = 60
+SLACK_MENTION_RE = re.compile(r"^<@([A-Z0-9]+)(?:\|[^>]*)?>$")
+
+
+def normalize_name(name):
+    """Key for name lookups: "  Wendy  WANG " and "wendy wang" match"""
+    if not name:
+        return ""
+    return " ".join(unicodedata.normalize("NFKC", name).casefold().split())
+
+
+def _compact_user(user):
+    """Keep only the fields the bot uses from a Notion user object"""
+    return {
+        "id": user["id"],
+        "name": user.get("name"),
+        "email": (user.get("person") or {}).get("email"),
+    }
+
+
+def people(user):
+    """Notion people property value for a user from the index"""
+    return {"id": user["id"]}
+
+
+class NotionUserIndex:
+    """TTL-refreshed index of the workspace's Notion people"""
+
+    def __init__(self, notion_client, slack_directory=None, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.notion_client = notion_client
+        self.slack_directory = slack_directory
+        self.ttl_seconds = ttl_seconds
+        self._by_id = {}
+        self._by_email = {}      # lower-cased email -> user
+        self._by_name = {}       # normalised name -> user
+        self._by_slack_id = {}   # Slack user ID -> Notion user, or None if no match
+        self._slack_ids = {}     # Notion user ID -> Slack user ID, or None if no match
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    # --- index maintenance ---
+
+    def refresh(self):
+        """Rebuild the index from users.list; returns the number of people loaded"""
+        users = []
+        cursor = None
+        while True:
+            kwargs = {"page_size": USERS_LIST_PAGE_SIZE}
+            if cursor:
+                kwargs["start_cursor"] = cursor
+            response = self.notion_client.users.list(**kwargs)
+            users.extend(_compact_user(u) for u in response.get("results", []) if u.get("type") == "person")
+            if not response.get("has_more"):
+                break
+            cursor = response.get("next_cursor")
+
+        by_email = {u["email"].lower(): u for u in users if u["email"]}
+        by_name = {}
+        for user in users:
+            by_name.setdefault(normalize_name(user["name"]), user)
+        by_name.pop("", None)
+        with self._lock:
+            self._by_id = {u["id"]: u for u in users}
+            self._by_email = by_email
+            self._by_name = by_name
+            # Slack matches are by email, which may have changed
+            self._by_slack_id = {}
+            self._slack_ids = {}
+            self._loaded_at = time.time()
+            self.refreshes += 1
+        print(f"👥 Notion user index loaded {len(users)} people")
+        return len(users)
+
+    def _ensure_fresh(self):
+        """Load the index on first use and refresh it once it is older than the TTL"""
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.time() - loaded_at < self.ttl_seconds:
+            return
+        # Only the first load blocks; a stale index keeps serving during a refresh
+        if not self._refresh_lock.acquire(blocking=loaded_at is None):
+            return
+        try:
+            if self._loaded_at == loaded_at:
+                self.refresh()
+        except Exception as e:
+            print(f"Error refreshing Notion user index: {e}")
+            # Keep what we have and try again in a minute, not on every lookup
+            with self._lock:
+                self._loaded_at = time.time() - self.ttl_seconds + RETRY_SECONDS
+        finally:
+            self._refresh_lock.release()
+
+    def _lookup(self, table, key):
+        self._ensure_fresh()
+        with self._lock:
+            user = getattr(self, table).get(key)
+            if user:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return user
+
+    # --- lookups ---
+
+    def by_id(self, notion_user_id):
+        return self._lookup("_by_id", notion_user_id) if notion_user_id else None
+
+    def by_email(self, email):
+        return self._lookup("_by_email", email.lower()) if email else None
+
+    def by_name(self, name):
+        key = normalize_name(name)
+        return self._lookup("_by_name", key) if key else None
+
+    def by_slack_user(self, slack_user_id):
+        """Notion user with the same email as the Slack user, or None"""
+        if not slack_user_id:
+            return None
+        self._ensure_fresh()
+        with self._lock:
+            if slack_user_id in self._by_slack_id:
+                self.hits += 1
+                return self._by_slack_id[slack_user_id]
+
+        slack_user = self.slack_directory.get_user(slack_user_id) if self.slack_directory else None
+        user = self.by_email(slack_user.get("email")) if slack_user else None
+        with self._lock:
+            self._by_slack_id[slack_user_id] = user
+            if user:
+                self._slack_ids[user["id"]] = slack_user_id
+        return user
+
+    def resolve(self, text):
+        """Notion user for free-form input: a Slack mention, an email or a name"""
+        text = (text or "").strip()
+        mention = SLACK_MENTION_RE.match(text)
+        if mention:
+            return self.by_slack_user(mention.group(1))
+        if "@" in text:
+            return self.by_email(text)
+        return self.by_name(text)
+
+    def slack_user_id(self, user):
+        """Slack user ID for a Notion user (matched by email), or None"""
+        if not user:
+            return None
+        with self._lock:
+            if user["id"] in self._slack_ids:
+                return self._slack_ids[user["id"]]
+
+        slack_user = None
+        if user.get("email") and self.slack_directory:
+            slack_user = self.slack_directory.lookup_by_email(user["email"])
+        slack_user_id = slack_user["id"] if slack_user else None
+        with self._lock:
+            self._slack_ids[user["id"]] = slack_user_id
+            if slack_user_id:
+                self._by_slack_id[slack_user_id] = user
+        return slack_user_id
+
+    def warm_up(self):
+        """Load the index at startup so the first lookup doesn't pay for it"""
+        self._ensure_fresh()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._by_id),
+                "slack_matches": sum(1 for slack_id in self._slack_ids.values() if slack_id),
+                "ttl_seconds": self.ttl_seconds,
+                "age_seconds": round(time.time() - self._loaded_at) if self._loaded_at else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+            }
+
+
+_indexes = {}  # id(notion client) -> NotionUserIndex
+_indexes_lock = threading.Lock()
+
+
+def get_notion_user_index(notion_client, slack_directory=None):
+    """
+    Shared index for the Notion client, refreshed after
+    NOTION_USER_CACHE_TTL_SECONDS.
+    """
+    with _indexes_lock:
+        index = _indexes.get(id(notion_client))
+        if index is None:
+            index = NotionUserIndex(
+                notion_client,
+                slack_directory=slack_directory,
+                ttl_seconds=int(os.getenv("NOTION_USER_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+            )
+            _indexes[id(notion_client)] = index
+        elif index.slack_directory is None:
+            index.slack_directory = slack_directory
+        return index
@@ -0,0 +1,218 @@
+"""
+Coalescing Notion page writer
+Buffers page-creation intents for a short window and writes them together,
+so a burst of reactions does not hold an event thread per pages.create call.
+
+- intents are deduped by key: a second intent for a pending or in-flight
+  key attaches to the first instead of creating a duplicate page. Writers
+  are shared per Notion client, so keys are namespaced per pipeline, e.g.
+  ("business_request", channel, ts) and ("task", channel, ts): different
+  pipelines reacting to one message each get their own page
+- each window's batch is created concurrently; the shared rate limiter
+  still keeps the calls within Notion's limits
+- callers get a Future, plus on_created/on_failed callbacks that run once
+  the page exists, to post the Slack reply/notification that needs its URL
+
+Callbacks run on the writer's threads at the submitting thread's request
+priority.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from rate_limiter import current_priority, request_priority
+
+DEFAULT_WINDOW_SECONDS = 0.2
+DEFAULT_MAX_BATCH = 50
+DEFAULT_WORKERS = 3  # Notion allows ~3 requests/second per integration
+
+_writers = {}  # id(notion client) -> CoalescingPageWriter
+_writers_lock = threading.Lock()
+
+
+class _Intent:
+    """One pending pages.create and everyone waiting on it"""
+
+    def __init__(self, key, request, priority):
+        self.key = key
+        self.request = request  # pages.create keyword arguments
+        self.priority = priority
+        self.future = Future()
+        self.on_created = []
+        self.on_failed = []
+        self.submitted_at = time.monotonic()
+
+
+class CoalescingPageWriter:
+    """Windowed, deduplicating, concurrent pages.create"""
+
+    def __init__(self, notion_client, window_seconds=DEFAULT_WINDOW_SECONDS,
+                 max_batch=DEFAULT_MAX_BATCH, workers=DEFAULT_WORKERS, name="notion-writer"):
+        self.notion_client = notion_client
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self.workers = workers
+        self.name = name
+        self._pending = OrderedDict()  # key -> _Intent, waiting for the window to close
+        self._in_flight = {}           # key -> _Intent, being created
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._executor = None
+        self._flusher = None
+        self._stopping = False
+        self.created = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.batches = 0
+        self._batched_intents = 0
+
+    def _ensure_started(self):
+        """Start (or restart, e.g. after a fork or shutdown) the flusher thread; call with the lock held"""
+        if self._flusher is None or not self._flusher.is_alive() or self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+            self._flusher = threading.Thread(
+                target=self._flush_loop, args=(self._executor,), name=f"{self.name}-flusher", daemon=True
+            )
+            self._flusher.start()
+
+    def submit(self, key, on_created=None, on_failed=None, **request):
+        """
+        Queue a pages.create(**request) for the key.
+        on_created(page) / on_failed(error) run once the write finishes.
+        Returns a Future resolving to the created page.
+        """
+        with self._lock:
+            intent = self._pending.get(key) or self._in_flight.get(key)
+            if intent is not None:
+                self.coalesced += 1
+                print(f"🔁 Page write for {key} already pending, coalescing")
+            else:
+                intent = _Intent(key, request, current_priority())
+                self._pending[key] = intent
+                self._ensure_started()
+                self._wakeup.notify()
+            if on_created:
+                intent.on_created.append(on_created)
+            if on_failed:
+                intent.on_failed.append(on_failed)
+        return intent.future
+
+    def _take_batch(self):
+        """Wait for the window to close (or the batch to fill) and take the batch"""
+        with self._lock:
+            while not self._pending and not self._stopping:
+                self._wakeup.wait()
+            if not self._pending:
+                return []
+            oldest = next(iter(self._pending.values())).submitted_at
+            while len(self._pending) < self.max_batch and not self._stopping:
+                remaining = oldest + self.window_seconds - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._wakeup.wait(remaining)
+
+            batch = []
+            while self._pending and len(batch) < self.max_batch:
+                key, intent = self._pending.popitem(last=False)
+                self._in_flight[key] = intent
+                batch.append(intent)
+            self.batches += 1
+            self._batched_intents += len(batch)
+            return batch
+
+    def _flush_loop(self, executor):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            with self._lock:
+                if self._executor is not executor:
+                    # shutdown() closed our executor after giving up on joining us:
+                    # leave the batch for the next flusher
+                    for intent in batch:
+                        self._in_flight.pop(intent.key, None)
+                        self._pending[intent.key] = intent
+                    return
+                print(f"📝 Writing {len(batch)} Notion page(s)")
+                for intent in batch:
+                    executor.submit(self._write, intent)
+
+    def _write(self, intent):
+        with request_priority(intent.priority):
+            try:
+                page = self.notion_client.pages.create(**intent.request)
+            except Exception as e:
+                error = e
+                page = None
+            with self._lock:
+                self._in_flight.pop(intent.key, None)
+                if page is not None:
+                    self.created += 1
+                else:
+                    self.failed += 1
+
+            if page is not None:
+                intent.future.set_result(page)
+                callbacks, argument = intent.on_created, page
+            else:
+                print(f"Error creating Notion page for {intent.key}: {error}")
+                intent.future.set_exception(error)
+                callbacks, argument = intent.on_failed, error
+
+            for callback in callbacks:
+                try:
+                    callback(argument)
+                except Exception as e:
+                    print(f"❌ Error in page writer callback for {intent.key}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "in_flight": len(self._in_flight),
+                "created": self.created,
+                "failed": self.failed,
+                "coalesced": self.coalesced,
+                "batches": self.batches,
+                "avg_batch_size": round(self._batched_intents / self.batches, 1) if self.batches else 0.0,
+                "window_ms": round(self.window_seconds * 1000),
+            }
+
+    def shutdown(self, timeout=None):
+        """Write everything still pending, then stop the writer threads"""
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify_all()
+            flusher, executor = self._flusher, self._executor
+        if flusher is not None:
+            flusher.join(timeout)
+        with self._lock:
+            # Detach the executor before closing it, so a flusher that outlived
+            # the join can't submit to it
+            if self._executor is executor:
+                self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        with self._lock:
+            self._stopping = False
+        return not self._pending and not self._in_flight
+
+
+def get_page_writer(notion_client):
+    """
+    Shared writer for the Notion client, configured from the PAGE_WRITER_*
+    environment variables.
+    """
+    with _writers_lock:
+        writer = _writers.get(id(notion_client))
+        if writer is None:
+            writer = CoalescingPageWriter(
+                notion_client,
+                window_seconds=float(os.getenv("PAGE_WRITER_WINDOW_MS", DEFAULT_WINDOW_SECONDS * 1000)) / 1000,
+                max_batch=int(os.getenv("PAGE_WRITER_MAX_BATCH", DEFAULT_MAX_BATCH)),
+                workers=int(os.getenv("PAGE_WRITER_WORKERS", DEFAULT_WORKERS)),
+            )
+            _writers[id(notion_client)] = writer
+        return writer
@@ -0,0 +1,355 @@
+"""
+Rate-limit-aware request scheduler for Slack and Notion
+Every API call goes through a token bucket sized to the API's published
+limits, 429 responses are retried after Retry-After, and transient 5xx
+errors are retried with jittered exponential backoff. So are connection
+errors: always when the request never reached the server, and for reads
+(which are safe to repeat) on any timeout or dropped connection.
+
+Waiting callers are served by priority, so interactive work (modal
+responses, event replies) goes ahead of batch work (digest posting).
+Calls made while Slack waits on the HTTP response run under a
+request_deadline(): they fail fast instead of waiting for a token or a
+retry past Slack's 3-second window (a trigger_id is only valid that long).
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.error import HTTPError, URLError
+
+import httpx
+import requests
+from slack_sdk.errors import SlackApiError
+from notion_client.errors import APIResponseError, RequestTimeoutError
+
+# Priorities: lower value is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BATCH = 2
+
+# Slack Web API tiers, in requests per minute
+# https://api.slack.com/docs/rate-limits
+SLACK_TIER_RATES = {
+    1: 1,
+    2: 20,
+    3: 50,
+    4: 100,
+}
+SLACK_METHOD_TIERS = {
+    "auth.test": 4,
+    "chat.getPermalink": 4,
+    "chat.postEphemeral": 4,
+    "chat.update": 3,
+    "conversations.history": 3,
+    "conversations.replies": 3,
+    "users.info": 4,
+    "users.list": 2,
+    "users.lookupByEmail": 3,
+    "views.open": 4,
+}
+SLACK_DEFAULT_TIER = 3
+# Slack methods that only read, so a request that may have reached Slack can be re-sent
+SLACK_READ_SUFFIXES = (".test", ".info", ".list", ".history", ".replies", ".getPermalink", ".lookupByEmail")
+# chat.postMessage is "special": roughly one message per second per channel
+SLACK_POST_MESSAGE_RATE = 1.0
+
+# Notion allows an average of ~3 requests per second per integration
+NOTION_RATE = 3.0
+NOTION_BURST = 3
+
+MAX_RETRIES = 5
+BASE_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+
+# Budget for API calls made before answering a Slack request (Slack allows 3s)
+REQUEST_DEADLINE_SECONDS = 2.5
+
+_local = threading.local()
+
+
+@contextmanager
+def request_priority(priority):
+    """Run API calls made in this thread at the given priority"""
+    previous = getattr(_local, "priority", None)
+    _local.priority = priority
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def current_priority():
+    """Priority for API calls made in this thread"""
+    priority = getattr(_local, "priority", None)
+    return PRIORITY_NORMAL if priority is None else priority
+
+
+@contextmanager
+def request_deadline(seconds=REQUEST_DEADLINE_SECONDS):
+    """
+    API calls made in this thread within the block give up rather than wait
+    (for a token or a retry) past the deadline. Nested deadlines keep the
+    earlier one.
+    """
+    previous = getattr(_local, "deadline", None)
+    deadline = time.monotonic() + seconds
+    _local.deadline = deadline if previous is None else min(previous, deadline)
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def current_deadline():
+    """Monotonic deadline for API calls made in this thread, or None"""
+    return getattr(_local, "deadline", None)
+
+
+class RateLimitedError(Exception):
+    """Raised by raw HTTP callers when a response was HTTP 429"""
+
+    def __init__(self, retry_after=None, response=None):
+        super().__init__(f"Rate limited (retry after {retry_after}s)")
+        self.retry_after = retry_after
+        self.response = response
+
+
+class TokenBucket:
+    """Token bucket whose waiters are served in priority order"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiters = []  # heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        elapsed = now - self._updated_at
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated_at = now
+
+    def acquire(self, priority=PRIORITY_NORMAL, deadline=None):
+        """
+        Block until a token is available and it is this caller's turn.
+        Returns False, without a token, if that can't happen by the deadline.
+        """
+        ticket = (priority, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiters[0] == ticket:
+                        if now < self._blocked_until:
+                            wait = self._blocked_until - now
+                        elif self._tokens >= 1:
+                            self._tokens -= 1
+                            return True
+                        else:
+                            wait = (1 - self._tokens) / self.rate
+                        if deadline is not None and now + wait > deadline:
+                            return False
+                    else:
+                        # Someone ahead of us; they notify when they get their token
+                        wait = 1.0
+                        if deadline is not None:
+                            if now >= deadline:
+                                return False
+                            wait = min(wait, deadline - now)
+                    self._cond.wait(timeout=wait)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def retry_after(self):
+        """Seconds until the next token is likely free"""
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            return max(0.0, (1 - self._tokens) / self.rate)
+
+    def block_for(self, seconds):
+        """Hold every caller off for a while (e.g. after a Retry-After)"""
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class RequestScheduler:
+    """Per-API, per-method token buckets with Retry-After aware retries"""
+
+    def __init__(self, max_retries=MAX_RETRIES):
+        self.max_retries = max_retries
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.deadline_exceeded = 0
+
+    def _bucket_spec(self, api, method):
+        """(bucket key, rate per second, capacity) for an API method"""
+        if api == "notion":
+            # Notion's limit is per integration, not per endpoint
+            return ("notion",), NOTION_RATE, NOTION_BURST
+        if method == "chat.postMessage":
+            return ("slack", method), SLACK_POST_MESSAGE_RATE, 1
+        tier = SLACK_METHOD_TIERS.get(method, SLACK_DEFAULT_TIER)
+        per_minute = SLACK_TIER_RATES[tier]
+        return ("slack", method), per_minute / 60.0, max(1, per_minute // 10)
+
+    def bucket(self, api, method, channel=None):
+        """The token bucket for an API method (chat.postMessage is per channel)"""
+        key, rate, capacity = self._bucket_spec(api, method)
+        if channel and method == "chat.postMessage":
+            key = key + (channel,)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(rate, capacity)
+                self._buckets[key] = bucket
+            return bucket
+
+    def call(self, api, method, fn, channel=None, priority=None):
+        """
+        Run fn() once a token is available, retrying on 429, 5xx and
+        connection errors (see _classify_error).
+        Exceptions that are not retryable are re-raised immediately, and so
+        is the last error when the next try would miss the thread's
+        request_deadline(); RateLimitedError if no token is free in time.
+        """
+        priority = current_priority() if priority is None else priority
+        deadline = current_deadline()
+        idempotent = _is_read(api, method)
+        bucket = self.bucket(api, method, channel)
+        attempt = 0
+        while True:
+            if not bucket.acquire(priority, deadline):
+                with self._lock:
+                    self.deadline_exceeded += 1
+                raise RateLimitedError(bucket.retry_after())
+            with self._lock:
+                self.calls += 1
+            try:
+                return fn()
+            except Exception as e:
+                retryable, retry_after = _classify_error(e, idempotent)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+
+                if retry_after is not None:
+                    with self._lock:
+                        self.rate_limited += 1
+                    delay = retry_after + random.uniform(0, 1)
+                    bucket.block_for(delay)
+                else:
+                    backoff = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * (2 ** attempt))
+                    delay = random.uniform(0, backoff)  # full jitter
+
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    with self._lock:
+                        self.deadline_exceeded += 1
+                    print(f"⏳ {api} {method} failed ({e}), no time left to retry before the request deadline")
+                    raise
+
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                print(f"⏳ {api} {method} failed ({e}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def stats(self):
+        """Call, retry and 429 counters"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "deadline_exceeded": self.deadline_exceeded,
+                "buckets": len(self._buckets),
+            }
+
+
+def _parse_retry_after(value, default=1.0):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def _is_read(api, method):
+    """Whether an API method only reads, so it is safe to send twice"""
+    if api == "notion":
+        # "GET pages/...", and the POST endpoints that only query
+        verb, _, path = method.partition(" ")
+        return verb.upper() == "GET" or path.endswith("/query") or path == "search"
+    return method.endswith(SLACK_READ_SUFFIXES)
+
+
+def _connection_error(error):
+    """
+    "connect" if the request never reached the server, "transport" for
+    other timeouts and dropped connections, None for anything else.
+    Follows __cause__, since clients wrap the underlying error.
+    """
+    if isinstance(error, RequestTimeoutError):
+        # notion_client re-raises httpx's timeout without chaining it as the cause
+        return _connection_error(error.__context__) or "transport"
+    while error is not None:
+        if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, requests.ConnectTimeout)):
+            return "connect"
+        if isinstance(error, (httpx.TransportError, requests.ConnectionError, requests.Timeout)):
+            return "transport"
+        if isinstance(error, URLError) and not isinstance(error, HTTPError):
+            return "transport"
+        if isinstance(error, (TimeoutError, ConnectionError)):
+            return "transport"
+        error = error.__cause__
+    return None
+
+
+def _classify_error(error, idempotent=False):
+    """
+    Returns (retryable, retry_after_seconds).
+    retry_after is None for transient errors that should use backoff.
+    A timeout or dropped connection may hit after the server acted on the
+    request, so it is only retried for idempotent (read) calls; a failed
+    connect is retried for any call.
+    """
+    if isinstance(error, RateLimitedError):
+        return True, _parse_retry_after(error.retry_after)
+
+    if isinstance(error, SlackApiError):
+        response = error.response
+        status = getattr(response, "status_code", None)
+        if status == 429 or response.get("error") == "ratelimited":
+            headers = getattr(response, "headers", {}) or {}
+            return True, _parse_retry_after(headers.get("Retry-After") or headers.get("retry-after"))
+        return bool(status and status >= 500), None
+
+    if isinstance(error, APIResponseError):
+        if error.status == 429 or error.code == "rate_limited":
+            headers = getattr(error, "headers", None) or {}
+            return True, _parse_retry_after(headers.get("retry-after"))
+        return error.status >= 500, None
+
+    kind = _connection_error(error)
+    if kind == "connect" or (kind == "transport" and idempotent):
+        return True, None
+
+    return False, None
+
+
+# Process-wide scheduler shared by every client
+scheduler = RequestScheduler()
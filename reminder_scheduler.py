@@ -0,0 +1,379 @@
+"""
+Reminder scheduler daemon
+Runs the digest and reminder jobs from one long-running process instead of
+one cron-started script per run, so the Slack/Notion clients, connection
+pools, user cache and task snapshots stay warm between runs.
+
+- cron-like schedules ("minute hour day-of-month month day-of-week") in any
+  IANA timezone
+- optional random jitter after the scheduled time
+- misfire handling: a run missed while the daemon was down is still made up
+  if it is at most misfire_grace_seconds late, otherwise it is skipped
+- a SQLite ledger of runs: each scheduled run is claimed before it starts,
+  so a restart (or a second daemon) never posts the same reminder twice
+
+Jobs are read from a JSON file (SCHEDULE_CONFIG_PATH, see schedule.example.json):
+
+{
+  "timezone": "Asia/Taipei",
+  "jobs": [
+    {"name": "weekly_update", "command": "weekly_update", "cron": "0 9 * * mon",
+     "jitter_seconds": 60, "misfire_grace_seconds": 3600, "options": {"teams": "teams.json"}}
+  ]
+}
+
+Usage:
+    python reminder_scheduler.py            # run the daemon
+    python reminder_scheduler.py --list     # show the next run of every job
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import bot_identity
+import next_sprint_reminder
+import notion_slack_bot
+from rate_limiter import PRIORITY_BATCH, request_priority
+from team_config import load_teams
+
+DEFAULT_CONFIG_PATH = "schedule.json"
+DEFAULT_LEDGER_PATH = "scheduler.sqlite3"
+DEFAULT_MISFIRE_GRACE_SECONDS = 3600
+# Longest the daemon sleeps before re-checking the clock (handles suspend/clock changes)
+MAX_SLEEP_SECONDS = 60
+
+_MONTH_NAMES = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+_DAY_NAMES = ["sun", "mon", "tue", "wed", "thu", "fri", "sat"]
+_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+
+
+def _parse_value(value, names, offset):
+    value = value.lower()
+    if names and value in names:
+        return names.index(value) + offset
+    return int(value)
+
+
+def _parse_field(text, low, high, names=None, offset=0):
+    """Set of values matched by one cron field (*, a, a-b, */n, a-b/n, lists)"""
+    values = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = _parse_value(start_text, names, offset), _parse_value(end_text, names, offset)
+        else:
+            start = _parse_value(part, names, offset)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Invalid cron field '{text}' (allowed {low}-{high})")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    """Five-field cron expression evaluated in a timezone"""
+
+    def __init__(self, expression, tz):
+        self.expression = expression
+        self.tz = tz if isinstance(tz, ZoneInfo) else ZoneInfo(tz)
+        fields = _ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: '{expression}'")
+        minute, hour, day, month, weekday = fields
+        self.minutes = _parse_field(minute, 0, 59)
+        self.hours = _parse_field(hour, 0, 23)
+        self.days = _parse_field(day, 1, 31)
+        self.months = _parse_field(month, 1, 12, _MONTH_NAMES, 1)
+        # 0 and 7 are both Sunday
+        self.weekdays = {d % 7 for d in _parse_field(weekday, 0, 7, _DAY_NAMES, 0)}
+        # Standard cron: when both day fields are restricted, either may match;
+        # a field starting with "*" (including "*/n") counts as unrestricted
+        self._days_or = not day.startswith("*") and not weekday.startswith("*")
+
+    def _day_matches(self, local):
+        day_ok = local.day in self.days
+        weekday_ok = (local.weekday() + 1) % 7 in self.weekdays
+        return (day_ok or weekday_ok) if self._days_or else (day_ok and weekday_ok)
+
+    def next_after(self, after):
+        """First fire time strictly after the given aware datetime"""
+        local = after.astimezone(self.tz).replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        limit = local + timedelta(days=5 * 366)
+        while local < limit:
+            if local.month not in self.months:
+                local = (local.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(local):
+                local = local.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if local.hour not in self.hours:
+                local = local.replace(minute=0) + timedelta(hours=1)
+                continue
+            if local.minute not in self.minutes:
+                local += timedelta(minutes=1)
+                continue
+            # Wall-clock times in a DST gap resolve to just after the transition;
+            # repeated wall-clock times (DST end) fire once, on the first pass
+            candidate = local.replace(tzinfo=self.tz)
+            if candidate > after:
+                return candidate
+            local += timedelta(minutes=1)
+        raise ValueError(f"Cron expression never fires: '{self.expression}'")
+
+
+@dataclass
+class Job:
+    """A scheduled command"""
+    name: str
+    command: str
+    cron: CronExpression
+    jitter_seconds: float = 0
+    misfire_grace_seconds: float = DEFAULT_MISFIRE_GRACE_SECONDS
+    options: dict = field(default_factory=dict)
+
+
+class RunLedger:
+    """SQLite record of every scheduled run, claimed before the run starts"""
+
+    def __init__(self, path=DEFAULT_LEDGER_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_runs ("
+            " job TEXT NOT NULL,"
+            " scheduled_for TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL,"
+            " error TEXT,"
+            " PRIMARY KEY (job, scheduled_for))"
+        )
+
+    @staticmethod
+    def _key(scheduled_for):
+        return scheduled_for.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def claim(self, job_name, scheduled_for, status="running"):
+        """Record the run; returns False if it was already claimed"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO job_runs (job, scheduled_for, status, started_at) VALUES (?, ?, ?, ?)",
+                (job_name, self._key(scheduled_for), status, time.time())
+            )
+            return cursor.rowcount == 1
+
+    def finish(self, job_name, scheduled_for, status, error=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_runs SET status = ?, finished_at = ?, error = ? WHERE job = ? AND scheduled_for = ?",
+                (status, time.time(), error, job_name, self._key(scheduled_for))
+            )
+
+    def last_scheduled(self, job_name):
+        """Scheduled time of the job's latest recorded run, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(scheduled_for) FROM job_runs WHERE job = ?", (job_name,)
+            ).fetchone()
+        if not row or not row[0]:
+            return None
+        return datetime.strptime(row[0], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+
+    def recent(self, limit=20):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT job, scheduled_for, status, error FROM job_runs ORDER BY scheduled_for DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+
+
+# --- Commands ---
+
+# Every command gets day: the fire date in the job's timezone, so rotation and
+# meeting-doc lookups use the scheduled week rather than the host's local date
+def _run_digest(command, day, teams=None, channel=None, full_sync=False, full=False):
+    if teams is not None:
+        notion_slack_bot.fan_out(command, load_teams(teams or None), full_sync=full_sync, full=full, day=day)
+    elif command == notion_slack_bot.REMINDER_TYPE_WEEKLY_UPDATE:
+        notion_slack_bot.send_weekly_task_update(channel_id=channel, full_sync=full_sync, full=full)
+    else:
+        notion_slack_bot.send_last_call_reminder(channel_id=channel, full_sync=full_sync, day=day)
+
+
+COMMANDS = {
+    "weekly_update": lambda day, **options: _run_digest(notion_slack_bot.REMINDER_TYPE_WEEKLY_UPDATE, day, **options),
+    "last_call": lambda day, **options: _run_digest(notion_slack_bot.REMINDER_TYPE_LAST_CALL, day, **options),
+    "next_sprint": lambda day: next_sprint_reminder.send_reminder(day),
+}
+
+# Options each command accepts in a job's "options"
+COMMAND_OPTIONS = {
+    "weekly_update": {"teams", "channel", "full_sync", "full"},
+    "last_call": {"teams", "channel", "full_sync"},
+    "next_sprint": set(),
+}
+
+
+def load_jobs(path=None):
+    """Read the job list from the schedule config file"""
+    path = path or os.getenv("SCHEDULE_CONFIG_PATH", DEFAULT_CONFIG_PATH)
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    default_tz = config.get("timezone") or os.getenv("SCHEDULER_TIMEZONE", "UTC")
+
+    jobs = []
+    for entry in config.get("jobs", []):
+        command = entry.get("command", entry.get("name"))
+        if command not in COMMANDS:
+            raise ValueError(f"Unknown command '{command}' for job '{entry.get('name')}'. Choose from {list(COMMANDS)}")
+        options = entry.get("options", {})
+        unknown = set(options) - COMMAND_OPTIONS[command]
+        if unknown:
+            raise ValueError(
+                f"Unknown options {sorted(unknown)} for job '{entry.get('name', command)}'. "
+                f"'{command}' accepts {sorted(COMMAND_OPTIONS[command]) or 'no options'}"
+            )
+        jobs.append(Job(
+            name=entry.get("name", command),
+            command=command,
+            cron=CronExpression(entry["cron"], entry.get("timezone", default_tz)),
+            jitter_seconds=entry.get("jitter_seconds", 0),
+            misfire_grace_seconds=entry.get("misfire_grace_seconds", DEFAULT_MISFIRE_GRACE_SECONDS),
+            options=options,
+        ))
+    names = [job.name for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate job names in {path}: {names}")
+    return jobs
+
+
+class ReminderScheduler:
+    """Runs jobs at their cron times, one at a time, until stopped"""
+
+    def __init__(self, jobs, ledger):
+        self.jobs = jobs
+        self.ledger = ledger
+        self._stop = threading.Event()
+        self._next = {}  # job name -> (scheduled time, run time including jitter)
+
+    def stop(self, *_):
+        print("Scheduler stopping...")
+        self._stop.set()
+
+    def _schedule(self, job, after):
+        fire = job.cron.next_after(after)
+        run_at = fire + timedelta(seconds=random.uniform(0, job.jitter_seconds)) if job.jitter_seconds else fire
+        self._next[job.name] = (fire, run_at)
+
+    def _schedule_initial(self, job, now):
+        last = self.ledger.last_scheduled(job.name)
+        # Never ran: start from now rather than replaying history.
+        # Otherwise resume after the last recorded run; a missed run is made up
+        # below if it is still within the misfire grace.
+        self._schedule(job, last or now)
+
+    def next_runs(self):
+        now = datetime.now(timezone.utc)
+        for job in self.jobs:
+            if job.name not in self._next:
+                self._schedule_initial(job, now)
+        return {job.name: self._next[job.name] for job in self.jobs}
+
+    def _run(self, job, fire):
+        if not self.ledger.claim(job.name, fire):
+            print(f"Job '{job.name}' for {fire.isoformat()} already ran, skipping.")
+            return
+        print(f"Running job '{job.name}' scheduled for {fire.astimezone(job.cron.tz).isoformat()}")
+        started = time.monotonic()
+        try:
+            with request_priority(PRIORITY_BATCH):
+                COMMANDS[job.command](day=fire.astimezone(job.cron.tz).date(), **job.options)
+            self.ledger.finish(job.name, fire, "ok")
+            print(f"Job '{job.name}' finished in {time.monotonic() - started:.1f}s")
+        except Exception as e:
+            # At-most-once: a failed run is recorded, not retried, so nothing is posted twice
+            self.ledger.finish(job.name, fire, "failed", str(e))
+            print(f"Job '{job.name}' failed: {e}")
+
+    def run_forever(self):
+        self.next_runs()
+        for name, (fire, _) in self._next.items():
+            print(f"Next run of '{name}': {fire.isoformat()}")
+
+        while not self._stop.is_set():
+            name, (fire, run_at) = min(self._next.items(), key=lambda item: item[1][1])
+            job = next(job for job in self.jobs if job.name == name)
+            now = datetime.now(timezone.utc)
+
+            wait = (run_at - now).total_seconds()
+            if wait > 0:
+                self._stop.wait(min(wait, MAX_SLEEP_SECONDS))
+                continue
+
+            if (now - fire).total_seconds() > job.misfire_grace_seconds:
+                print(f"Job '{name}' missed its run at {fire.isoformat()} (beyond the misfire grace), skipping.")
+                self.ledger.claim(job.name, fire, status="missed")
+                # Jump past every other stale run in one step
+                self._schedule(job, max(fire, now - timedelta(seconds=job.misfire_grace_seconds)))
+                continue
+
+            self._run(job, fire)
+            self._schedule(job, fire)
+
+
+def warm_up():
+    """Resolve the bot identity and load the user cache once, up front"""
+    if not bot_identity.warm_up(notion_slack_bot.slack_client):
+        return False
+    notion_slack_bot.user_directory.warm_up()
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reminder scheduler daemon")
+    parser.add_argument("--config", dest="config", default=None, help="Schedule config file (default: SCHEDULE_CONFIG_PATH)")
+    parser.add_argument("--list", dest="list_only", action="store_true", help="Show the next run of every job and exit")
+    args = parser.parse_args()
+
+    jobs = load_jobs(args.config)
+    ledger = RunLedger(os.getenv("SCHEDULER_LEDGER_PATH", DEFAULT_LEDGER_PATH))
+    scheduler = ReminderScheduler(jobs, ledger)
+
+    if args.list_only:
+        for name, (fire, _) in scheduler.next_runs().items():
+            job = next(job for job in jobs if job.name == name)
+            print(f"{name:20} {job.cron.expression:20} next: {fire.astimezone(job.cron.tz).isoformat()}")
+        for job_name, scheduled_for, status, error in ledger.recent():
+            print(f"  {scheduled_for} {job_name}: {status}{f' ({error})' if error else ''}")
+        sys.exit(0)
+
+    if not warm_up():
+        print("Error: Could not authenticate with Slack. Please check SLACK_BOT_TOKEN.")
+        sys.exit(1)
+
+    signal.signal(signal.SIGTERM, scheduler.stop)
+    signal.signal(signal.SIGINT, scheduler.stop)
+    scheduler.run_forever()
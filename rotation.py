@@ -0,0 +1,191 @@
+"""
+Rotation calendar
+Turns an N-way rotation (who runs which meeting each week) into a
+precomputed calendar indexed by ISO week, so "who is on this week" is a
+dict lookup instead of week arithmetic against a hard-coded anchor date.
+
+Skip weeks and holidays take a week out of the rotation without advancing
+it: the slot that would have run moves to the next regular week.
+
+Rotations are read from a JSON file (ROTATION_CONFIG_PATH, see
+rotation.example.json); DEFAULT_ROTATIONS is used when it does not exist.
+
+Preview the calendar:
+    python rotation.py --weeks 8
+"""
+import argparse
+import json
+import os
+import threading
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Optional, Tuple
+
+DEFAULT_CONFIG_PATH = "rotation.json"
+# Weeks materialised at a time; lookups past the end extend the calendar
+HORIZON_WEEKS = 104
+
+# Slack user rotation (edit as needed, or override with ROTATION_CONFIG_PATH)
+DEFAULT_ROTATIONS = {
+    "next_sprint": {
+        # Monday of the first Table & Annie week
+        "anchor": "2024-08-05",
+        "slots": [
+            {
+                "label": "Scrum Team pre-planning: Table",
+                "users": [{"name": "Annie Chen", "id": "U03J5M6SXJS"}],
+            },
+            {
+                "label": "Scrum Team pre-planning: PV & GAP",
+                "users": [
+                    {"name": "Sharon Wu", "id": "U052ED4GV8R"},
+                    {"name": "Casper Chen", "id": "UH13Z1L06"},
+                ],
+            },
+        ],
+        "skip_weeks": [],
+        "holidays": [],
+    }
+}
+
+
+@dataclass(frozen=True)
+class RotationSlot:
+    """One turn of the rotation: a label and the people on duty"""
+    label: str
+    users: Tuple[Tuple[str, str], ...] = ()  # (name, Slack user ID)
+
+    @property
+    def user_ids(self):
+        return [user_id for _, user_id in self.users]
+
+
+def _week_key(day):
+    iso = day.isocalendar()
+    return iso[0], iso[1]
+
+
+def _monday(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _parse_week(value):
+    """ISO week key from "2025-W05" or any date in the week ("2025-02-03")"""
+    if "W" in value:
+        year, week = value.split("-W")
+        return int(year), int(week)
+    return _week_key(date.fromisoformat(value))
+
+
+class Rotation:
+    """An N-way weekly rotation materialised into an ISO-week calendar"""
+
+    def __init__(self, name, anchor, slots, skip_weeks=(), holidays=(), meeting_weekday=None):
+        """
+        anchor: a date in the week the first slot runs
+        skip_weeks: ISO weeks ("2025-W05") or dates with no meeting
+        holidays: dates; a holiday on the meeting weekday skips that week
+        meeting_weekday: 0=Monday..6=Sunday, defaults to the anchor's weekday
+        """
+        if not slots:
+            raise ValueError(f"Rotation '{name}' has no slots")
+        self.name = name
+        self.slots = list(slots)
+        self.anchor_monday = _monday(anchor)
+        self.meeting_weekday = anchor.weekday() if meeting_weekday is None else meeting_weekday
+
+        self._skipped = {_parse_week(value) for value in skip_weeks}
+        for value in holidays:
+            holiday = date.fromisoformat(value)
+            if holiday.weekday() == self.meeting_weekday:
+                self._skipped.add(_week_key(holiday))
+
+        self._calendar = {}  # (ISO year, ISO week) -> slot index, or None for a skipped week
+        self._next_monday = self.anchor_monday
+        self._next_index = 0
+        self._lock = threading.Lock()
+
+    def _extend(self, until_monday):
+        while self._next_monday <= until_monday:
+            key = _week_key(self._next_monday)
+            if key in self._skipped:
+                self._calendar[key] = None
+            else:
+                self._calendar[key] = self._next_index % len(self.slots)
+                self._next_index += 1
+            self._next_monday += timedelta(weeks=1)
+
+    def slot_for(self, day=None) -> Optional[RotationSlot]:
+        """Slot on duty in the week of the given date (today by default); None if no meeting"""
+        day = day or date.today()
+        monday = _monday(day)
+        if monday < self.anchor_monday:
+            return None
+        key = _week_key(monday)
+        with self._lock:
+            if key not in self._calendar:
+                self._extend(monday + timedelta(weeks=HORIZON_WEEKS))
+            index = self._calendar[key]
+        return self.slots[index] if index is not None else None
+
+    def preview(self, weeks, start=None):
+        """[(monday, slot or None)] for the next number of weeks"""
+        monday = _monday(start or date.today())
+        return [(monday + timedelta(weeks=i), self.slot_for(monday + timedelta(weeks=i))) for i in range(weeks)]
+
+
+def _rotation_from_dict(name, data):
+    slots = [
+        RotationSlot(
+            label=slot["label"],
+            users=tuple((user.get("name", user["id"]), user["id"]) for user in slot.get("users", []))
+        )
+        for slot in data.get("slots", [])
+    ]
+    rotation = Rotation(
+        name,
+        date.fromisoformat(data["anchor"]),
+        slots,
+        skip_weeks=data.get("skip_weeks", []),
+        holidays=data.get("holidays", []),
+        meeting_weekday=data.get("meeting_weekday"),
+    )
+    # Materialise up front so lookups during a run never pay for it
+    rotation.slot_for(date.today())
+    return rotation
+
+
+def load_rotations(path=None):
+    """All rotations from the config file, or DEFAULT_ROTATIONS if there is none"""
+    path = path or os.getenv("ROTATION_CONFIG_PATH", DEFAULT_CONFIG_PATH)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f).get("rotations", {})
+    else:
+        config = DEFAULT_ROTATIONS
+    return {name: _rotation_from_dict(name, data) for name, data in config.items()}
+
+
+def load_rotation(name, path=None):
+    rotations = load_rotations(path)
+    if name not in rotations:
+        raise ValueError(f"No rotation named '{name}'. Configured: {list(rotations)}")
+    return rotations[name]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preview a rotation calendar")
+    parser.add_argument("--name", dest="name", default="next_sprint", help="Rotation to preview")
+    parser.add_argument("--weeks", dest="weeks", type=int, default=8, help="Number of weeks to show")
+    parser.add_argument("--config", dest="config", default=None, help="Rotation config file (default: ROTATION_CONFIG_PATH)")
+    args = parser.parse_args()
+
+    rotation = load_rotation(args.name, args.config)
+    for monday, slot in rotation.preview(args.weeks):
+        year, week = _week_key(monday)
+        meeting_day = monday + timedelta(days=rotation.meeting_weekday)
+        if slot is None:
+            print(f"{year}-W{week:02d}  {meeting_day}  (no meeting)")
+        else:
+            people = ", ".join(user_name for user_name, _ in slot.users)
+            print(f"{year}-W{week:02d}  {meeting_day}  {slot.label}: {people}")
@@ -1,36 +1,22 @@
 import os
-import json
-from urllib.request import Request, urlopen
-from urllib.error import URLError, HTTPError
+import importlib
+import threading
+from collections import Counter
 from datetime import datetime
-from flask import Flask, request, jsonify
-from slack_sdk import WebClient
+from flask import Flask, g, request, jsonify
 from slack_sdk.errors import SlackApiError
-from notion_client import Client
 from dotenv import load_dotenv
-
-def http_request(url, method='GET', headers=None, data=None):
-    """Helper function to make HTTP requests using urllib"""
-    if headers is None:
-        headers = {}
-    
-    req = Request(url, method=method, headers=headers)
-    if data:
-        if isinstance(data, dict):
-            data = json.dumps(data).encode('utf-8')
-        req.data = data
-    
-    try:
-        with urlopen(req) as response:
-            return {
-                'status_code': response.status,
-                'text': response.read().decode('utf-8'),
-                'json': lambda: json.loads(response.read().decode('utf-8'))
-            }
-    except HTTPError as e:
-        return {'status_code': e.code, 'text': e.read().decode('utf-8')}
-    except URLError as e:
-        return {'status_code': 500, 'text': str(e)}
+from http_transport import http_request, get_slack_client, get_notion_client
+from event_queue import EventQueue
+from dedupe_store import create_dedupe_store, event_key, message_key
+import bot_identity
+from user_directory import get_user_directory
+from page_writer import get_page_writer
+from notification_digest import create_notification_aggregator
+from event_router import router
+from thread_capture import ThreadCapture, create_thread_store, is_thread_reply, rich_text, text_blocks
+from rate_limiter import PRIORITY_INTERACTIVE, RateLimitedError, request_deadline, request_priority
+import slack_request
 
 # Load environment variables
 load_dotenv()
@@ -58,37 +44,102 @@ NOTION_TAG_PROPERTY = "Tag"  # Property name for the tag
 NOTION_TAG_VALUE = "2025 H2 Assessing"  # The tag value to set
 NOTION_THREAD_LINK_PROPERTY = "Thread Link"  # Property name for the thread link
 
-# Initialize clients
-slack_client = WebClient(token=SLACK_BOT_TOKEN)
-notion_client = Client(auth=NOTION_API_KEY)
+# Modules that register their own commands, modals and reactions on the router
+HANDLER_MODULES = ["create-notion-task"]
+
+# Background processing of events
+EVENT_QUEUE_WORKERS = int(os.getenv("EVENT_QUEUE_WORKERS", "4"))
+EVENT_QUEUE_MAX_SIZE = int(os.getenv("EVENT_QUEUE_MAX_SIZE", "100"))
+
+# Initialize clients (shared keep-alive connection pools)
+slack_client = get_slack_client(SLACK_BOT_TOKEN)
+notion_client = get_notion_client(NOTION_API_KEY)
+user_directory = get_user_directory(slack_client)
+page_writer = get_page_writer(notion_client)
+
+# Captured threads and how far each page has been appended (see THREAD_CAPTURE_* env vars)
+thread_store = create_thread_store()
+thread_capture = ThreadCapture(slack_client, notion_client, thread_store, display_name=user_directory.display_name)
+
+# PM channel notifications are collapsed into one summary per window (see PM_NOTIFY_* env vars)
+pm_notifications = create_notification_aggregator(slack_client, PM_NOTIFICATION_CHANNEL_ID)
+
+# Track processed events/messages to prevent duplicates (see DEDUPE_* env vars)
+dedupe_store = create_dedupe_store()
+
+# Requests acked without reaching a handler, by reason
+early_rejections = Counter()
+_early_rejections_lock = threading.Lock()
+
+def reject_early(reason):
+    with _early_rejections_lock:
+        early_rejections[reason] += 1
+    return jsonify({'status': 'ok'})
+
+def reject_timeout_retries():
+    """
+    Ack Slack's timeout retries without parsing them: we received the
+    original delivery, it was just slow to ack. Retries after an error
+    (e.g. our 503 when the queue was full) still go through.
+    """
+    if request.headers.get('X-Slack-Retry-Num') and request.headers.get('X-Slack-Retry-Reason') == 'http_timeout':
+        return reject_early('retry')
+    return None
 
-# Track processed messages to prevent duplicates
-processed_messages = set()  # Store message timestamps that have been processed
+# Signature and timestamp are checked on the raw body, which is then parsed once into g.slack_request
+request_verifier = slack_request.SlackRequestVerifier(SLACK_SIGNING_SECRET)
+slack_request.install(app, request_verifier, ['/slack/events', '/slack/interactive', '/slack/options'], precheck=reject_timeout_retries)
 
 @app.route('/slack/events', methods=['POST'])
 def slack_events():
-    """Handle Slack events"""
+    """Handle Slack events and slash commands"""
     try:
-        data = request.get_json()
-        
-        # Debug: Log the event type
-        print(f"📥 Received Slack event: {data.get('type') if data else 'No data'}")
-        
+        kind, data = g.slack_request
+
+        # Slash commands are form-encoded, everything else is JSON
+        if kind == 'command':
+            print(f"📥 Received slash command: {data.get('command')}")
+            # A trigger_id expires 3 seconds after the command: don't wait out a rate limit
+            try:
+                with request_deadline():
+                    response = router.dispatch_command(data)
+            except RateLimitedError:
+                return jsonify({'response_type': 'ephemeral', 'text': 'Slack is busy right now, please try again in a moment.'})
+            return response if response is not None else ''
+
         # Handle URL verification challenge (this is what Slack sends first)
-        if data and data.get('type') == 'url_verification':
+        if data.get('type') == 'url_verification':
             challenge = data.get('challenge')
             print(f"✅ URL verification challenge received: {challenge}")
             return jsonify({'challenge': challenge})
         
         # Handle events
-        if data and data.get('type') == 'event_callback':
+        if data.get('type') == 'event_callback':
             event = data.get('event', {})
+
+            # Drop what no handler wants before touching the dedupe store or queue
+            handlers = router.match(event)
+            if not handlers:
+                return reject_early('unrouted')
+            user_id = event.get('user')
+            if event.get('bot_id') or (user_id and user_id == bot_identity.cached_bot_user_id(slack_client)):
+                return reject_early('bot')
+
             print(f"📨 Event type: {event.get('type')}")
             
-            # Handle reaction added event
-            if event.get('type') == 'reaction_added':
-                print("⚡ Processing reaction_added event")
-                handle_reaction_added(event)
+            # Skip Slack retries and duplicate deliveries of an event we already have
+            event_id = data.get('event_id')
+            retry_num = request.headers.get('X-Slack-Retry-Num')
+            if event_id and not dedupe_store.add_if_absent(event_key(event_id)):
+                print(f"⚠️  Event {event_id} already received (retry #{retry_num}), skipping")
+                return jsonify({'status': 'ok'})
+            
+            # Registered handlers are queued so Slack gets its ack right away
+            if not router.dispatch_event(event, handlers):
+                # Let Slack's retry through once we have capacity again
+                if event_id:
+                    dedupe_store.discard(event_key(event_id))
+                return jsonify({'status': 'busy'}), 503
         
         return jsonify({'status': 'ok'})
         
@@ -96,30 +147,31 @@ def slack_events():
         print(f"❌ Error in slack_events: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/slack/interactive', methods=['POST'])
+def slack_interactive():
+    """Handle interactive payloads (modal submissions)"""
+    kind, payload = g.slack_request
+    if kind != 'interactive':
+        return jsonify({'status': 'error', 'message': 'Expected an interactive payload'}), 400
+
+    # Modal responses have a user waiting on them: serve them before batch work
+    with request_priority(PRIORITY_INTERACTIVE), request_deadline():
+        response = router.dispatch_interactive(payload)
+    return response if response is not None else jsonify({"ok": True})
+
+@app.route('/slack/options', methods=['POST'])
+def slack_options():
+    """Handle external_select option requests (answered from in-memory indexes)"""
+    kind, payload = g.slack_request
+    response = router.dispatch_interactive(payload) if kind == 'interactive' else None
+    return response if response is not None else jsonify({'options': []})
+
+@router.on_reaction(TARGET_EMOJI, BUSINESS_REQUEST_EMOJI, channels=[SLACK_CHANNEL_ID])
 def handle_reaction_added(event):
-    """Handle when a reaction is added to a message"""
+    """Handle when a reaction is added to a message (the router has matched emoji and channel)"""
     try:
-        print(f"Handling reaction: {event.get('reaction')}")
-        print(f"Target emoji: {TARGET_EMOJI}")
-        
-        # Check if it's one of the target emojis
         reaction_emoji = event.get('reaction')
-        if reaction_emoji not in [TARGET_EMOJI, BUSINESS_REQUEST_EMOJI]:
-            print(f"Emoji mismatch: got '{reaction_emoji}', expected one of {[TARGET_EMOJI, BUSINESS_REQUEST_EMOJI]}")
-            return
-        
-        print("Emoji check passed")
-        
-        # Check if it's in the target channel
         channel_id = event.get('item', {}).get('channel')
-        print(f"Channel ID: {channel_id}")
-        print(f"Target channel: {SLACK_CHANNEL_ID}")
-        
-        if channel_id != SLACK_CHANNEL_ID:
-            print(f"Channel mismatch: got '{channel_id}', expected '{SLACK_CHANNEL_ID}'")
-            return
-        
-        print("Channel check passed")
         
         # Check if the user is from PM team
         user_id = event.get('user')
@@ -136,34 +188,27 @@ def handle_reaction_added(event):
         item = event.get('item', {})
         message_ts = item.get('ts')
         
-        # Check if we've already processed this message
-        if message_ts in processed_messages:
+        # Check if we've already processed this message (atomic check-and-insert)
+        dedupe_key = message_key(channel_id, message_ts)
+        if not dedupe_store.add_if_absent(dedupe_key):
             print(f"⚠️  Message {message_ts} already processed, skipping to prevent duplicates")
             return
         
-        # Add to processed messages set
-        processed_messages.add(message_ts)
         print(f"📝 Added message {message_ts} to processed list")
         
         # Get the original message
         message_info = get_slack_message(channel_id, message_ts)
         if not message_info:
             print("Failed to get message info")
-            processed_messages.discard(message_ts)  # Remove from processed set
+            dedupe_store.discard(dedupe_key)  # Remove from processed list
             return
         
         # Check if the message is from the bot itself (prevent self-reactions)
-        bot_user_id = None
-        try:
-            auth_response = slack_client.auth_test()
-            if auth_response['ok']:
-                bot_user_id = auth_response['user_id']
-        except Exception as e:
-            print(f"Warning: Could not get bot user ID: {e}")
+        bot_user_id = bot_identity.get_bot_user_id(slack_client)
         
         if bot_user_id and message_info.get('user_id') == bot_user_id:
             print(f"🤖 Skipping reaction to bot's own message from {bot_user_id}")
-            processed_messages.discard(message_ts)  # Remove from processed set
+            dedupe_store.discard(dedupe_key)  # Remove from processed list
             return
         
         print(f"Got message info: {message_info}")
@@ -171,62 +216,78 @@ def handle_reaction_added(event):
         # Reply to the sales user
         reply_to_sales(channel_id, message_ts, message_info['user_id'])
         
-        # Create Notion page
-        notion_page_url = create_notion_page(message_info, channel_id, message_ts)
-        
-        # Notify PM team in their channel
-        if notion_page_url:
-            notify_pm_team(message_info, notion_page_url, channel_id, message_ts)
+        # Create Notion page (batched with other reactions in the same window);
+        # the PM team is notified in their channel once the page URL exists
+        create_notion_page(
+            message_info, channel_id, message_ts,
+            on_created=lambda page_url: notify_pm_team(message_info, page_url, channel_id, message_ts),
+            # Let a later reaction on the message try again
+            on_failed=lambda error: dedupe_store.discard(dedupe_key)
+        )
         
         print(f"✅ Successfully processed {reaction_emoji} reaction from {user_id} on message {message_ts}")
-        print(f"📊 Total processed messages: {len(processed_messages)}")
+        print(f"📊 Dedupe store: {dedupe_store.stats()}")
         
     except Exception as e:
         print(f"Error handling reaction: {e}")
-        # Remove from processed set if there was an error, so it can be retried
-        if 'message_ts' in locals():
-            processed_messages.discard(message_ts)
+        # Remove from processed list if there was an error, so it can be retried
+        if 'dedupe_key' in locals():
+            dedupe_store.discard(dedupe_key)
             print(f"🔄 Removed {message_ts} from processed list due to error")
 
+@router.on_event('message', when=lambda event: event.get('channel') == SLACK_CHANNEL_ID and is_thread_reply(event))
+def handle_thread_reply(event):
+    """Append a new reply to the Notion pages capturing its thread"""
+    try:
+        appended = thread_capture.sync_thread(event['channel'], event['thread_ts'])
+        if appended:
+            print(f"🧵 Appended {appended} new reply(ies) from thread {event['thread_ts']}")
+    except Exception as e:
+        print(f"Error syncing thread reply: {e}")
+
+# Routed events are handled off the request thread so slow Slack/Notion calls
+# never push us past Slack's 3-second ack window
+reaction_queue = EventQueue(
+    lambda job: job(),
+    name="events",
+    workers=EVENT_QUEUE_WORKERS,
+    max_size=EVENT_QUEUE_MAX_SIZE
+)
+router.use_queue(reaction_queue)
+
+handler_modules = [importlib.import_module(module_name) for module_name in HANDLER_MODULES]
+for module in handler_modules:
+    module.register(router)
+
 def get_slack_message(channel_id, message_ts):
-    """Get the original message details"""
+    """Get the original message details and the rest of its thread"""
     try:
-        response = http_request(
-            f"https://slack.com/api/conversations.history?channel={channel_id}&latest={message_ts}&limit=1&inclusive=true",
-            headers={"Authorization": f"Bearer {SLACK_BOT_TOKEN}"}
-        )
-        message_data = json.loads(response['text'])
+        thread, message = thread_capture.fetch(channel_id, message_ts)
         
-        if not message_data.get('ok') or not message_data.get('messages'):
-            print(f"Error getting message: {message_data.get('error', 'Unknown error')}")
+        if not message:
+            print(f"Error getting message: {message_ts} not found in {channel_id}")
             return None
-            
-        message = message_data['messages'][0]
         
         # Check if message has user field
         if 'user' not in message:
             print(f"Message does not have a 'user' field: {message}")
             return None
         
-        # Get user info
-        user_response = http_request(
-            f"https://slack.com/api/users.info?user={message['user']}",
-            headers={"Authorization": f"Bearer {SLACK_BOT_TOKEN}"}
-        )
-        user_data = json.loads(user_response['text'])
-        
-        if not user_data.get('ok'):
-            print(f"Error getting user info: {user_data.get('error', 'Unknown error')}")
+        # Get user info (cached)
+        user = user_directory.get_user(message['user'])
+        if not user:
+            print(f"Error getting user info for {message['user']}")
             return None
             
         return {
             'text': message.get('text', ''),
             'user_id': message.get('user', 'unknown_user'),
-            'user_name': user_data.get('user', {}).get('real_name', 'Unknown User'),
-            'user_email': user_data.get('user', {}).get('profile', {}).get('email', 'unknown@email.com'),
+            'user_name': user.get('real_name') or 'Unknown User',
+            'user_email': user.get('email') or 'unknown@email.com',
             'timestamp': message['ts'],
             'thread_ts': message.get('thread_ts', message['ts']),
-            'channel_id': channel_id
+            'channel_id': channel_id,
+            'thread': thread
         }
         
     except Exception as e:
@@ -261,61 +322,38 @@ def reply_to_sales(channel_id, message_ts, user_id):
         print(f"Error replying to sales user: {e}")
 
 def notify_pm_team(message_info, notion_page_url, original_channel_id, message_ts):
-    """Send notification to PM team channel about new request"""
+    """Add a new request to the PM team channel's summary message"""
     try:
         # Get the original user's display name
         user_id = message_info.get('user_id', '')
-        display_name = user_id
-        
-        try:
-            user_info = slack_client.users_info(user=user_id)
-            if user_info['ok']:
-                user_profile = user_info['user']['profile']
-                if user_profile.get('real_name'):
-                    display_name = user_profile['real_name']
-                elif user_profile.get('display_name'):
-                    display_name = user_profile['display_name']
-                else:
-                    display_name = user_info['user']['name']
-        except Exception:
-            pass
+        display_name = user_directory.display_name(user_id, default=user_id)
         
         # Create thread link to original message
         thread_link = f"https://slack.com/app_redirect?channel={original_channel_id}&message_ts={message_ts}"
         
-        # Create notification message
-        notification_text = (
-            f"🔔 *New Business Request Added*\n\n"
-            f"*Requested by:* {display_name}\n\n"
-            f"📋 *Assessment Page:* {notion_page_url}\n"
-            f"🔗 *Original Message:* <{thread_link}|View in Slack>\n\n"
-            f"<@U08UUNJ86P7> FYI - new business request added for assessment"
-        )
-        
-        response = http_request(
-            "https://slack.com/api/chat.postMessage",
-            method='POST',
-            headers={
-                "Authorization": f"Bearer {SLACK_BOT_TOKEN}",
-                "Content-Type": "application/json"
-            },
-            data={
-                "channel": PM_NOTIFICATION_CHANNEL_ID,
-                "text": notification_text,
-                "unfurl_links": False
-            }
-        )
-        
-        if response['status_code'] == 200:
-            print(f"✅ Notified PM team in channel {PM_NOTIFICATION_CHANNEL_ID}")
-        else:
-            print(f"❌ Error notifying PM team: {response.get('text')}")
+        # Posted (or merged into the open summary) by the aggregator's flusher
+        pm_notifications.add({
+            'display_name': display_name,
+            'page_url': notion_page_url,
+            'thread_link': thread_link,
+        })
             
     except Exception as e:
         print(f"Error notifying PM team: {e}")
 
-def create_notion_page(message_info, channel_id, message_ts):
-    """Create a new page in Notion database"""
+def capture_thread(page_id, channel_id, thread_ts, thread, skip_ts):
+    """Append the Slack thread to its new Notion page (runs on the event queue)"""
+    try:
+        thread_capture.capture(page_id, channel_id, thread_ts, thread, skip_ts=skip_ts)
+    except Exception as e:
+        print(f"Error capturing Slack thread {thread_ts}: {e}")
+
+def create_notion_page(message_info, channel_id, message_ts, on_created=None, on_failed=None):
+    """
+    Queue a new page in the Notion database.
+    The page is written by the shared page writer; on_created(page_url) or
+    on_failed(error) runs once the write finishes. Returns a Future for the page.
+    """
     try:
         # Create thread link - improved format for better accessibility
         workspace_url = "https://app.slack.com/client"  # You may want to make this configurable
@@ -324,24 +362,9 @@ def create_notion_page(message_info, channel_id, message_ts):
         # Alternative direct link format (uncomment if preferred):
         # thread_link = f"{workspace_url}/T{channel_id[1:]}/{channel_id}/p{message_ts.replace('.', '')}"
         
-        # Get user's actual name from Slack
+        # Get user's actual name from Slack (real name, then display name, then username)
         user_id = message_info.get('user_id', '')
-        user_name = user_id  # Default to user_id if we can't get the name
-        display_name = user_name  # What we'll show in Notion
-        
-        try:
-            user_info = slack_client.users_info(user=user_id)
-            if user_info['ok']:
-                user_profile = user_info['user']['profile']
-                # Try to get real name first, then display name, then username
-                if user_profile.get('real_name'):
-                    display_name = user_profile['real_name']
-                elif user_profile.get('display_name'):
-                    display_name = user_profile['display_name']
-                else:
-                    display_name = user_info['user']['name']  # Fallback to username
-        except Exception as e:
-            print(f"Error getting user info: {e}")
+        display_name = user_directory.display_name(user_id, default=user_id)  # What we'll show in Notion
         
         # Prepare Notion page properties
         properties = {
@@ -395,20 +418,8 @@ def create_notion_page(message_info, channel_id, message_ts):
                     ]
                 }
             },
-            {
-                "object": "block",
-                "type": "quote",
-                "quote": {
-                    "rich_text": [
-                        {
-                            "type": "text",
-                            "text": {
-                                "content": message_text
-                            }
-                        }
-                    ]
-                }
-            },
+            # Split to fit Notion's 2000-character rich_text limit
+            *text_blocks("quote", rich_text(message_text)),
             {
                 "object": "block",
                 "type": "heading_3",
@@ -478,26 +489,59 @@ def create_notion_page(message_info, channel_id, message_ts):
                         }
                     ]
                 }
+            },
+            {
+                "object": "block",
+                "type": "heading_3",
+                "heading_3": {
+                    "rich_text": [
+                        {
+                            "type": "text",
+                            "text": {
+                                "content": "💬 Thread Conversation"
+                            }
+                        }
+                    ]
+                }
             }
         ]
         
+        # The conversation itself is appended once the page exists, in batches
+        # within Notion's block limit, and new replies are appended as they arrive
+        thread_ts = message_info.get('thread_ts', message_ts)
+        thread = message_info.get('thread')
+        
+        def page_created(new_page):
+            page_url = new_page.get('url', 'No URL available')
+            print(f"✅ Created Notion page: {new_page['id']}")
+            print(f"🔗 Page URL: {page_url}")
+            
+            # Note: Notion page link is only sent to PM team, not in the original thread
+            if on_created:
+                on_created(page_url)
+            
+            # The reacted message is already in the page's quote. Appending the
+            # thread can take several Notion calls, so it runs on the event
+            # queue rather than holding a page writer thread
+            if not router.defer(capture_thread, new_page['id'], channel_id, thread_ts, thread, message_ts):
+                print(f"⚠️  Event queue full, thread {thread_ts} will be captured with its next reply")
+                thread_capture.track(new_page['id'], channel_id, thread_ts, skip_ts=message_ts)
+        
         # Create the page in SALES_DATABASE_ID
         sales_database_id = os.getenv("SALES_DATABASE_ID")
-        new_page = notion_client.pages.create(
+        return page_writer.submit(
+            ("business_request", channel_id, message_ts),
+            on_created=page_created,
+            on_failed=on_failed,
             parent={"database_id": sales_database_id},
             properties=properties,
             children=page_content
         )
         
-        page_url = new_page.get('url', 'No URL available')
-        print(f"✅ Created Notion page: {new_page['id']}")
-        print(f"🔗 Page URL: {page_url}")
-        
-        # Note: Notion page link is only sent to PM team, not in the original thread
-        return page_url
-        
     except Exception as e:
         print(f"Error creating Notion page: {e}")
+        if on_failed:
+            on_failed(e)
         return None
 
 @app.route('/health', methods=['GET'])
@@ -505,6 +549,24 @@ def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
 
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Event queue depth, worker latency and routing stats"""
+    module_stats = {module.__name__: module.stats() for module in handler_modules if hasattr(module, 'stats')}
+    return jsonify({
+        'reaction_queue': reaction_queue.stats(),
+        'router': router.stats(),
+        'request_verifier': request_verifier.stats(),
+        'early_rejections': dict(early_rejections),
+        'handlers': module_stats,
+        'dedupe_store': dedupe_store.stats(),
+        'user_directory': user_directory.stats(),
+        'page_writer': page_writer.stats(),
+        'thread_capture': thread_capture.stats(),
+        'pm_notifications': pm_notifications.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
 @app.route('/slack/events', methods=['GET'])
 def slack_events_test():
     """Test endpoint for Slack webhook URL"""
@@ -531,9 +593,11 @@ if __name__ == '__main__':
         print(f"Error: Missing environment variables: {missing_vars}")
         exit(1)
     
+    bot_identity.warm_up(slack_client)
+    user_directory.warm_up()
     print("🚀 Slack message handler started")
     print(f"📺 Monitoring channel: {SLACK_CHANNEL_ID}")
-    app.run(host='0.0.0.0', port=3000, debug=True)
+    app.run(host='0.0.0.0', port=3000, debug=os.getenv('DEBUG_MODE', 'false').lower() == 'true', threaded=True)
     print(f"📢 PM notification channel: {PM_NOTIFICATION_CHANNEL_ID}")
     print(f"😀 Target emojis: {TARGET_EMOJI}, {BUSINESS_REQUEST_EMOJI}")
     print(f"👥 PM team members: {PM_TEAM_USER_IDS}")
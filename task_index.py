@@ -0,0 +1,286 @@
+"""
+In-memory task title index for typeahead pickers
+Answers Slack external_select option requests from memory, so a keystroke
+never waits on Notion:
+
+- loaded from the local task snapshot (SQLite), then kept current by a
+  background thread running incremental snapshot syncs; the snapshot is
+  shared by the host's gunicorn workers, so after each sync the index is
+  diffed against the snapshot rather than fed only the sync's own delta
+- character trigrams narrow the candidates for terms of 3+ characters;
+  1-2 character terms scan the titles. Every query term must match as a
+  substring of the normalised title; a word-prefix index ranks the hits
+- results rank titles starting with the query first, then titles with a
+  word starting with it, then other matches; newest edits first within each
+
+Titles are normalised like Notion user names (NFKC, case-folded, single
+spaces), so CJK titles match as substrings too.
+"""
+import heapq
+import os
+import threading
+import time
+
+from notion_users import normalize_name
+from task_snapshot import create_task_snapshot
+
+DEFAULT_REFRESH_SECONDS = 60
+# Titles have no formula/rollup to re-read, so deleted tasks only leave the
+# picker on a full scan: run one daily rather than at the digests' cadence
+RECONCILE_HOURS = 24
+MAX_PREFIX_LENGTH = 8
+MAX_OPTIONS = 100  # Slack's limit for external_select options
+
+_indexes = {}  # database_id -> TaskTitleIndex
+_indexes_lock = threading.Lock()
+
+
+def _page_title(page):
+    for prop in (page.get("properties") or {}).values():
+        if prop.get("type") == "title":
+            return "".join(t.get("plain_text", "") for t in prop.get("title") or [])
+    return ""
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _prefixes(text):
+    prefixes = set()
+    for word in text.split():
+        for length in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1):
+            prefixes.add(word[:length])
+    return prefixes
+
+
+class TaskTitleIndex:
+    """Prefix/trigram index over the titles of one Notion database"""
+
+    def __init__(self, snapshot, notion_client, refresh_seconds=DEFAULT_REFRESH_SECONDS, name="task-index"):
+        self.snapshot = snapshot
+        self.notion_client = notion_client
+        self.refresh_seconds = refresh_seconds
+        self.name = name
+        self._titles = {}         # page ID -> (title, normalised title, last_edited_time)
+        self._prefix_index = {}   # word prefix -> {page ID}
+        self._trigram_index = {}  # trigram -> {page ID}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._thread = None
+        self._stop = threading.Event()
+        self.searches = 0
+        self.syncs = 0
+        self.sync_errors = 0
+        self.last_sync_at = None
+
+    # --- maintenance ---
+
+    def _remove(self, page_id):
+        """Drop a page from the index (caller holds the lock)"""
+        entry = self._titles.pop(page_id, None)
+        if entry is None:
+            return
+        normalised = entry[1]
+        for key in _prefixes(normalised):
+            ids = self._prefix_index.get(key)
+            if ids is not None:
+                ids.discard(page_id)
+                if not ids:
+                    del self._prefix_index[key]
+        for key in _trigrams(normalised):
+            ids = self._trigram_index.get(key)
+            if ids is not None:
+                ids.discard(page_id)
+                if not ids:
+                    del self._trigram_index[key]
+
+    def _add(self, page):
+        """Index one Notion page, replacing any older version (caller holds the lock)"""
+        page_id = page["id"]
+        self._remove(page_id)
+        title = _page_title(page).strip()
+        if not title:
+            return
+        normalised = normalize_name(title)
+        self._titles[page_id] = (title, normalised, page.get("last_edited_time", ""))
+        for key in _prefixes(normalised):
+            self._prefix_index.setdefault(key, set()).add(page_id)
+        for key in _trigrams(normalised):
+            self._trigram_index.setdefault(key, set()).add(page_id)
+
+    def _rebuild(self, pages):
+        with self._lock:
+            self._titles = {}
+            self._prefix_index = {}
+            self._trigram_index = {}
+            for page in pages:
+                self._add(page)
+            self._loaded = True
+
+    def _apply_snapshot(self, pages):
+        """Bring the index in line with the snapshot's pages, touching only what differs"""
+        with self._lock:
+            page_ids = set()
+            for page in pages:
+                page_ids.add(page["id"])
+                entry = self._titles.get(page["id"])
+                if entry is None or entry[2] != page.get("last_edited_time", ""):
+                    self._add(page)
+            for page_id in set(self._titles) - page_ids:
+                self._remove(page_id)
+            self._loaded = True
+
+    def apply(self, changes):
+        """Apply a task_snapshot.SyncChanges"""
+        if changes.full:
+            self._rebuild(changes.pages)
+            return
+        with self._lock:
+            for page in changes.pages:
+                self._add(page)
+            for page_id in changes.removed:
+                self._remove(page_id)
+
+    def refresh(self, full=False):
+        """Sync the snapshot with Notion and apply what changed"""
+        try:
+            changes = self.snapshot.sync_changes(self.notion_client, full=full)
+            # The snapshot's watermark is shared by every worker on the host, so
+            # another worker's sync may already have taken in pages this one
+            # never saw: diff against the snapshot rather than trust the delta
+            pages = None if changes.full else self.snapshot.tasks()
+        except Exception as e:
+            self.sync_errors += 1
+            print(f"Error refreshing task index: {e}")
+            return False
+        if pages is None:
+            self.apply(changes)
+        else:
+            self._apply_snapshot(pages)
+        self.syncs += 1
+        self.last_sync_at = time.time()
+        return True
+
+    def _run(self):
+        # Serve what the local snapshot already has while Notion syncs
+        if not self._loaded:
+            try:
+                self._rebuild(self.snapshot.tasks())
+            except Exception as e:
+                print(f"Error loading task index from snapshot: {e}")
+        self.refresh()
+        while not self._stop.wait(self.refresh_seconds):
+            self.refresh()
+
+    def start(self):
+        """
+        Start the background loader/refresher (or restart it, e.g. after a
+        fork). Cheap to call repeatedly.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            thread = self._thread
+        thread.start()
+
+    def warm_up(self):
+        """Start loading at worker startup so the first picker isn't empty"""
+        self.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # --- search ---
+
+    def _candidates(self, term, within=None):
+        """
+        Page IDs whose normalised title contains the term (caller holds the
+        lock); short terms only scan the IDs within, if given.
+        """
+        if len(term) < 3:
+            # Too short for trigrams; the prefix index would miss mid-word
+            # hits ("ab" in "xab report", two CJK characters mid-title)
+            page_ids = self._titles if within is None else within
+            return {page_id for page_id in page_ids if term in self._titles[page_id][1]}
+
+        trigram_sets = sorted((self._trigram_index.get(key, set()) for key in _trigrams(term)), key=len)
+        ids = set(trigram_sets[0]).intersection(*trigram_sets[1:])
+        return {page_id for page_id in ids if term in self._titles[page_id][1]}
+
+    def search(self, query, limit=MAX_OPTIONS):
+        """[(page ID, title)] best matches for the query; most recently edited when it is empty"""
+        self.start()
+        query = normalize_name(query)
+        with self._lock:
+            self.searches += 1
+            if not query:
+                ids = set(self._titles)
+            else:
+                ids = None
+                for term in sorted(set(query.split()), key=len, reverse=True):
+                    matches = self._candidates(term, ids)
+                    ids = set(matches) if ids is None else ids & matches
+                    if not ids:
+                        return []
+
+            titles = self._titles
+            groups = [ids]
+            if query:
+                # Titles starting with the query, then titles with a word starting with its first term
+                first_term = query.split()[0]
+                starts = {page_id for page_id in ids if titles[page_id][1].startswith(query)}
+                word_starts = ids & self._prefix_index.get(first_term[:MAX_PREFIX_LENGTH], set())
+                if len(first_term) > MAX_PREFIX_LENGTH:
+                    word_starts = {page_id for page_id in word_starts
+                                   if any(word.startswith(first_term) for word in titles[page_id][1].split())}
+                word_starts -= starts
+                groups = [starts, word_starts, ids - starts - word_starts]
+
+            # Newest edits first within each group
+            ordered = []
+            for group in groups:
+                if len(ordered) >= limit:
+                    break
+                ordered.extend(heapq.nlargest(limit - len(ordered), group, key=lambda page_id: titles[page_id][2]))
+            return [(page_id, titles[page_id][0]) for page_id in ordered]
+
+    def title(self, page_id):
+        with self._lock:
+            entry = self._titles.get(page_id)
+            return entry[0] if entry else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "titles": len(self._titles),
+                "prefix_keys": len(self._prefix_index),
+                "trigram_keys": len(self._trigram_index),
+                "searches": self.searches,
+                "syncs": self.syncs,
+                "sync_errors": self.sync_errors,
+                "last_sync_age_seconds": round(time.time() - self.last_sync_at) if self.last_sync_at else None,
+                "refresh_seconds": self.refresh_seconds,
+            }
+
+
+def get_task_title_index(notion_client, database_id, title_property="Name"):
+    """
+    Shared index for the database, refreshed every TASK_INDEX_REFRESH_SECONDS
+    from its own task snapshot (only the title is downloaded).
+    """
+    with _indexes_lock:
+        index = _indexes.get(database_id)
+        if index is None:
+            snapshot = create_task_snapshot(
+                database_id, "titles", properties=[title_property], reconcile_hours=RECONCILE_HOURS
+            )
+            index = TaskTitleIndex(
+                snapshot,
+                notion_client,
+                refresh_seconds=float(os.getenv("TASK_INDEX_REFRESH_SECONDS", DEFAULT_REFRESH_SECONDS)),
+            )
+            _indexes[database_id] = index
+        return index
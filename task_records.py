@@ -0,0 +1,180 @@
+"""
+Typed task records decoded from Notion pages
+A TaskDecoder is built once from the database's property schema
+(databases.retrieve) and turns each raw page into a compact TaskRecord in a
+single pass, so the digest code reads plain attributes instead of walking
+the page's property dicts (and re-parsing dates) for every field it renders.
+"""
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Optional, Tuple
+
+from notion_query import fetch_database_schema
+
+UNASSIGNED = "Unassigned"
+
+
+@dataclass(slots=True)
+class TaskRecord:
+    """The fields of a Notion task that the digests use"""
+    id: str
+    url: str
+    last_edited_time: str = ""
+    title: Optional[str] = None
+    status: Optional[str] = None
+    pics: Tuple[str, ...] = (UNASSIGNED,)
+    pic_ids: Tuple[str, ...] = ()
+    pic_emails: Tuple[str, ...] = ()
+    ddl: Optional[date] = None
+    countdown: Optional[str] = None
+    action_progress: Optional[str] = None
+    topic_type: Optional[str] = None
+    discuss: bool = False
+    parent_ids: Tuple[str, ...] = field(default_factory=tuple)
+
+    @property
+    def ddl_text(self):
+        """DDL as YYYY-MM-DD, or None"""
+        return self.ddl.isoformat() if self.ddl else None
+
+
+# --- value decoders, one per Notion property type ---
+
+def _plain_text(rich_text):
+    return "".join(t["plain_text"] for t in rich_text) if rich_text else None
+
+
+def _parse_date(value):
+    """Date part of an ISO date/datetime string"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        return None
+
+
+def _decode_text(prop):
+    return _plain_text(prop.get(prop["type"]))
+
+
+def _decode_name(prop):
+    option = prop.get(prop["type"])
+    return option["name"] if option else None
+
+
+def _decode_date(prop):
+    value = prop.get("date")
+    return _parse_date(value["start"]) if value else None
+
+
+def _decode_checkbox(prop):
+    return bool(prop.get("checkbox"))
+
+
+def _decode_relation(prop):
+    return tuple(r["id"] for r in prop.get("relation") or [])
+
+
+def _decode_formula(prop):
+    formula = prop.get("formula") or {}
+    for key in ("string", "number", "boolean"):
+        if formula.get(key) is not None:
+            return str(formula[key])
+    return None
+
+
+def _decode_rollup(prop):
+    rollup = prop.get("rollup") or {}
+    if rollup.get("number") is not None:
+        return str(rollup["number"])
+    if rollup.get("array"):
+        parts = []
+        for item in rollup["array"]:
+            if item.get("rich_text"):
+                parts.append(_plain_text(item["rich_text"]))
+            elif item.get("number") is not None:
+                parts.append(str(item["number"]))
+        return ", ".join(parts) if parts else None
+    if rollup.get("date"):
+        value = _parse_date(rollup["date"]["start"])
+        return value.isoformat() if value else None
+    if rollup.get("string") is not None:
+        return rollup["string"]
+    return None
+
+
+def _decode_people(prop):
+    """(names, ids, emails) of the assigned people"""
+    people = prop.get("people") or []
+    names = tuple(p.get("name") for p in people if p.get("name"))
+    ids = tuple(p["id"] for p in people if p.get("id"))
+    emails = tuple((p.get("person") or {}).get("email") for p in people if (p.get("person") or {}).get("email"))
+    return names or (UNASSIGNED,), ids, emails
+
+
+VALUE_DECODERS = {
+    "title": _decode_text,
+    "rich_text": _decode_text,
+    "status": _decode_name,
+    "select": _decode_name,
+    "date": _decode_date,
+    "checkbox": _decode_checkbox,
+    "relation": _decode_relation,
+    "formula": _decode_formula,
+    "rollup": _decode_rollup,
+}
+
+
+class TaskDecoder:
+    """Schema-driven, one-pass decoder from Notion pages to TaskRecords"""
+
+    def __init__(self, schema, field_properties):
+        """
+        schema: {property name: {"id", "type"}} from databases.retrieve
+        field_properties: {TaskRecord field: Notion property name}
+        """
+        self._title_property = next(
+            (name for name, prop in schema.items() if prop["type"] == "title"), None
+        )
+        self._people_property = None
+        self._fields = []  # (record field, property name, decoder)
+        for record_field, property_name in field_properties.items():
+            prop = schema.get(property_name)
+            if not prop:
+                continue
+            if record_field == "pics":
+                self._people_property = property_name
+                continue
+            decoder = VALUE_DECODERS.get(prop["type"])
+            if decoder:
+                self._fields.append((record_field, property_name, decoder))
+
+    @classmethod
+    def from_database(cls, notion_client, database_id, field_properties):
+        """Build a decoder from the database's (cached) property schema"""
+        return cls(fetch_database_schema(notion_client, database_id), field_properties)
+
+    def decode(self, page):
+        """Turn one raw Notion page into a TaskRecord"""
+        properties = page.get("properties", {})
+        record = TaskRecord(
+            id=page["id"],
+            url=page.get("url", ""),
+            last_edited_time=page.get("last_edited_time", "")
+        )
+
+        if self._title_property and self._title_property in properties:
+            record.title = _decode_text(properties[self._title_property]) or None
+
+        if self._people_property and self._people_property in properties:
+            record.pics, record.pic_ids, record.pic_emails = _decode_people(properties[self._people_property])
+
+        for record_field, property_name, decoder in self._fields:
+            prop = properties.get(property_name)
+            if prop:
+                setattr(record, record_field, decoder(prop))
+        return record
+
+    def decode_all(self, pages):
+        return [self.decode(page) for page in pages]
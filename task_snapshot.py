@@ -0,0 +1,281 @@
+"""
+Local snapshot of a Notion task database
+Keeps a SQLite copy of the database's pages so digest runs only download
+what changed since the last run (last_edited_time filter), instead of
+paging through every row each time.
+
+A snapshot can be scoped with a notion_query rule and a property list
+(e.g. the union of several digests' rules, each applied again on read):
+full scans then send the rule as a server-side filter plus a
+filter_properties projection, and incrementally synced pages are re-checked
+against the rule locally (pages that fell out of scope are dropped).
+
+Formula and rollup values (e.g. a countdown to the DDL, or progress rolled
+up from sub-tasks) change without bumping a page's last_edited_time, so
+after an incremental sync they are re-read for every in-scope page with a
+narrow query projected onto just those properties. That query also lists
+every page still in scope, so pages deleted or moved out of the database
+are dropped there too.
+
+Snapshots without formula/rollup properties only notice deleted pages in
+the periodic full reconciliation scan.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import List
+
+from fetch_engine import iter_query_pages
+from notion_query import fetch_database_schema, filter_property_ids
+
+DEFAULT_DB_PATH = "notion_tasks.sqlite3"
+# Weekly digests get several incremental runs between full scans
+DEFAULT_RECONCILE_HOURS = 28 * 24
+
+# Property types Notion recomputes without touching last_edited_time
+VOLATILE_PROPERTY_TYPES = {"formula", "rollup"}
+
+
+@dataclass
+class SyncChanges:
+    """What one sync changed: a full sync replaces everything with pages"""
+    full: bool
+    fetched: int
+    pages: List[dict] = field(default_factory=list)    # upserted (raw Notion pages)
+    removed: List[str] = field(default_factory=list)   # page IDs dropped from the snapshot
+
+
+class TaskSnapshot:
+    """SQLite-backed snapshot of one Notion database, refreshed incrementally"""
+
+    def __init__(self, database_id, name="all", scope=None, properties=None,
+                 path=DEFAULT_DB_PATH, reconcile_hours=DEFAULT_RECONCILE_HOURS):
+        self.database_id = database_id
+        self.scope = scope
+        self.properties = set(properties or [])
+        if scope is not None and self.properties:
+            self.properties |= scope.properties()
+        self.key = f"{database_id}:{name}"
+        self.path = path
+        self.reconcile_seconds = reconcile_hours * 3600
+        self._property_ids = None
+        self._volatile = None  # {property name: property ID} re-read on every sync
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshot_tasks ("
+                " snapshot TEXT NOT NULL,"
+                " id TEXT NOT NULL,"
+                " last_edited_time TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " PRIMARY KEY (snapshot, id))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshot_state ("
+                " snapshot TEXT PRIMARY KEY,"
+                " signature TEXT,"
+                " watermark TEXT,"
+                " last_full_sync REAL)"
+            )
+
+    def signature(self):
+        """Changes whenever the scope or projection changes (forces a full sync)"""
+        scope = self.scope.signature() if self.scope is not None else "-"
+        return f"{scope}:{','.join(sorted(self.properties))}"
+
+    @contextmanager
+    def _connect(self):
+        """Connection that commits on success and is always closed"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _state(self, conn):
+        row = conn.execute(
+            "SELECT signature, watermark, last_full_sync FROM snapshot_state WHERE snapshot = ?",
+            (self.key,)
+        ).fetchone()
+        return row if row else (None, None, None)
+
+    def _load_schema(self, notion_client):
+        if self._volatile is None:
+            schema = fetch_database_schema(notion_client, self.database_id)
+            if self.properties:
+                self._property_ids = filter_property_ids(schema, self.properties)
+            self._volatile = {
+                name: prop["id"] for name, prop in schema.items()
+                if prop["type"] in VOLATILE_PROPERTY_TYPES and (not self.properties or name in self.properties)
+            }
+
+    def _query(self, notion_client, **query):
+        """Database query with this snapshot's projection applied"""
+        self._load_schema(notion_client)
+        if self.properties:
+            query["filter_properties"] = self._property_ids
+        return iter_query_pages(notion_client, self.database_id, **query)
+
+    def _in_scope(self, page):
+        if page.get("archived") or page.get("in_trash"):
+            return False
+        return self.scope is None or self.scope.matches(page)
+
+    def sync(self, notion_client, full=False):
+        """
+        Bring the snapshot up to date. Runs a full scan if requested, if the
+        snapshot is empty, or if the last reconciliation is too old;
+        otherwise only fetches pages edited since the last sync.
+        Returns the number of pages fetched from Notion.
+        """
+        return self.sync_changes(notion_client, full=full).fetched
+
+    def sync_changes(self, notion_client, full=False):
+        """
+        sync(), returning the SyncChanges, for callers that keep state derived
+        from the snapshot up to date incrementally.
+        """
+        with self._lock, self._connect() as conn:
+            signature, watermark, last_full_sync = self._state(conn)
+            reconcile_due = not last_full_sync or time.time() - last_full_sync > self.reconcile_seconds
+            if full or not watermark or reconcile_due or signature != self.signature():
+                return self._full_sync(notion_client, conn)
+            changes = self._incremental_sync(notion_client, conn, watermark)
+            return self._refresh_volatile(notion_client, conn, changes)
+
+    def _full_sync(self, notion_client, conn):
+        started_at = time.time()
+        query = {"filter": self.scope.to_notion()} if self.scope is not None else {}
+        pages = list(self._query(notion_client, **query))
+        watermark = max((p["last_edited_time"] for p in pages), default=None)
+
+        conn.execute("DELETE FROM snapshot_tasks WHERE snapshot = ?", (self.key,))
+        conn.executemany(
+            "INSERT INTO snapshot_tasks (snapshot, id, last_edited_time, payload) VALUES (?, ?, ?, ?)",
+            [(self.key, p["id"], p["last_edited_time"], json.dumps(p)) for p in pages]
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO snapshot_state (snapshot, signature, watermark, last_full_sync)"
+            " VALUES (?, ?, ?, ?)",
+            (self.key, self.signature(), watermark, started_at)
+        )
+        print(f"🔄 Full Notion sync ({self.key}): {len(pages)} tasks in {time.time() - started_at:.1f}s")
+        return SyncChanges(full=True, fetched=len(pages), pages=pages)
+
+    def _incremental_sync(self, notion_client, conn, watermark):
+        started_at = time.time()
+        # last_edited_time is minute-granular, so on_or_after re-reads the
+        # boundary minute; upserts make that harmless
+        # Not scoped server-side: a page that was edited out of scope must
+        # come back so we can drop it
+        pages = list(self._query(
+            notion_client,
+            filter={"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": watermark}},
+            sorts=[{"timestamp": "last_edited_time", "direction": "ascending"}]
+        ))
+
+        live = [p for p in pages if self._in_scope(p)]
+        removed = [p["id"] for p in pages if not self._in_scope(p)]
+        conn.executemany(
+            "INSERT OR REPLACE INTO snapshot_tasks (snapshot, id, last_edited_time, payload) VALUES (?, ?, ?, ?)",
+            [(self.key, p["id"], p["last_edited_time"], json.dumps(p)) for p in live]
+        )
+        conn.executemany(
+            "DELETE FROM snapshot_tasks WHERE snapshot = ? AND id = ?",
+            [(self.key, page_id) for page_id in removed]
+        )
+
+        new_watermark = max([watermark] + [p["last_edited_time"] for p in pages])
+        conn.execute(
+            "UPDATE snapshot_state SET watermark = ? WHERE snapshot = ?",
+            (new_watermark, self.key)
+        )
+        print(f"🔄 Incremental Notion sync ({self.key}): {len(pages)} changed tasks in {time.time() - started_at:.1f}s")
+        return SyncChanges(full=False, fetched=len(pages), pages=live, removed=removed)
+
+    def _refresh_volatile(self, notion_client, conn, changes):
+        """
+        Re-read the formula/rollup properties of every in-scope page and drop
+        pages the scoped query no longer returns. Adds the pages whose values
+        changed (and the dropped ones) to changes.
+        """
+        if not self._volatile:
+            return changes
+        started_at = time.time()
+        query = {"filter": self.scope.to_notion()} if self.scope is not None else {}
+        current = {
+            page["id"]: page.get("properties", {})
+            for page in iter_query_pages(
+                notion_client, self.database_id, filter_properties=list(self._volatile.values()), **query
+            )
+            if not page.get("archived") and not page.get("in_trash")
+        }
+
+        rows = conn.execute("SELECT id, payload FROM snapshot_tasks WHERE snapshot = ?", (self.key,)).fetchall()
+        changed = {page["id"]: page for page in changes.pages}
+        updates, removed = [], []
+        for page_id, payload in rows:
+            properties = current.get(page_id)
+            if properties is None:
+                removed.append(page_id)
+                continue
+            page = json.loads(payload)
+            fresh = {name: properties[name] for name in self._volatile if name in properties}
+            if all(page["properties"].get(name) == value for name, value in fresh.items()):
+                continue
+            page["properties"].update(fresh)
+            updates.append((json.dumps(page), self.key, page_id))
+            changed[page_id] = page
+
+        conn.executemany("UPDATE snapshot_tasks SET payload = ? WHERE snapshot = ? AND id = ?", updates)
+        conn.executemany(
+            "DELETE FROM snapshot_tasks WHERE snapshot = ? AND id = ?",
+            [(self.key, page_id) for page_id in removed]
+        )
+        print(f"🔄 Refreshed {', '.join(self._volatile)} ({self.key}): {len(updates)} changed, "
+              f"{len(removed)} removed in {time.time() - started_at:.1f}s")
+        for page_id in removed:
+            changed.pop(page_id, None)
+        return SyncChanges(
+            full=False,
+            fetched=changes.fetched,
+            pages=list(changed.values()),
+            removed=changes.removed + [page_id for page_id in removed if page_id not in changes.removed],
+        )
+
+    def tasks(self, rule=None):
+        """
+        Pages currently in the snapshot (raw Notion page objects), optionally
+        only those matching a notion_query rule, so several selections can
+        share one snapshot scoped to their union.
+        """
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT payload FROM snapshot_tasks WHERE snapshot = ?",
+                (self.key,)
+            ).fetchall()
+        pages = [json.loads(payload) for (payload,) in rows]
+        return pages if rule is None else [page for page in pages if rule.matches(page)]
+
+
+def create_task_snapshot(database_id, name="all", scope=None, properties=None, reconcile_hours=None):
+    """
+    Snapshot for the database, configured from the TASK_SNAPSHOT_* env vars;
+    reconcile_hours overrides TASK_SNAPSHOT_RECONCILE_HOURS.
+    """
+    if reconcile_hours is None:
+        reconcile_hours = float(os.getenv("TASK_SNAPSHOT_RECONCILE_HOURS", DEFAULT_RECONCILE_HOURS))
+    return TaskSnapshot(
+        database_id,
+        name=name,
+        scope=scope,
+        properties=properties,
+        path=os.getenv("TASK_SNAPSHOT_PATH", DEFAULT_DB_PATH),
+        reconcile_hours=reconcile_hours
+    )
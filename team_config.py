@@ -0,0 +1,116 @@
+"""
+Team configuration for digest fan-out
+Each team gets its own digest in its own channel, built from one shared
+fetch of the Notion database. Teams are read from a JSON file:
+
+{
+  "teams": [
+    {
+      "name": "pm",
+      "channel": "C0123456789",
+      "members": {"Wendy Wang": "U08UUNJ86P7", "Sharon Wu": "U052ED4GV8R"},
+      "exclude_pics": ["Jason"],
+      "include_unassigned": true,
+      "unassigned_owner": "Wendy Wang"
+    }
+  ]
+}
+
+members maps Notion PIC names (or emails) to Slack user IDs. A team without
+members is a catch-all: it covers every PIC it does not exclude.
+"""
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Optional
+
+UNASSIGNED = "Unassigned"
+DEFAULT_TEAMS_PATH = "teams.json"
+
+
+@dataclass(frozen=True)
+class Team:
+    """Who a digest is for and where it is posted"""
+    name: str
+    channel_id: Optional[str] = None
+    user_mapping: Dict[str, str] = field(default_factory=dict)
+    exclude_pics: FrozenSet[str] = frozenset()
+    include_unassigned: bool = True
+    unassigned_owner: Optional[str] = None
+    catch_all: bool = False
+
+    def covers(self, pic_name):
+        """True if tasks of this PIC belong in the team's digest"""
+        if pic_name in self.exclude_pics:
+            return False
+        if pic_name == UNASSIGNED:
+            return self.include_unassigned
+        return self.catch_all or pic_name in self.user_mapping
+
+
+class TeamRouter:
+    """
+    Partitions tasks between teams.
+    The PIC -> teams index is built once, so each task costs one dict
+    lookup per PIC instead of a scan over every team's rules.
+    """
+
+    def __init__(self, teams):
+        self.teams = list(teams)
+        self._pic_index = {}
+        for team in self.teams:
+            for pic_name in team.user_mapping:
+                if team.covers(pic_name):
+                    self._pic_index.setdefault(pic_name, []).append(team)
+        self._unassigned_teams = [team for team in self.teams if team.covers(UNASSIGNED)]
+        self._catch_all_teams = [team for team in self.teams if team.catch_all]
+
+    def teams_for(self, pic_name):
+        if pic_name == UNASSIGNED:
+            return self._unassigned_teams
+        teams = self._pic_index.get(pic_name, [])
+        catch_all = [team for team in self._catch_all_teams if team.covers(pic_name) and team not in teams]
+        return teams + catch_all if catch_all else teams
+
+    def partition(self, tasks):
+        """{team name: tasks with at least one PIC the team covers}, in task order"""
+        partitions = {team.name: [] for team in self.teams}
+        for task in tasks:
+            seen = set()
+            for pic_name in task.pics:
+                for team in self.teams_for(pic_name):
+                    if team.name not in seen:
+                        seen.add(team.name)
+                        partitions[team.name].append(task)
+        return partitions
+
+
+def _team_from_dict(data):
+    if not data.get("name"):
+        raise ValueError(f"Team config entry is missing a name: {data}")
+    members = data.get("members") or {}
+    if not isinstance(members, dict):
+        raise ValueError(f"Team '{data['name']}': members must map PIC names to Slack user IDs")
+    return Team(
+        name=data["name"],
+        channel_id=data.get("channel"),
+        user_mapping=dict(members),
+        exclude_pics=frozenset(data.get("exclude_pics") or []),
+        include_unassigned=data.get("include_unassigned", True),
+        unassigned_owner=data.get("unassigned_owner"),
+        catch_all=not members,
+    )
+
+
+def load_teams(path=None):
+    """Read the team list from a JSON config file (TEAMS_CONFIG_PATH by default)"""
+    path = path or os.getenv("TEAMS_CONFIG_PATH", DEFAULT_TEAMS_PATH)
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    teams = [_team_from_dict(entry) for entry in config.get("teams", [])]
+    if not teams:
+        raise ValueError(f"No teams configured in {path}")
+    names = [team.name for team in teams]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate team names in {path}: {names}")
+    return teams
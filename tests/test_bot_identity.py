@@ -0,0 +1,100 @@
+import itertools
+import threading
+import time
+
+import pytest
+from slack_sdk.errors import SlackApiError
+
+import bot_identity
+
+_tokens = itertools.count()
+
+
+class FakeClient:
+    def __init__(self, fail=False):
+        self.token = f"xoxb-test-{next(_tokens)}"
+        self.fail = fail
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def auth_test(self):
+        self.calls += 1
+        self.release.wait(5)
+        if self.fail:
+            raise SlackApiError("invalid_auth", {"ok": False, "error": "invalid_auth"})
+        return {"user_id": "UBOT", "bot_id": "BBOT", "team_id": "T1", "user": "notion-bot"}
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_identity_is_cached_per_token():
+    client = FakeClient()
+    assert bot_identity.get_bot_user_id(client) == "UBOT"
+    assert bot_identity.get_bot_user_id(client) == "UBOT"
+    assert client.calls == 1
+
+
+def test_slow_auth_test_does_not_block_request_threads():
+    client = FakeClient()
+    client.release.clear()
+    waiter = threading.Thread(target=bot_identity.get_bot_identity, args=(client,))
+    waiter.start()
+    _wait_for(lambda: client.calls == 1)
+
+    started = time.monotonic()
+    assert bot_identity.cached_bot_user_id(client) is None
+    # The lock isn't held across auth.test, so other tokens aren't held up either
+    assert bot_identity.get_bot_user_id(FakeClient()) == "UBOT"
+    assert time.monotonic() - started < 1
+
+    client.release.set()
+    waiter.join(5)
+    assert bot_identity.cached_bot_user_id(client) == "UBOT"
+
+
+def test_concurrent_lookups_share_one_auth_test():
+    client = FakeClient()
+    client.release.clear()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(bot_identity.get_bot_user_id(client)))
+               for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    _wait_for(lambda: client.calls == 1)
+    client.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["UBOT"] * 3 and client.calls == 1
+
+
+def test_cached_lookup_resolves_in_the_background():
+    client = FakeClient()
+    assert bot_identity.cached_bot_user_id(client) is None
+    _wait_for(lambda: bot_identity.cached_bot_user_id(client) == "UBOT")
+    assert client.calls == 1
+
+
+def test_failures_are_not_retried_until_the_retry_window_passes():
+    client = FakeClient(fail=True)
+    assert bot_identity.get_bot_identity(client) is None
+    assert bot_identity.get_bot_identity(client) is None
+    assert bot_identity.cached_bot_user_id(client) is None
+    assert client.calls == 1
+
+    bot_identity._retry_at[client.token] = 0  # the window has passed
+    client.fail = False
+    assert bot_identity.get_bot_user_id(client) == "UBOT"
+
+
+@pytest.mark.parametrize("error, invalidated", [("token_revoked", True), ("channel_not_found", False)])
+def test_auth_errors_invalidate_the_identity(error, invalidated):
+    client = FakeClient()
+    bot_identity.get_bot_identity(client)
+    bot_identity.handle_api_error(client, SlackApiError(error, {"ok": False, "error": error}))
+    assert (bot_identity.cached_bot_user_id(client) is None) == invalidated
@@ -0,0 +1,58 @@
+from dedupe_store import MemoryDedupeStore, SQLiteDedupeStore, event_key, message_key
+
+
+def test_memory_store_dedupes_within_ttl():
+    store = MemoryDedupeStore(ttl_seconds=60)
+    assert store.add_if_absent(event_key("Ev1"))
+    assert not store.add_if_absent(event_key("Ev1"))
+    assert store.stats()["hits"] == 1 and store.stats()["misses"] == 1
+
+
+def test_memory_store_expires_in_insertion_order():
+    store = MemoryDedupeStore(ttl_seconds=10)
+    assert store._add_if_absent("a", now=0)
+    assert store._add_if_absent("b", now=5)
+    # A duplicate does not extend its key's lifetime (FIFO, not LRU)
+    assert not store._add_if_absent("a", now=9)
+    assert store._add_if_absent("a", now=10)
+    assert store.size() == 2
+
+
+def test_memory_store_evicts_oldest_past_max_entries():
+    store = MemoryDedupeStore(ttl_seconds=60, max_entries=2)
+    for key in ("a", "b", "c"):
+        store.add_if_absent(key)
+    assert store.size() == 2
+    assert store.add_if_absent("a")
+    assert not store.add_if_absent("c")
+
+
+def test_discard_allows_a_retry():
+    store = MemoryDedupeStore()
+    key = message_key("C1", "1700000000.000100")
+    store.add_if_absent(key)
+    store.discard(key)
+    assert store.add_if_absent(key)
+
+
+def test_sqlite_store_dedupes_and_expires(tmp_path):
+    store = SQLiteDedupeStore(path=str(tmp_path / "dedupe.sqlite3"), ttl_seconds=10)
+    assert store._add_if_absent("a", now=0)
+    assert not store._add_if_absent("a", now=5)
+    assert store._add_if_absent("a", now=10)
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "dedupe.sqlite3")
+    assert SQLiteDedupeStore(path=path).add_if_absent("a")
+    assert not SQLiteDedupeStore(path=path).add_if_absent("a")
+
+
+def test_sqlite_store_purge_trims_to_max_entries(tmp_path):
+    store = SQLiteDedupeStore(path=str(tmp_path / "dedupe.sqlite3"), ttl_seconds=100, max_entries=3)
+    store.PURGE_EVERY = 5
+    for i in range(5):
+        store._add_if_absent(f"k{i}", now=i)
+    assert store.size() == 3
+    # The newest keys are kept
+    assert not store._add_if_absent("k4", now=5)
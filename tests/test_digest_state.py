@@ -0,0 +1,59 @@
+from datetime import date, datetime
+
+from digest_state import DigestState, compute_delta, fingerprint
+from task_records import TaskRecord
+
+
+def _task(task_id, **fields):
+    fields.setdefault("title", f"Task {task_id}")
+    return TaskRecord(id=task_id, url=f"https://notion.so/{task_id}", **fields)
+
+
+def _previous(*tasks, posted_at="2024-05-06T09:00:00"):
+    return {"posted_at": posted_at, "tasks": {task.id: fingerprint(task) for task in tasks}}
+
+
+def test_fingerprint_includes_the_title():
+    assert fingerprint(_task("1", title="Old")) != fingerprint(_task("1", title="New"))
+
+
+def test_fingerprint_hashes_progress():
+    task = _task("1", status="Done", ddl=date(2024, 5, 10), action_progress="50%")
+    status, ddl, progress, title = fingerprint(task)
+    assert (status, ddl, title) == ("Done", "2024-05-10", "Task 1")
+    assert len(progress) == 8 and progress != "50%"
+
+
+def test_delta_reports_new_changed_and_closed():
+    kept, renamed, closed = _task("1"), _task("2", title="Before"), _task("3")
+    previous = _previous(kept, renamed, closed)
+    delta = compute_delta(previous, [kept, _task("2", title="After"), _task("4")], today=date(2024, 5, 13))
+    assert [task.id for task in delta.new] == ["4"]
+    assert [(task.id, old[3]) for task, old in delta.changed] == [("2", "Before")]
+    assert [task_id for task_id, _ in delta.closed] == ["3"]
+    assert delta.since == date(2024, 5, 6)
+
+
+def test_delta_reports_tasks_that_went_overdue_since_the_last_post():
+    went_overdue = _task("1", ddl=date(2024, 5, 8))
+    already_overdue = _task("2", ddl=date(2024, 5, 1))
+    not_due = _task("3", ddl=date(2024, 5, 20))
+    delta = compute_delta(_previous(went_overdue, already_overdue, not_due),
+                          [went_overdue, already_overdue, not_due], today=date(2024, 5, 13))
+    assert [task.id for task in delta.overdue] == ["1"]
+    assert not delta.changed
+
+
+def test_unchanged_tasks_give_an_empty_delta():
+    task = _task("1", status="In progress")
+    assert compute_delta(_previous(task), [task], today=date(2024, 5, 13)).is_empty()
+
+
+def test_state_round_trips_per_key(tmp_path):
+    state = DigestState(str(tmp_path / "digest_state.json"))
+    assert state.previous("C1") is None
+    state.save("C1", [_task("1")], posted_at=datetime(2024, 5, 6, 9))
+    saved = state.previous("C1")
+    assert saved["posted_at"] == "2024-05-06T09:00:00"
+    assert saved["tasks"] == {"1": fingerprint(_task("1"))}
+    assert state.previous("C2") is None
@@ -0,0 +1,118 @@
+import threading
+
+from event_queue import EventQueue, StageLatency
+from event_router import EventRouter
+
+
+def _blocking_queue(max_size=1):
+    """Queue whose single worker holds the first item until released"""
+    started, release = threading.Event(), threading.Event()
+    handled = []
+
+    def handler(item):
+        started.set()
+        release.wait(5)
+        handled.append(item)
+
+    return EventQueue(handler, workers=1, max_size=max_size), started, release, handled
+
+
+def test_workers_run_the_handler_for_each_item():
+    handled = []
+    events = EventQueue(handled.append, workers=2, max_size=10)
+    for i in range(5):
+        assert events.submit(i)
+    assert events.shutdown(drain=True, timeout=5)
+    assert sorted(handled) == [0, 1, 2, 3, 4]
+    stats = events.stats()
+    assert (stats["enqueued"], stats["processed"], stats["failed"], stats["dropped"]) == (5, 5, 0, 0)
+
+
+def test_full_queue_drops_the_item():
+    events, started, release, handled = _blocking_queue(max_size=1)
+    assert events.submit("running")
+    assert started.wait(5)
+    assert events.submit("queued")
+    assert not events.submit("dropped")
+    stats = events.stats()
+    assert stats["queue_depth"] == 1 and stats["busy_workers"] == 1 and stats["dropped"] == 1
+    release.set()
+    assert events.shutdown(timeout=5)
+    assert handled == ["running", "queued"]
+
+
+def test_full_queue_makes_the_router_ask_for_a_retry():
+    # The events endpoint answers 503 when dispatch_event returns False
+    started, release = threading.Event(), threading.Event()
+    events = EventQueue(lambda job: job(), workers=1, max_size=1)
+    router = EventRouter()
+    router.use_queue(events)
+
+    @router.on_event("app_mention")
+    def handle_mention(event):
+        started.set()
+        release.wait(5)
+
+    assert router.dispatch_event({"type": "app_mention"})
+    assert started.wait(5)
+    assert router.dispatch_event({"type": "app_mention"})
+    assert not router.dispatch_event({"type": "app_mention"})
+    release.set()
+    assert events.shutdown(timeout=5)
+    assert events.stats()["processed"] == 2
+
+
+def test_handler_errors_are_counted_and_the_worker_keeps_going():
+    handled = []
+
+    def handler(item):
+        if item == "bad":
+            raise RuntimeError("boom")
+        handled.append(item)
+
+    events = EventQueue(handler, workers=1, max_size=10)
+    for item in ("bad", "good"):
+        events.submit(item)
+    assert events.shutdown(timeout=5)
+    assert handled == ["good"]
+    assert events.stats()["failed"] == 1 and events.stats()["processed"] == 1
+
+
+def test_stats_report_wait_and_run_latency():
+    events = EventQueue(lambda item: threading.Event().wait(0.02), workers=1, max_size=10)
+    events.submit(1)
+    events.submit(2)
+    events.shutdown(timeout=5)
+    stats = events.stats()
+    assert stats["latency_ms"]["avg"] >= 15 and stats["latency_ms"]["max"] >= stats["latency_ms"]["avg"]
+    # The second item waited for the first one to finish
+    assert stats["wait_ms"]["p95"] >= 15
+
+
+def test_shutdown_without_drain_discards_queued_items():
+    events, started, release, handled = _blocking_queue(max_size=5)
+    events.submit("running")
+    assert started.wait(5)
+    events.submit("queued")
+    release.set()
+    assert events.shutdown(drain=False, timeout=5)
+    assert handled == ["running"]
+
+
+def test_queue_restarts_after_shutdown():
+    handled = []
+    events = EventQueue(handled.append, workers=1, max_size=10)
+    events.submit(1)
+    events.shutdown(timeout=5)
+    events.submit(2)
+    events.shutdown(timeout=5)
+    assert handled == [1, 2]
+
+
+def test_stage_latency_records_each_stage():
+    latency = StageLatency()
+    with latency.measure("notion_write"):
+        pass
+    latency.record("notion_write", 0.5)
+    stats = latency.stats()["notion_write"]
+    assert stats["count"] == 2 and stats["max_ms"] == 500.0
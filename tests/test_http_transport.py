@@ -0,0 +1,65 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import URLError
+
+import pytest
+
+from http_transport import PooledWebClient
+from rate_limiter import scheduler
+
+
+class FlakySlack(BaseHTTPRequestHandler):
+    """Drops the first `drops` connections without answering, then answers auth.test"""
+
+    drops = 0
+    requests = 0
+
+    def do_POST(self):
+        type(self).requests += 1
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if type(self).requests <= type(self).drops:
+            self.close_connection = True
+            return
+        body = json.dumps({"ok": True, "user_id": "UBOT"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def slack_server():
+    def serve(drops):
+        handler = type("Handler", (FlakySlack,), {"drops": drops, "requests": 0})
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return handler, f"http://127.0.0.1:{server.server_port}/api/"
+
+    servers = []
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_dropped_connection_is_retried_by_slack_sdk(slack_server):
+    handler, base_url = slack_server(drops=1)
+    client = PooledWebClient(token="xoxb-test", base_url=base_url)
+    assert client.auth_test()["user_id"] == "UBOT"
+    assert handler.requests == 2
+
+
+def test_connection_errors_surface_as_urllib_errors(slack_server, monkeypatch):
+    monkeypatch.setattr(scheduler, "max_retries", 0)
+    handler, base_url = slack_server(drops=10)
+    client = PooledWebClient(token="xoxb-test", base_url=base_url)
+    client.retry_handlers = []
+    with pytest.raises(URLError):
+        client.auth_test()
+    assert handler.requests == 1
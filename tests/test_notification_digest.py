@@ -0,0 +1,49 @@
+import json
+
+from notification_digest import NotificationAggregator
+
+
+class FakeSlack:
+    def __init__(self):
+        self.posts = []
+        self.updates = []
+
+    def chat_postMessage(self, **kwargs):
+        self.posts.append(kwargs)
+        return {"ts": f"100.{len(self.posts)}"}
+
+    def chat_update(self, **kwargs):
+        self.updates.append(kwargs)
+        return {"ok": True}
+
+
+def _entry(name):
+    return {"display_name": name, "page_url": f"https://notion.so/{name}", "thread_link": f"https://slack/{name}"}
+
+
+def test_update_does_not_repeat_the_mention():
+    slack = FakeSlack()
+    aggregator = NotificationAggregator(slack, "CPM", flush_interval=0, mention="<@UPM>")
+    aggregator.add(_entry("ada"))
+    aggregator.shutdown(timeout=5)
+    aggregator.add(_entry("grace"))
+    aggregator.shutdown(timeout=5)
+
+    assert len(slack.posts) == 1 and len(slack.updates) == 1
+    assert "<@UPM>" in json.dumps(slack.posts[0]["blocks"])
+    update = slack.updates[0]
+    assert update["ts"] == "100.1"
+    assert "<@UPM>" not in json.dumps(update["blocks"])
+    assert "grace" in json.dumps(update["blocks"]) and "ada" in json.dumps(update["blocks"])
+
+
+def test_overflow_posts_a_new_summary_with_the_mention():
+    slack = FakeSlack()
+    aggregator = NotificationAggregator(slack, "CPM", flush_interval=0, max_batch=1, mention="<@UPM>")
+    aggregator.add(_entry("ada"))
+    aggregator.shutdown(timeout=5)
+    aggregator.add(_entry("grace"))
+    aggregator.shutdown(timeout=5)
+
+    assert len(slack.posts) == 2 and slack.updates == []
+    assert all("<@UPM>" in json.dumps(post["blocks"]) for post in slack.posts)
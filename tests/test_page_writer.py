@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+from page_writer import CoalescingPageWriter
+
+
+class FakePages:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.requests = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def create(self, **request):
+        self.release.wait(5)
+        self.requests.append(request)
+        if self.fail:
+            raise RuntimeError("Notion is down")
+        return {"id": f"page-{len(self.requests)}", "url": "https://notion.so/page"}
+
+
+class FakeNotion:
+    def __init__(self, **options):
+        self.pages = FakePages(**options)
+
+
+@pytest.fixture
+def notion():
+    return FakeNotion()
+
+
+@pytest.fixture
+def writer(notion):
+    writer = CoalescingPageWriter(notion, window_seconds=0.05)
+    yield writer
+    writer.shutdown(timeout=5)
+
+
+def test_same_key_coalesces_into_one_page(writer, notion):
+    created = []
+    first = writer.submit(("task", "C1", "1.0"), on_created=created.append, parent={"database_id": "db"})
+    second = writer.submit(("task", "C1", "1.0"), on_created=created.append, parent={"database_id": "db"})
+    assert first is second
+    page = first.result(timeout=5)
+    assert len(notion.pages.requests) == 1
+    assert created == [page, page]
+    assert writer.stats()["coalesced"] == 1
+
+
+def test_pipelines_reacting_to_one_message_get_their_own_pages(writer, notion):
+    task = writer.submit(("task", "C1", "1.0"), parent={"database_id": "sales"})
+    request = writer.submit(("business_request", "C1", "1.0"), parent={"database_id": "requests"})
+    assert task.result(timeout=5)["id"] != request.result(timeout=5)["id"]
+    assert sorted(r["parent"]["database_id"] for r in notion.pages.requests) == ["requests", "sales"]
+
+
+def test_key_coalesces_while_in_flight(writer, notion):
+    notion.pages.release.clear()
+    first = writer.submit("k", parent={})
+    while not writer.stats()["in_flight"]:
+        threading.Event().wait(0.01)
+    assert writer.submit("k", parent={}) is first
+    notion.pages.release.set()
+    first.result(timeout=5)
+    assert len(notion.pages.requests) == 1
+
+
+def test_failure_runs_on_failed_and_frees_the_key():
+    notion = FakeNotion(fail=True)
+    writer = CoalescingPageWriter(notion, window_seconds=0.01)
+    errors = []
+    future = writer.submit("k", on_failed=errors.append, parent={})
+    with pytest.raises(RuntimeError):
+        future.result(timeout=5)
+    assert len(errors) == 1 and writer.stats()["failed"] == 1
+    # A later intent for the key is a new write
+    assert writer.submit("k", parent={}) is not future
+    writer.shutdown(timeout=5)
+
+
+def test_shutdown_writes_pending_intents_and_writer_restarts(notion):
+    writer = CoalescingPageWriter(notion, window_seconds=10)
+    future = writer.submit("k1", parent={})
+    assert writer.shutdown(timeout=5)
+    assert future.done()
+    # The next intent starts new writer threads
+    future = writer.submit("k2", parent={})
+    assert writer.shutdown(timeout=5)
+    assert future.result(timeout=0)["id"] == "page-2"
@@ -0,0 +1,59 @@
+import pytest
+
+import notion_slack_bot
+from fetch_engine import PostPipeline
+
+
+def test_pipeline_runs_jobs_in_order_passing_results():
+    pipeline = PostPipeline()
+    pipeline.submit(lambda previous: "parent")
+    pipeline.submit(lambda previous: f"{previous}>reply")
+    assert pipeline.close() == ["parent", "parent>reply"]
+
+
+def test_pipeline_stops_after_a_job_raises():
+    ran = []
+    pipeline = PostPipeline()
+    pipeline.submit(lambda previous: 1 / 0)
+    pipeline.submit(lambda previous: ran.append(previous))
+    with pytest.raises(ZeroDivisionError):
+        pipeline.close()
+    assert ran == []
+
+
+def _fake_poster(monkeypatch, fail_replies=()):
+    posted = []
+
+    def post_slack_message(blocks, channel_id=None, thread_ts=None):
+        posted.append((blocks, thread_ts))
+        if thread_ts is None:
+            return "100.1"
+        return None if blocks in fail_replies else f"ts-{blocks}"
+
+    monkeypatch.setattr(notion_slack_bot, "post_slack_message", post_slack_message)
+    return posted
+
+
+def test_replies_thread_under_the_parent(monkeypatch):
+    posted = _fake_poster(monkeypatch)
+    assert notion_slack_bot.post_threaded_messages(["a", "b", "c"], channel_id="C1") == "100.1"
+    assert posted == [("a", None), ("b", "100.1"), ("c", "100.1")]
+
+
+def test_failed_reply_does_not_stop_the_rest(monkeypatch, capsys):
+    posted = _fake_poster(monkeypatch, fail_replies=("b",))
+    assert notion_slack_bot.post_threaded_messages(["a", "b", "c"], channel_id="C1") == "100.1"
+    assert posted[-1] == ("c", "100.1")
+    assert "1 of 2 thread replies failed" in capsys.readouterr().out
+
+
+def test_no_replies_without_a_parent(monkeypatch):
+    posted = []
+
+    def post_slack_message(blocks, channel_id=None, thread_ts=None):
+        posted.append(blocks)
+        return None
+
+    monkeypatch.setattr(notion_slack_bot, "post_slack_message", post_slack_message)
+    assert notion_slack_bot.post_threaded_messages(["a", "b"]) is None
+    assert posted == ["a"]
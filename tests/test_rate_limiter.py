@@ -0,0 +1,131 @@
+import time
+from urllib.error import URLError
+
+import httpx
+import pytest
+import requests
+from notion_client.errors import RequestTimeoutError
+
+import rate_limiter
+from rate_limiter import RateLimitedError, RequestScheduler, TokenBucket, request_deadline
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(rate_limiter.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def _flaky(errors, result="ok"):
+    """fn raising each of errors in turn, then returning result"""
+    errors = list(errors)
+    calls = []
+
+    def fn():
+        calls.append(time.monotonic())
+        if errors:
+            raise errors.pop(0)
+        return result
+    return fn, calls
+
+
+def test_rate_limited_calls_are_retried_after_retry_after(no_sleep, monkeypatch):
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda low, high: low)
+    scheduler = RequestScheduler()
+    fn, calls = _flaky([RateLimitedError(retry_after="0")])
+    assert scheduler.call("notion", "GET pages", fn) == "ok"
+    assert len(calls) == 2 and no_sleep == [0]
+    assert scheduler.stats()["rate_limited"] == 1
+
+
+def test_retry_that_would_miss_the_deadline_fails_fast(no_sleep):
+    scheduler = RequestScheduler()
+    error = RateLimitedError(retry_after="10")
+    fn, calls = _flaky([error])
+    with request_deadline(2.5):
+        with pytest.raises(RateLimitedError) as raised:
+            scheduler.call("slack", "views.open", fn)
+    assert raised.value is error
+    assert len(calls) == 1 and no_sleep == []
+    assert scheduler.stats()["deadline_exceeded"] == 1
+
+
+def test_no_token_before_the_deadline_fails_fast():
+    scheduler = RequestScheduler()
+    bucket = scheduler.bucket("slack", "views.open")
+    bucket.block_for(30)
+    fn, calls = _flaky([])
+    started = time.monotonic()
+    with request_deadline(0.5):
+        with pytest.raises(RateLimitedError) as raised:
+            scheduler.call("slack", "views.open", fn)
+    assert time.monotonic() - started < 0.5
+    assert calls == [] and raised.value.retry_after > 20
+
+
+def test_deadline_only_applies_inside_the_block():
+    with request_deadline(1):
+        assert rate_limiter.current_deadline() is not None
+        with request_deadline(60):
+            # A nested deadline can't extend the outer one
+            assert rate_limiter.current_deadline() - time.monotonic() <= 1
+    assert rate_limiter.current_deadline() is None
+
+
+def test_bucket_acquire_gives_up_at_the_deadline():
+    bucket = TokenBucket(rate=1000, capacity=1)
+    assert bucket.acquire()
+    assert bucket.acquire(deadline=time.monotonic() + 1)
+    bucket.block_for(5)
+    assert not bucket.acquire(deadline=time.monotonic() + 0.1)
+
+
+def test_failed_connect_is_retried_for_writes(no_sleep):
+    scheduler = RequestScheduler()
+    request = httpx.Request("POST", "https://api.notion.com/v1/pages")
+    fn, calls = _flaky([httpx.ConnectError("refused", request=request)])
+    assert scheduler.call("notion", "POST pages", fn) == "ok"
+    assert len(calls) == 2 and len(no_sleep) == 1
+    assert scheduler.stats()["retries"] == 1
+
+
+@pytest.mark.parametrize("api,method,error", [
+    ("slack", "conversations.history", requests.ConnectionError("reset")),
+    ("slack", "users.info", requests.ReadTimeout("read timed out")),
+    ("slack", "auth.test", URLError(ConnectionResetError("reset"))),
+    ("notion", "POST databases/db/query", httpx.ReadTimeout("read timed out")),
+    ("notion", "GET pages/p", RequestTimeoutError()),
+])
+def test_dropped_reads_are_retried_with_backoff(no_sleep, api, method, error):
+    scheduler = RequestScheduler()
+    fn, calls = _flaky([error])
+    assert scheduler.call(api, method, fn) == "ok"
+    assert len(calls) == 2 and len(no_sleep) == 1
+    assert scheduler.stats()["rate_limited"] == 0
+
+
+@pytest.mark.parametrize("api,method,error", [
+    ("slack", "chat.postMessage", requests.ReadTimeout("read timed out")),
+    ("slack", "chat.update", URLError(ConnectionResetError("reset"))),
+    ("notion", "POST pages", httpx.ReadTimeout("read timed out")),
+    ("notion", "PATCH pages/p", RequestTimeoutError()),
+])
+def test_dropped_writes_are_not_retried(no_sleep, api, method, error):
+    scheduler = RequestScheduler()
+    fn, calls = _flaky([error])
+    with pytest.raises(type(error)):
+        scheduler.call(api, method, fn)
+    assert len(calls) == 1 and no_sleep == []
+
+
+def test_wrapped_connection_errors_are_recognised():
+    try:
+        try:
+            raise requests.ConnectTimeout("connect timed out")
+        except requests.ConnectTimeout as e:
+            raise RuntimeError("send failed") from e
+    except RuntimeError as e:
+        wrapped = e
+    assert rate_limiter._classify_error(wrapped) == (True, None)
+    assert rate_limiter._classify_error(RuntimeError("boom"), idempotent=True) == (False, None)
@@ -0,0 +1,97 @@
+import json
+from datetime import date, datetime, timezone
+
+import pytest
+
+from reminder_scheduler import CronExpression, RunLedger, load_jobs
+
+UTC = timezone.utc
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=UTC)
+
+
+def test_next_after_is_strictly_later():
+    cron = CronExpression("0 9 * * mon", "UTC")
+    # 2024-05-06 is a Monday
+    assert cron.next_after(_utc(2024, 5, 6, 8, 59)) == _utc(2024, 5, 6, 9, 0)
+    assert cron.next_after(_utc(2024, 5, 6, 9, 0)) == _utc(2024, 5, 13, 9, 0)
+
+
+def test_schedule_is_evaluated_in_the_job_timezone():
+    cron = CronExpression("0 9 * * *", "Asia/Taipei")
+    assert cron.next_after(_utc(2024, 5, 6, 0, 0)) == _utc(2024, 5, 6, 1, 0)
+
+
+def test_aliases_and_names():
+    assert CronExpression("@weekly", "UTC").next_after(_utc(2024, 5, 6)) == _utc(2024, 5, 12)
+    assert CronExpression("0 0 1 jan-mar *", "UTC").next_after(_utc(2024, 5, 6)) == _utc(2025, 1, 1)
+
+
+def test_step_in_the_day_field_counts_as_unrestricted():
+    # "*/2" days AND Monday, not OR: odd days of the month that are Mondays
+    cron = CronExpression("0 9 */2 * mon", "UTC")
+    assert cron.next_after(_utc(2024, 5, 1)) == _utc(2024, 5, 13, 9, 0)
+
+
+def test_restricted_day_fields_match_either():
+    cron = CronExpression("0 9 15 * mon", "UTC")
+    assert cron.next_after(_utc(2024, 5, 7)) == _utc(2024, 5, 13, 9, 0)
+    assert cron.next_after(_utc(2024, 5, 13, 9, 0)) == _utc(2024, 5, 15, 9, 0)
+
+
+def test_time_in_the_dst_gap_fires_just_after_the_transition():
+    cron = CronExpression("30 2 * * *", "America/New_York")
+    # 02:30 does not exist on 2024-03-10; it runs at 03:30 EDT. Times in a
+    # gap or fold never compare equal across zones, so compare in UTC
+    assert cron.next_after(_utc(2024, 3, 10, 5, 0)).astimezone(UTC) == _utc(2024, 3, 10, 7, 30)
+
+
+def test_repeated_time_at_dst_end_fires_once():
+    cron = CronExpression("30 1 * * *", "America/New_York")
+    first = cron.next_after(_utc(2024, 11, 3, 4, 0))
+    assert first.astimezone(UTC) == _utc(2024, 11, 3, 5, 30)
+    assert cron.next_after(first) == _utc(2024, 11, 4, 6, 30)
+
+
+@pytest.mark.parametrize("expression", ["0 9 * *", "60 9 * * *", "0 9 0 * *", "0 9 * * */0", "0 9 5-1 * *"])
+def test_invalid_expressions_are_rejected(expression):
+    with pytest.raises(ValueError):
+        CronExpression(expression, "UTC")
+
+
+def test_ledger_claims_each_run_once(tmp_path):
+    ledger = RunLedger(str(tmp_path / "scheduler.sqlite3"))
+    fire = _utc(2024, 5, 6, 9, 0)
+    assert ledger.claim("weekly_update", fire)
+    assert not ledger.claim("weekly_update", fire)
+    assert ledger.claim("last_call", fire)
+    assert ledger.last_scheduled("weekly_update") == fire
+
+
+def _write_schedule(tmp_path, jobs):
+    path = tmp_path / "schedule.json"
+    path.write_text(json.dumps({"timezone": "Asia/Taipei", "jobs": jobs}))
+    return str(path)
+
+
+def test_load_jobs_reads_the_schedule(tmp_path):
+    path = _write_schedule(tmp_path, [
+        {"name": "weekly_update", "cron": "0 9 * * mon", "options": {"teams": "teams.json"}},
+        {"name": "sprint", "command": "next_sprint", "cron": "0 10 * * fri", "timezone": "UTC"},
+    ])
+    weekly, sprint = load_jobs(path)
+    assert weekly.command == "weekly_update" and weekly.options == {"teams": "teams.json"}
+    assert str(weekly.cron.tz) == "Asia/Taipei" and str(sprint.cron.tz) == "UTC"
+    assert sprint.cron.next_after(_utc(2024, 5, 6)).date() == date(2024, 5, 10)
+
+
+@pytest.mark.parametrize("job", [
+    {"name": "x", "command": "nope", "cron": "0 9 * * *"},
+    {"name": "sprint", "command": "next_sprint", "cron": "0 9 * * *", "options": {"channel": "C1"}},
+    {"name": "weekly_update", "cron": "0 9 * * *", "options": {"full": True, "typo": 1}},
+])
+def test_load_jobs_rejects_unknown_commands_and_options(tmp_path, job):
+    with pytest.raises(ValueError):
+        load_jobs(_write_schedule(tmp_path, [job]))
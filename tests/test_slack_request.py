@@ -0,0 +1,89 @@
+import hashlib
+import hmac
+import json
+
+import pytest
+from flask import Flask, g
+
+from slack_request import MAX_REQUEST_AGE_SECONDS, SlackRequestVerifier, install, parse_body
+
+SECRET = "8f742231b10e8888abcd99yyyzzz85a5"
+NOW = 1_700_000_000
+
+
+def _sign(body, timestamp, secret=SECRET):
+    base = b"v0:" + str(timestamp).encode() + b":" + body
+    return "v0=" + hmac.new(secret.encode(), base, hashlib.sha256).hexdigest()
+
+
+@pytest.fixture
+def verifier():
+    return SlackRequestVerifier(SECRET, clock=lambda: NOW)
+
+
+def test_valid_signature_is_accepted(verifier):
+    body = b'{"type": "event_callback"}'
+    assert verifier.verify(body, str(NOW), _sign(body, NOW))
+    assert verifier.stats()["verified"] == 1
+
+
+@pytest.mark.parametrize("offset", [MAX_REQUEST_AGE_SECONDS, -MAX_REQUEST_AGE_SECONDS])
+def test_timestamps_at_the_edge_of_the_window_are_accepted(verifier, offset):
+    body = b"token=x"
+    assert verifier.verify(body, str(NOW + offset), _sign(body, NOW + offset))
+
+
+@pytest.mark.parametrize("offset", [MAX_REQUEST_AGE_SECONDS + 1, -MAX_REQUEST_AGE_SECONDS - 1])
+def test_timestamps_outside_the_window_are_rejected_before_hashing(verifier, offset):
+    body = b"token=x"
+    assert not verifier.verify(body, str(NOW + offset), _sign(body, NOW + offset))
+    assert verifier.stats() == {"verified": 0, "rejected_stale": 1, "rejected_signature": 0}
+
+
+@pytest.mark.parametrize("timestamp", [None, "", "yesterday"])
+def test_missing_or_malformed_timestamps_are_rejected(verifier, timestamp):
+    assert not verifier.verify(b"", timestamp, "v0=00")
+    assert verifier.stats()["rejected_stale"] == 1
+
+
+def test_wrong_signature_is_rejected(verifier):
+    body = b"token=x"
+    assert not verifier.verify(body, str(NOW), _sign(body, NOW, secret="other"))
+    assert not verifier.verify(body + b"&extra=1", str(NOW), _sign(body, NOW))
+    assert not verifier.verify(body, str(NOW), None)
+    assert verifier.stats()["rejected_signature"] == 3
+
+
+def test_parse_body_kinds():
+    assert parse_body(b'{"a": 1}', "application/json") == ("event", {"a": 1})
+    assert parse_body(b"command=%2Fcreate-notion-task&text=", "application/x-www-form-urlencoded") == (
+        "command", {"command": "/create-notion-task", "text": ""})
+    payload = {"type": "view_submission"}
+    body = ("payload=" + json.dumps(payload)).encode()
+    assert parse_body(body, "application/x-www-form-urlencoded") == ("interactive", payload)
+
+
+def test_install_guards_only_the_slack_paths(verifier):
+    app = Flask(__name__)
+    install(app, verifier, ["/slack/events"])
+
+    @app.route("/slack/events", methods=["POST"])
+    def events():
+        kind, data = g.slack_request
+        return {"kind": kind, "data": data}
+
+    @app.route("/health", methods=["POST"])
+    def health():
+        return "ok"
+
+    client = app.test_client()
+    body = b'{"type": "url_verification"}'
+    headers = {"Content-Type": "application/json", "X-Slack-Request-Timestamp": str(NOW)}
+
+    headers["X-Slack-Signature"] = "v0=bad"
+    assert client.post("/slack/events", data=body, headers=headers).status_code == 403
+
+    headers["X-Slack-Signature"] = _sign(body, NOW)
+    response = client.post("/slack/events", data=body, headers=headers)
+    assert response.json == {"kind": "event", "data": {"type": "url_verification"}}
+    assert client.post("/health").data == b"ok"
@@ -0,0 +1,126 @@
+import time
+
+import pytest
+
+from task_index import TaskTitleIndex
+from task_snapshot import SyncChanges, TaskSnapshot
+
+
+def _page(page_id, title, edited):
+    return {
+        "id": page_id,
+        "last_edited_time": edited,
+        "properties": {"Name": {"type": "title", "title": [{"plain_text": title}]}},
+    }
+
+
+class FakeSnapshot:
+    """Nothing new in Notion; the tests load the index through apply()"""
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def tasks(self):
+        return self.pages
+
+    def sync_changes(self, notion_client, full=False):
+        return SyncChanges(full=False, fetched=0)
+
+
+@pytest.fixture
+def index():
+    pages = [
+        _page("1", "Quarterly report", "2024-05-01T00:00:00.000Z"),
+        _page("2", "Report template", "2024-05-02T00:00:00.000Z"),
+        _page("3", "Sales report review", "2024-05-03T00:00:00.000Z"),
+        _page("4", "xab report", "2024-05-04T00:00:00.000Z"),
+        _page("5", "季度報告總結", "2024-05-05T00:00:00.000Z"),
+        _page("6", "Untitled", "2024-05-06T00:00:00.000Z"),
+    ]
+    index = TaskTitleIndex(FakeSnapshot(pages), notion_client=None, refresh_seconds=3600)
+    # Let the background refresher finish its first sync so it can't race the tests
+    index.start()
+    while not index.syncs:
+        time.sleep(0.01)
+    yield index
+    index.stop()
+
+
+def _ids(results):
+    return [page_id for page_id, _ in results]
+
+
+def test_title_start_then_word_start_then_other_matches(index):
+    # "Report template" starts with the query; the rest have a word starting
+    # with it, newest edit first
+    assert _ids(index.search("report")) == ["2", "4", "3", "1"]
+
+
+def test_mid_word_matches_rank_last(index):
+    assert _ids(index.search("port")) == ["4", "3", "2", "1"]
+
+
+def test_every_term_must_match(index):
+    assert _ids(index.search("report sales")) == ["3"]
+    assert index.search("report missing") == []
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("ab", ["4"]),         # mid-word, even though no word starts with "ab"
+    ("re", ["2", "4", "3", "1"]),
+    ("報告", ["5"]),        # two CJK characters mid-title
+    ("x", ["4"]),
+])
+def test_short_terms_match_anywhere_in_the_title(index, query, expected):
+    assert _ids(index.search(query)) == expected
+
+
+def test_matching_is_case_and_width_insensitive(index):
+    assert _ids(index.search("ＱＵＡＲＴＥＲＬＹ")) == ["1"]
+
+
+def test_empty_query_lists_newest_first_up_to_the_limit(index):
+    assert _ids(index.search("", limit=2)) == ["6", "5"]
+
+
+def test_incremental_changes_update_the_index(index):
+    index.apply(SyncChanges(full=False, fetched=1, pages=[_page("1", "Annual plan", "2024-05-07T00:00:00.000Z")],
+                            removed=["3"]))
+    assert _ids(index.search("report")) == ["2", "4"]
+    assert _ids(index.search("annual")) == ["1"]
+    assert index.title("1") == "Annual plan"
+
+
+class FakeNotion:
+    """Title-only database whose queries honour the last_edited_time filter"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.databases = self
+
+    def retrieve(self, database_id):
+        return {"properties": {"Name": {"id": "title", "type": "title"}}}
+
+    def query(self, database_id, filter=None, **query):
+        since = (filter or {}).get("last_edited_time", {}).get("on_or_after", "")
+        return {"results": [page for page in self.pages if page["last_edited_time"] >= since], "has_more": False}
+
+
+def test_workers_sharing_a_snapshot_each_see_new_titles(tmp_path):
+    notion = FakeNotion([_page("1", "Quarterly report", "2024-05-01T00:00:00.000Z")])
+
+    def worker_index():
+        snapshot = TaskSnapshot("shared-db", "titles", properties=["Name"], path=str(tmp_path / "tasks.sqlite3"))
+        return TaskTitleIndex(snapshot, notion, refresh_seconds=3600)
+
+    first, second = worker_index(), worker_index()
+    assert first.refresh() and second.refresh()
+
+    # The first worker's syncs move the shared watermark past task 2, so the
+    # second worker's own sync delta only has task 3
+    notion.pages.append(_page("2", "Launch plan", "2024-05-02T00:00:00.000Z"))
+    assert first.refresh()
+    notion.pages.append(_page("3", "Launch retro", "2024-05-03T00:00:00.000Z"))
+    assert first.refresh() and second.refresh()
+    for index in (first, second):
+        assert index.title("2") == "Launch plan" and index.title("3") == "Launch retro"
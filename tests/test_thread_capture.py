@@ -0,0 +1,196 @@
+import sqlite3
+
+import pytest
+
+import bot_identity
+import thread_capture
+from thread_capture import (
+    MAX_RICH_TEXT_ITEMS, MAX_RICH_TEXT_LENGTH, ThreadCapture, ThreadStore, is_thread_reply, rich_text,
+    split_text, text_blocks, ts_key,
+)
+
+
+def _utf16_length(text):
+    return len(text.encode("utf-16-le")) // 2
+
+
+def test_short_text_is_one_piece():
+    assert split_text("hello") == ["hello"]
+    assert split_text("") == []
+
+
+def test_pieces_stay_within_the_utf16_limit():
+    # Each emoji is two UTF-16 code units, so 1500 of them exceed 2000
+    text = "😀" * 1500
+    chunks = split_text(text)
+    assert "".join(chunks) == text
+    assert all(_utf16_length(chunk) <= MAX_RICH_TEXT_LENGTH for chunk in chunks)
+    assert len(chunks) == 2
+
+
+def test_split_never_breaks_a_surrogate_pair():
+    text = "a" + "😀" * 10
+    chunks = split_text(text, limit=4)
+    assert all(_utf16_length(chunk) <= 4 for chunk in chunks)
+    assert "".join(chunks) == text
+
+
+def test_split_prefers_whitespace():
+    text = ("word " * 500).strip()
+    chunks = split_text(text)
+    assert all(chunk.endswith(" ") for chunk in chunks[:-1])
+    assert "".join(chunks) == text
+
+
+def test_rich_text_and_blocks_respect_notion_limits():
+    items = rich_text("x" * (MAX_RICH_TEXT_LENGTH * 150), bold=True)
+    assert len(items) == 150 and items[0]["annotations"] == {"bold": True}
+    blocks = text_blocks("quote", items)
+    assert [len(block["quote"]["rich_text"]) for block in blocks] == [MAX_RICH_TEXT_ITEMS, 50]
+    assert text_blocks("paragraph", [])[0]["paragraph"]["rich_text"][0]["text"]["content"] == ""
+
+
+def test_ts_key_orders_without_float_rounding():
+    assert ts_key("1700000000.000100") < ts_key("1700000000.0002") < ts_key("1700000001")
+
+
+def test_is_thread_reply():
+    assert is_thread_reply({"ts": "2.0", "thread_ts": "1.0"})
+    assert not is_thread_reply({"ts": "1.0", "thread_ts": "1.0"})
+    assert not is_thread_reply({"ts": "2.0", "thread_ts": "1.0", "subtype": "message_changed"})
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ThreadStore(str(tmp_path / "threads.sqlite3"), lease_seconds=300)
+
+
+def test_lease_is_exclusive_and_marks_the_page_dirty(store):
+    store.track("p1", "C1", "1.0")
+    assert store.claim("p1") == ("C1", "1.0", "0", None)
+    # A second worker is turned away, and the holder is told to go again
+    assert store.claim("p1") is None
+    store.checkpoint("p1", "3.0")
+    assert store.release("p1") is True
+    assert store.claim("p1") == ("C1", "1.0", "3.0", None)
+    assert store.release("p1") is False
+
+
+def test_expired_lease_can_be_taken_over(tmp_path):
+    store = ThreadStore(str(tmp_path / "threads.sqlite3"), lease_seconds=-1)
+    store.track("p1", "C1", "1.0")
+    assert store.claim("p1") is not None
+    assert store.claim("p1") is not None
+
+
+def test_untracked_pages_cannot_be_claimed(store):
+    assert store.claim("missing") is None
+
+
+def test_store_is_shared_between_instances(store):
+    store.track("p1", "C1", "1.0")
+    store.track("p2", "C1", "1.0")
+    other = ThreadStore(store.path)
+    assert sorted(other.pages("C1", "1.0")) == ["p1", "p2"]
+    assert other.size() == 2
+
+
+class FakeSlack:
+    def __init__(self, messages):
+        self.messages = messages
+
+    def conversations_replies(self, channel, ts, limit, oldest=None, cursor=None):
+        return {"messages": [m for m in self.messages if not oldest or ts_key(m["ts"]) >= ts_key(oldest)]}
+
+
+class FakeNotion:
+    def __init__(self):
+        self.appended = []
+        self.blocks = self
+        self.children = self
+
+    def append(self, block_id, children):
+        self.appended.append((block_id, children))
+
+
+@pytest.fixture
+def thread():
+    return [
+        {"ts": "1.0", "user": "U1", "text": "root"},
+        {"ts": "2.0", "user": "U2", "text": "first reply"},
+        {"ts": "3.0", "user": "BOT", "text": "bot reply"},
+        {"ts": "4.0", "user": "U3", "text": "second reply"},
+    ]
+
+
+@pytest.fixture
+def capture(store, thread, monkeypatch):
+    monkeypatch.setattr(bot_identity, "get_bot_user_id", lambda client: "BOT")
+    return ThreadCapture(FakeSlack(thread), FakeNotion(), store)
+
+
+def _appended_texts(capture):
+    return [block["paragraph"]["rich_text"][-1]["text"]["content"]
+            for _, children in capture.notion_client.appended for block in children]
+
+
+def test_capture_skips_the_quoted_root_and_bot_messages(capture, thread):
+    assert capture.capture("p1", "C1", "1.0", list(thread), skip_ts="1.0") == 2
+    assert _appended_texts(capture) == ["first reply", "second reply"]
+    # The root stays skipped on later syncs
+    thread.append({"ts": "5.0", "user": "U1", "text": "third reply"})
+    assert capture.sync_thread("C1", "1.0") == 1
+    assert _appended_texts(capture)[-1] == "third reply"
+
+
+def test_capture_skips_a_quoted_reply_but_keeps_the_root(capture, thread):
+    assert capture.capture("p1", "C1", "1.0", list(thread), skip_ts="2.0") == 2
+    assert _appended_texts(capture) == ["root", "second reply"]
+
+
+def test_quoted_latest_reply_stays_skipped_after_a_new_reply(capture, thread):
+    # The reaction is on the newest reply, so the checkpoint stays behind it
+    assert capture.capture("p1", "C1", "1.0", list(thread), skip_ts="4.0") == 2
+    thread.append({"ts": "5.0", "user": "U1", "text": "new reply"})
+    assert capture.sync_thread("C1", "1.0") == 1
+    assert _appended_texts(capture) == ["root", "first reply", "new reply"]
+
+
+def test_tracked_only_page_skips_the_quoted_reply_on_its_first_sync(capture, thread):
+    # The queue-full fallback only tracks the page; the next reply syncs it
+    capture.track("p1", "C1", "1.0", skip_ts="2.0")
+    assert capture.sync_thread("C1", "1.0") == 2
+    assert _appended_texts(capture) == ["root", "second reply"]
+
+
+def test_stores_without_skip_ts_are_migrated(tmp_path):
+    path = str(tmp_path / "threads.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE threads (page_id TEXT PRIMARY KEY, channel_id TEXT NOT NULL, thread_ts TEXT NOT NULL,"
+        " last_ts TEXT NOT NULL, lease_until REAL NOT NULL DEFAULT 0, dirty INTEGER NOT NULL DEFAULT 0,"
+        " updated_at REAL NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO threads (page_id, channel_id, thread_ts, last_ts, updated_at) VALUES ('p1', 'C1', '1.0', '2.0', 0)"
+    )
+    conn.commit()
+    conn.close()
+    assert ThreadStore(path).claim("p1") == ("C1", "1.0", "2.0", None)
+
+
+def test_busy_page_is_left_to_the_lease_holder(capture, store):
+    store.track("p1", "C1", "1.0")
+    store.claim("p1")
+    assert capture.sync_page("p1") == 0
+    assert capture.stats()["busy"] == 1
+    # The holder sees the page went dirty and makes another pass
+    assert store.release("p1") is True
+    assert capture.sync_page("p1") == 3
+
+
+def test_large_threads_are_appended_in_batches(capture, thread, monkeypatch):
+    monkeypatch.setattr(thread_capture, "MAX_BLOCKS_PER_REQUEST", 1)
+    assert capture.capture("p1", "C1", "1.0", list(thread)) == 3
+    assert len(capture.notion_client.appended) == 3
+    assert capture.store.claim("p1")[2] == "4.0"
@@ -0,0 +1,86 @@
+import json
+
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web import SlackResponse
+
+from user_directory import SlackUserDirectory
+
+
+def _member(user_id, email):
+    return {"id": user_id, "name": user_id.lower(), "profile": {"email": email}}
+
+
+class FakeSlack:
+    token = "xoxb-test"
+
+    def __init__(self, pages, fail_on_page=None):
+        self.pages = pages
+        self.fail_on_page = fail_on_page
+        self.lookups = []
+
+    def users_list(self, limit, cursor=None):
+        page = int(cursor or 0)
+        if page == self.fail_on_page:
+            response = SlackResponse(client=self, http_verb="GET", api_url="users.list", req_args={},
+                                     data={"ok": False, "error": "ratelimited"}, headers={}, status_code=429)
+            raise SlackApiError("ratelimited", response)
+        next_cursor = str(page + 1) if page + 1 < len(self.pages) else ""
+        return {"members": self.pages[page], "response_metadata": {"next_cursor": next_cursor}}
+
+    def users_lookupByEmail(self, email):
+        self.lookups.append(email)
+        return {"ok": True, "user": _member("UNEW", email)}
+
+
+def test_expired_user_leaves_the_email_index(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("user_directory.time.time", lambda: clock[0])
+    directory = SlackUserDirectory(FakeSlack([[_member("U1", "Ada@example.com")]]), ttl_seconds=60)
+    directory.warm_up()
+    assert directory.lookup_by_email("ada@example.com")["id"] == "U1"
+
+    clock[0] += 61
+    with directory._lock:
+        assert directory._cached("U1", clock[0]) is None
+    assert directory._users == {} and directory._email_index == {}
+
+
+def test_evicted_email_is_not_served(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("user_directory.time.time", lambda: clock[0])
+    slack = FakeSlack([[_member("U1", "ada@example.com")]])
+    directory = SlackUserDirectory(slack, ttl_seconds=60)
+    directory.warm_up()
+
+    clock[0] += 61
+    assert directory.lookup_by_email("ada@example.com")["id"] == "UNEW"
+    assert slack.lookups == ["ada@example.com"]
+    assert directory._email_index == {"ada@example.com": "UNEW"}
+
+
+def test_lru_eviction_and_email_change_update_the_index():
+    directory = SlackUserDirectory(FakeSlack([[
+        _member("U1", "ada@example.com"),
+        _member("U2", "grace@example.com"),
+        _member("U3", "alan@example.com"),
+    ]]), max_entries=2)
+    directory.warm_up()
+    assert set(directory._email_index) == {"grace@example.com", "alan@example.com"}
+
+    with directory._lock:
+        directory._store({"id": "U2", "email": "grace@new.example.com"}, 0)
+    assert directory._email_index == {"alan@example.com": "U3", "grace@new.example.com": "U2"}
+
+
+def test_partial_warm_up_is_not_saved(tmp_path):
+    path = str(tmp_path / "users.json")
+    pages = [[_member("U1", "ada@example.com")], [_member("U2", "grace@example.com")]]
+    directory = SlackUserDirectory(FakeSlack(pages, fail_on_page=1), snapshot_path=path)
+    assert directory.warm_up() == 1
+    assert not (tmp_path / "users.json").exists()
+
+    # The next start pages users.list again and saves the full directory
+    directory = SlackUserDirectory(FakeSlack(pages), snapshot_path=path)
+    assert directory.warm_up() == 2
+    with open(path, encoding="utf-8") as f:
+        assert [user["id"] for user in json.load(f)["users"]] == ["U1", "U2"]
@@ -0,0 +1,380 @@
+"""
+Slack thread capture for Notion pages
+Copies a whole Slack thread onto a Notion page and keeps it current as
+replies arrive, within Notion's request limits:
+
+- the thread is read with paginated conversations.replies, from its root
+  even when the reaction was on a reply
+- text is split into rich_text pieces of at most 2000 characters (100 per
+  block), breaking at a newline or space where possible
+- blocks are appended in batches of at most 100, oldest message first; the
+  last appended message is checkpointed after every batch
+- new replies are appended incrementally: a SQLite lease lets only one
+  worker append to a page at a time, and a reply that arrives mid-append
+  marks the page dirty so the lease holder goes round again
+
+The bot's own messages (e.g. the "we received your message" reply) are
+left out of the captured thread.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import bot_identity
+
+MAX_RICH_TEXT_LENGTH = 2000   # Notion's limit per rich_text object
+MAX_RICH_TEXT_ITEMS = 100     # Notion's limit per rich_text array
+MAX_BLOCKS_PER_REQUEST = 100  # Notion's limit per pages.create / blocks.children.append
+REPLIES_PAGE_SIZE = 200       # conversations.replies maximum that Slack recommends
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_DB_PATH = "threads.sqlite3"
+
+# Message subtypes that are new posts in a thread (edits and deletions are not)
+REPLY_SUBTYPES = {None, "thread_broadcast", "file_share"}
+
+
+def ts_key(ts):
+    """Sortable key for a Slack ts ("1700000000.000100"), without float rounding"""
+    seconds, _, fraction = (ts or "0").partition(".")
+    return int(seconds), int(fraction.ljust(6, "0") or 0)
+
+
+def is_thread_reply(event):
+    """True for a message event that posts a new reply into a thread"""
+    thread_ts = event.get("thread_ts")
+    return bool(thread_ts) and thread_ts != event.get("ts") and event.get("subtype") in REPLY_SUBTYPES
+
+
+def _notion_length(text):
+    # Notion counts UTF-16 code units, so an emoji counts twice
+    return len(text.encode("utf-16-le")) // 2
+
+
+def split_text(text, limit=MAX_RICH_TEXT_LENGTH):
+    """Split text into pieces Notion accepts, preferring to break after a newline or space"""
+    chunks = []
+    while _notion_length(text) > limit:
+        cut = limit
+        while _notion_length(text[:cut]) > limit:
+            cut -= (_notion_length(text[:cut]) - limit + 1) // 2 or 1
+        # Break at whitespace unless that would leave a tiny piece
+        for separator in ("\n", " "):
+            index = text.rfind(separator, 0, cut)
+            if index >= cut // 2:
+                cut = index + 1
+                break
+        chunks.append(text[:cut])
+        text = text[cut:]
+    if text:
+        chunks.append(text)
+    return chunks
+
+
+def rich_text(text, **annotations):
+    """Notion rich_text objects for the text, each within the length limit"""
+    items = []
+    for chunk in split_text(text):
+        item = {"type": "text", "text": {"content": chunk}}
+        if annotations:
+            item["annotations"] = annotations
+        items.append(item)
+    return items
+
+
+def text_blocks(block_type, items):
+    """Blocks of the type holding the rich_text items, at most 100 per block"""
+    items = items or [{"type": "text", "text": {"content": ""}}]
+    return [
+        {
+            "object": "block",
+            "type": block_type,
+            block_type: {"rich_text": items[start:start + MAX_RICH_TEXT_ITEMS]},
+        }
+        for start in range(0, len(items), MAX_RICH_TEXT_ITEMS)
+    ]
+
+
+class ThreadStore:
+    """
+    SQLite record of which Slack thread each Notion page captures and how far
+    it has been appended; safe to share between gunicorn workers.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS threads ("
+            " page_id TEXT PRIMARY KEY,"
+            " channel_id TEXT NOT NULL,"
+            " thread_ts TEXT NOT NULL,"
+            " last_ts TEXT NOT NULL,"
+            " lease_until REAL NOT NULL DEFAULT 0,"
+            " dirty INTEGER NOT NULL DEFAULT 0,"
+            " updated_at REAL NOT NULL,"
+            " skip_ts TEXT)"
+        )
+        # Stores created before skip_ts existed
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(threads)")}
+        if "skip_ts" not in columns:
+            conn.execute("ALTER TABLE threads ADD COLUMN skip_ts TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS threads_thread ON threads (channel_id, thread_ts)")
+
+    def after_fork(self):
+        # SQLite connections must not be used across fork(): reconnect lazily
+        self._local = threading.local()
+
+    def _connection(self):
+        """One connection per thread (sqlite3 connections are not thread-safe)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def track(self, page_id, channel_id, thread_ts, last_ts="0", skip_ts=None):
+        """Record a page capturing the thread; skip_ts is a message never to append to it"""
+        self._connection().execute(
+            "INSERT OR IGNORE INTO threads (page_id, channel_id, thread_ts, last_ts, updated_at, skip_ts)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (page_id, channel_id, thread_ts, last_ts, time.time(), skip_ts)
+        )
+
+    def pages(self, channel_id, thread_ts):
+        """IDs of the pages capturing the thread"""
+        rows = self._connection().execute(
+            "SELECT page_id FROM threads WHERE channel_id = ? AND thread_ts = ?", (channel_id, thread_ts)
+        )
+        return [row[0] for row in rows]
+
+    def claim(self, page_id):
+        """
+        Take the page's append lease; returns (channel_id, thread_ts, last_ts,
+        skip_ts), or None if another worker holds it (which is then told to go again).
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT channel_id, thread_ts, last_ts, skip_ts, lease_until FROM threads WHERE page_id = ?",
+                (page_id,)
+            ).fetchone()
+            if row is None:
+                claimed = None
+            elif row[4] > now:
+                conn.execute("UPDATE threads SET dirty = 1 WHERE page_id = ?", (page_id,))
+                claimed = None
+            else:
+                conn.execute(
+                    "UPDATE threads SET lease_until = ?, dirty = 0 WHERE page_id = ?",
+                    (now + self.lease_seconds, page_id)
+                )
+                claimed = row[:4]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return claimed
+
+    def checkpoint(self, page_id, last_ts):
+        """Record the last message appended to the page"""
+        self._connection().execute(
+            "UPDATE threads SET last_ts = ?, updated_at = ? WHERE page_id = ?", (last_ts, time.time(), page_id)
+        )
+
+    def release(self, page_id):
+        """Give the lease back; returns True if replies arrived while it was held"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT dirty FROM threads WHERE page_id = ?", (page_id,)).fetchone()
+            conn.execute("UPDATE threads SET lease_until = 0, dirty = 0 WHERE page_id = ?", (page_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return bool(row and row[0])
+
+    def size(self):
+        return self._connection().execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+
+
+class ThreadCapture:
+    """Fetches Slack threads and appends them to the Notion pages that capture them"""
+
+    def __init__(self, slack_client, notion_client, store, display_name=None):
+        self.slack_client = slack_client
+        self.notion_client = notion_client
+        self.store = store
+        self.display_name = display_name or (lambda user_id, default=None: default)
+        self._counter_lock = threading.Lock()
+        self.fetches = 0
+        self.appends = 0
+        self.appended_messages = 0
+        self.busy = 0
+        self.errors = 0
+
+    def _count(self, name, amount=1):
+        with self._counter_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    # --- Slack ---
+
+    def _replies(self, channel_id, thread_ts, oldest=None):
+        """Every message of the thread, oldest first (the root is always included)"""
+        messages = []
+        cursor = None
+        while True:
+            kwargs = {"channel": channel_id, "ts": thread_ts, "limit": REPLIES_PAGE_SIZE}
+            if oldest:
+                kwargs["oldest"] = oldest
+            if cursor:
+                kwargs["cursor"] = cursor
+            response = self.slack_client.conversations_replies(**kwargs)
+            self._count("fetches")
+            messages.extend(response.get("messages") or [])
+            cursor = (response.get("response_metadata") or {}).get("next_cursor")
+            if not response.get("has_more") or not cursor:
+                break
+        return messages
+
+    def fetch(self, channel_id, message_ts):
+        """
+        (thread messages, reacted message) for the message at message_ts, which
+        may be a thread root, a reply or an unthreaded message. The reacted
+        message is None if Slack does not return it.
+        """
+        messages = self._replies(channel_id, message_ts)
+        message = next((m for m in messages if m.get("ts") == message_ts), None)
+        thread_ts = (message or {}).get("thread_ts")
+        if thread_ts and messages[0].get("ts") != thread_ts:
+            # Slack answered for the reply alone; read the thread from its root
+            messages = self._replies(channel_id, thread_ts)
+        messages.sort(key=lambda m: ts_key(m.get("ts")))
+        return messages, message
+
+    def _is_own(self, message):
+        bot_user_id = bot_identity.get_bot_user_id(self.slack_client)
+        return bool(bot_user_id) and message.get("user") == bot_user_id
+
+    # --- Notion ---
+
+    def message_blocks(self, message):
+        """Blocks for one message: author and time in bold/grey, then its text"""
+        user_id = message.get("user")
+        author = self.display_name(user_id, default=user_id) if user_id else message.get("username") or "Unknown"
+        posted_at = datetime.fromtimestamp(ts_key(message.get("ts"))[0]).strftime("%Y-%m-%d %H:%M")
+        text = message.get("text") or ""
+        files = [f.get("name") or f.get("title") or "file" for f in message.get("files") or []]
+        if files:
+            text = f"{text}\n📎 {', '.join(files)}" if text else f"📎 {', '.join(files)}"
+
+        items = rich_text(author, bold=True) + rich_text(f"  {posted_at}\n", color="gray") + rich_text(text)
+        return text_blocks("paragraph", items)
+
+    def _append_messages(self, page_id, messages):
+        """
+        Append the messages to the page in batches of at most 100 blocks,
+        checkpointing after each batch so a failure resumes where it stopped.
+        A message's blocks are never split across batches.
+        """
+        batch, batch_last_ts = [], None
+        for message in messages:
+            blocks = self.message_blocks(message)
+            if batch and len(batch) + len(blocks) > MAX_BLOCKS_PER_REQUEST:
+                self._append(page_id, batch, batch_last_ts)
+                batch = []
+            batch.extend(blocks)
+            batch_last_ts = message["ts"]
+        if batch:
+            self._append(page_id, batch, batch_last_ts)
+
+    def _append(self, page_id, blocks, last_ts):
+        # A single message can't outgrow one request (Slack caps messages at 40k characters)
+        for start in range(0, len(blocks), MAX_BLOCKS_PER_REQUEST):
+            self.notion_client.blocks.children.append(
+                block_id=page_id, children=blocks[start:start + MAX_BLOCKS_PER_REQUEST]
+            )
+            self._count("appends")
+        self.store.checkpoint(page_id, last_ts)
+
+    # --- sync ---
+
+    def sync_page(self, page_id, messages=None):
+        """
+        Append the thread's messages the page doesn't have yet (never its
+        skip_ts message). messages, if given, is an already fetched thread to
+        use for the first pass. Returns the number of messages appended.
+        """
+        appended = 0
+        while True:
+            claimed = self.store.claim(page_id)
+            if claimed is None:
+                self._count("busy")
+                return appended
+            channel_id, thread_ts, last_ts, skip_ts = claimed
+            try:
+                if messages is None:
+                    messages = self._replies(channel_id, thread_ts, oldest=None if last_ts == "0" else last_ts)
+                new = [m for m in messages
+                       if ts_key(m.get("ts")) > ts_key(last_ts) and m.get("ts") != skip_ts and not self._is_own(m)]
+                new.sort(key=lambda m: ts_key(m.get("ts")))
+                self._append_messages(page_id, new)
+                appended += len(new)
+                self._count("appended_messages", len(new))
+            except Exception as e:
+                self._count("errors")
+                print(f"Error syncing Slack thread {thread_ts} to Notion page {page_id}: {e}")
+                self.store.release(page_id)
+                return appended
+            messages = None
+            if not self.store.release(page_id):
+                return appended
+
+    def track(self, page_id, channel_id, thread_ts, skip_ts=None):
+        """
+        Start tracking the thread on a new page. skip_ts (e.g. the reacted
+        message, already quoted on the page) is left out of every sync.
+        """
+        self.store.track(page_id, channel_id, thread_ts, skip_ts=skip_ts)
+
+    def capture(self, page_id, channel_id, thread_ts, messages=None, skip_ts=None):
+        """
+        Start tracking the thread on a new page and append what it has so far.
+        skip_ts is the message the page already quotes (e.g. the reacted one).
+        """
+        self.track(page_id, channel_id, thread_ts, skip_ts)
+        appended = self.sync_page(page_id, messages)
+        print(f"🧵 Captured {appended} thread message(s) on Notion page {page_id}")
+        return appended
+
+    def sync_thread(self, channel_id, thread_ts):
+        """Append new replies to every page capturing the thread"""
+        return sum(self.sync_page(page_id) for page_id in self.store.pages(channel_id, thread_ts))
+
+    def stats(self):
+        with self._counter_lock:
+            counters = {
+                "fetches": self.fetches,
+                "appends": self.appends,
+                "appended_messages": self.appended_messages,
+                "busy": self.busy,
+                "errors": self.errors,
+            }
+        counters["tracked_pages"] = self.store.size()
+        return counters
+
+
+def create_thread_store():
+    """Thread store at THREAD_CAPTURE_DB_PATH"""
+    return ThreadStore(
+        path=os.getenv("THREAD_CAPTURE_DB_PATH", DEFAULT_DB_PATH),
+        lease_seconds=int(os.getenv("THREAD_CAPTURE_LEASE_SECONDS", DEFAULT_LEASE_SECONDS)),
+    )
@@ -0,0 +1,298 @@
+"""
+Shared Slack user directory cache
+One place to resolve Slack user profiles, instead of every handler calling
+users.info for the same person.
+
+- TTL + LRU eviction of cached profiles
+- Optional JSON snapshot on disk so restarts start warm
+- Bulk warm-up by paging users.list once
+- Request coalescing: concurrent lookups of the same user issue one API call
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from slack_sdk.errors import SlackApiError
+
+DEFAULT_TTL_SECONDS = 6 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+USERS_LIST_PAGE_SIZE = 200
+
+
+def _compact_user(user):
+    """Keep only the profile fields the bot actually uses"""
+    profile = user.get("profile") or {}
+    return {
+        "id": user.get("id"),
+        "name": user.get("name"),
+        "real_name": user.get("real_name") or profile.get("real_name"),
+        "display_name": profile.get("display_name"),
+        "email": profile.get("email"),
+        "is_bot": user.get("is_bot", False),
+        "deleted": user.get("deleted", False),
+    }
+
+
+class _InFlight:
+    """A lookup in progress that other threads can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class SlackUserDirectory:
+    """TTL/LRU cache of Slack user profiles backed by users.info and users.list"""
+
+    def __init__(self, client, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_entries=DEFAULT_MAX_ENTRIES, snapshot_path=None):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.snapshot_path = snapshot_path
+        self._users = OrderedDict()  # user_id -> (expires_at, compact user), LRU order
+        self._email_index = {}       # lower-cased email -> user_id
+        self._inflight = {}          # lookup key -> _InFlight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.api_calls = 0
+        self.coalesced = 0
+
+    # --- cache internals ---
+
+    def _store(self, user, now):
+        """Insert a compact user into the cache (caller holds the lock)"""
+        user_id = user["id"]
+        if user_id in self._users:
+            self._drop(user_id)  # the email may have changed
+        self._users[user_id] = (now + self.ttl_seconds, user)
+        if user.get("email"):
+            self._email_index[user["email"].lower()] = user_id
+        while len(self._users) > self.max_entries:
+            self._drop(next(iter(self._users)))
+
+    def _drop(self, user_id):
+        """Remove a cached user and its email index entry (caller holds the lock)"""
+        _, user = self._users.pop(user_id)
+        email = (user.get("email") or "").lower()
+        if email and self._email_index.get(email) == user_id:
+            del self._email_index[email]
+
+    def _cached(self, user_id, now):
+        """Return a fresh cached user or None (caller holds the lock)"""
+        entry = self._users.get(user_id)
+        if not entry:
+            return None
+        expires_at, user = entry
+        if expires_at <= now:
+            self._drop(user_id)
+            return None
+        self._users.move_to_end(user_id)
+        return user
+
+    def _coalesced_fetch(self, key, fetch):
+        """
+        Run fetch() for the key, unless another thread is already fetching it,
+        in which case wait for that result instead.
+        """
+        with self._lock:
+            inflight = self._inflight.get(key)
+            if inflight:
+                self.coalesced += 1
+                leader = False
+            else:
+                inflight = _InFlight()
+                self._inflight[key] = inflight
+                self.api_calls += 1
+                leader = True
+
+        if not leader:
+            inflight.done.wait()
+            return inflight.result
+
+        try:
+            inflight.result = fetch()
+            if inflight.result:
+                with self._lock:
+                    self._store(inflight.result, time.time())
+            return inflight.result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.done.set()
+
+    # --- lookups ---
+
+    def get_user(self, user_id):
+        """Compact profile for a Slack user ID, or None if it cannot be resolved"""
+        if not user_id:
+            return None
+        with self._lock:
+            user = self._cached(user_id, time.time())
+            if user:
+                self.hits += 1
+                return user
+            self.misses += 1
+
+        def fetch():
+            try:
+                response = self.client.users_info(user=user_id)
+                if response["ok"] and response.get("user"):
+                    return _compact_user(response["user"])
+            except SlackApiError as e:
+                print(f"Slack API error fetching user info for {user_id}: {e.response['error']}")
+            except Exception as e:
+                print(f"Error fetching user info for {user_id}: {e}")
+            return None
+
+        return self._coalesced_fetch(f"id:{user_id}", fetch)
+
+    def lookup_by_email(self, email):
+        """Compact profile for an email address, or None if no Slack user has it"""
+        if not email:
+            return None
+        email_key = email.lower()
+        with self._lock:
+            user_id = self._email_index.get(email_key)
+            user = self._cached(user_id, time.time()) if user_id else None
+            if user:
+                self.hits += 1
+                return user
+            self.misses += 1
+
+        def fetch():
+            try:
+                response = self.client.users_lookupByEmail(email=email)
+                if response["ok"] and response.get("user"):
+                    return _compact_user(response["user"])
+            except SlackApiError as e:
+                print(f"Slack API error looking up user by email '{email}': {e.response['error']}")
+            except Exception as e:
+                print(f"Error looking up Slack user by email '{email}': {e}")
+            return None
+
+        return self._coalesced_fetch(f"email:{email_key}", fetch)
+
+    def display_name(self, user_id, default=None):
+        """Real name, then display name, then username; default if unknown"""
+        user = self.get_user(user_id)
+        if not user:
+            return default
+        return user.get("real_name") or user.get("display_name") or user.get("name") or default
+
+    # --- warm-up and snapshots ---
+
+    def warm_up(self, max_snapshot_age=None):
+        """
+        Fill the cache at startup: from the on-disk snapshot if it is recent
+        enough, otherwise by paging users.list once. The snapshot is only
+        written after a complete pass, so a warm-up that fails part-way is
+        retried on the next start instead of being loaded as the directory.
+        """
+        max_snapshot_age = self.ttl_seconds if max_snapshot_age is None else max_snapshot_age
+        if self.load_snapshot(max_age=max_snapshot_age):
+            return len(self._users)
+
+        now = time.time()
+        loaded = 0
+        cursor = None
+        complete = False
+        try:
+            while True:
+                with self._lock:
+                    self.api_calls += 1
+                response = self.client.users_list(limit=USERS_LIST_PAGE_SIZE, cursor=cursor)
+                with self._lock:
+                    for member in response.get("members", []):
+                        if member.get("deleted"):
+                            continue
+                        self._store(_compact_user(member), now)
+                        loaded += 1
+                cursor = (response.get("response_metadata") or {}).get("next_cursor")
+                if not cursor:
+                    complete = True
+                    break
+        except SlackApiError as e:
+            print(f"Slack API error warming user directory: {e.response['error']}")
+        except Exception as e:
+            print(f"Error warming user directory: {e}")
+
+        print(f"👥 User directory warmed with {loaded} users from users.list")
+        if complete:
+            self.save_snapshot()
+        return loaded
+
+    def load_snapshot(self, max_age=None):
+        """Load cached users from the snapshot file; returns True if anything was loaded"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read user directory snapshot: {e}")
+            return False
+
+        saved_at = snapshot.get("saved_at", 0)
+        now = time.time()
+        if max_age is not None and now - saved_at > max_age:
+            return False
+
+        with self._lock:
+            for user in snapshot.get("users", []):
+                # Snapshot entries expire relative to when they were saved
+                self._store(user, saved_at)
+        print(f"👥 User directory loaded {len(snapshot.get('users', []))} users from snapshot")
+        return bool(snapshot.get("users"))
+
+    def save_snapshot(self):
+        """Write the cached users to the snapshot file (no-op without a path)"""
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            users = [user for _, user in self._users.values()]
+        tmp_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"saved_at": time.time(), "users": users}, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"Warning: Could not write user directory snapshot: {e}")
+
+    def stats(self):
+        """Cache size and hit/miss/API call counters"""
+        with self._lock:
+            return {
+                "size": len(self._users),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "api_calls": self.api_calls,
+                "coalesced": self.coalesced,
+            }
+
+
+_directories = {}  # bot token -> SlackUserDirectory
+_directories_lock = threading.Lock()
+
+
+def get_user_directory(client):
+    """
+    Shared directory for the client's bot token, configured from the
+    USER_CACHE_* environment variables.
+    """
+    with _directories_lock:
+        directory = _directories.get(client.token)
+        if directory is None:
+            directory = SlackUserDirectory(
+                client,
+                ttl_seconds=int(os.getenv("USER_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+                max_entries=int(os.getenv("USER_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+                snapshot_path=os.getenv("USER_CACHE_SNAPSHOT_PATH") or None,
+            )
+            _directories[client.token] = directory
+        return directory
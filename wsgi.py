@@ -0,0 +1,40 @@
+"""
+WSGI entry point for production serving (every handler registered on the
+event router, including create-notion-task):
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py calls start_worker() in each worker after the fork and
+drain() when the worker exits.
+"""
+import time
+
+import bot_identity
+from slack_message_handler import (
+    app, dedupe_store, handler_modules, page_writer, pm_notifications, reaction_queue, slack_client,
+    thread_store, user_directory,
+)
+
+
+def start_worker():
+    """Per-worker startup: fresh SQLite handles, worker threads and warm caches"""
+    dedupe_store.after_fork()
+    thread_store.after_fork()
+    # Threads started in the master do not survive the fork
+    reaction_queue.start()
+    bot_identity.warm_up(slack_client)
+    user_directory.warm_up()
+    for module in handler_modules:
+        if hasattr(module, 'warm_up'):
+            module.warm_up()
+
+
+def drain(timeout):
+    """
+    Finish queued reactions, then the page writes and PM notifications they
+    produced, within the timeout (seconds). Returns True if all were drained.
+    """
+    deadline = time.monotonic() + timeout
+    drained = reaction_queue.shutdown(drain=True, timeout=timeout)
+    drained = page_writer.shutdown(timeout=max(0.0, deadline - time.monotonic())) and drained
+    drained = pm_notifications.shutdown(timeout=max(0.0, deadline - time.monotonic())) and drained
+    return drained